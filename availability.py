@@ -0,0 +1,371 @@
+"""
+Date-aware availability of rental items.
+
+Each open rental line reserves its units not yet returned for the days
+[rental_date, return_date); a line still out after its return date keeps
+reserving the item until today. ReservationTree holds one item's reserved
+quantity per day in a segment tree with range add and range max, so
+booking, releasing and "most units reserved on any day of [start, end)" are
+all O(log days). AvailabilityIndex keeps a tree per item for every open
+rental line and LiveAvailability keeps one index current from change
+notifications, for the rental form and the calendar view.
+
+free_quantities() is the check made inside the checkout transaction: it
+locks the item rows and works out the peaks from the overlapping lines in
+the database, so two terminals cannot overbook the same days.
+
+catalog_calendar() is the whole-catalog view for season planning: one query
+for the items and one for the open lines, turned into an items x days matrix
+of reserved units with a difference array per item and a cumulative sum
+(vectorised with numpy when it is installed).
+
+Benchmarks: python benchmarks.py availability [--bookings N]
+            python benchmarks.py calendar [--bookings N]
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from database import Item, Rental
+from lazy_imports import lazy_import, is_available
+
+# numpy only speeds up catalog_calendar(); a plain Python fallback is used without it
+np = lazy_import('numpy') if is_available('numpy') else None
+
+# Days ahead (from today) the index covers; later bookings are counted up to here
+HORIZON_DAYS = 732
+
+# Days shown by the catalog-wide availability calendar
+CALENDAR_MATRIX_DAYS = 90
+
+
+class ReservationTree:
+    """Reserved quantity per day over [0, size) days: range add, range max"""
+    def __init__(self, size):
+        self.n = 1 << max(size - 1, 0).bit_length()
+        self.height = self.n.bit_length() - 1
+        self.tree = [0] * (2 * self.n)   # Max of a node's range, including its own pending adds
+        self.pending = [0] * self.n      # Adds applied to a whole internal node's range
+
+    @classmethod
+    def from_counts(cls, counts):
+        """A tree whose day i starts with counts[i] reserved"""
+        self = cls(len(counts))
+        n, tree = self.n, self.tree
+        tree[n:n + len(counts)] = counts
+        for p in range(n - 1, 0, -1):
+            tree[p] = max(tree[2 * p], tree[2 * p + 1])
+        return self
+
+    def add(self, first, last, quantity):
+        """Reserve quantity more (or less, if negative) on days [first, last)"""
+        if first >= last:
+            return
+        n, tree, pending = self.n, self.tree, self.pending
+        left, right = first + n, last + n
+        while left < right:
+            if left & 1:
+                tree[left] += quantity
+                if left < n:
+                    pending[left] += quantity
+                left += 1
+            if right & 1:
+                right -= 1
+                tree[right] += quantity
+                if right < n:
+                    pending[right] += quantity
+            left >>= 1
+            right >>= 1
+        self._rebuild(first + n)
+        self._rebuild(last - 1 + n)
+
+    def peak(self, first, last):
+        """Most units reserved on any day of [first, last)"""
+        if first >= last:
+            return 0
+        n, tree = self.n, self.tree
+        self._push(first + n)
+        self._push(last - 1 + n)
+        left, right = first + n, last + n
+        best = None
+        while left < right:
+            if left & 1:
+                best = tree[left] if best is None or tree[left] > best else best
+                left += 1
+            if right & 1:
+                right -= 1
+                best = tree[right] if best is None or tree[right] > best else best
+            left >>= 1
+            right >>= 1
+        return best
+
+    def _rebuild(self, p):
+        tree, pending = self.tree, self.pending
+        while p > 1:
+            p >>= 1
+            tree[p] = max(tree[2 * p], tree[2 * p + 1]) + pending[p]
+
+    def _push(self, p):
+        """Hand pending adds on p's ancestors down to their children"""
+        n, tree, pending = self.n, self.tree, self.pending
+        for shift in range(self.height, 0, -1):
+            node = p >> shift
+            quantity = pending[node]
+            if quantity:
+                for child in (2 * node, 2 * node + 1):
+                    tree[child] += quantity
+                    if child < n:
+                        pending[child] += quantity
+                pending[node] = 0
+
+
+class AvailabilityIndex:
+    """Per-item reservation trees for the open rental lines, from start for days"""
+    def __init__(self, start=None, days=HORIZON_DAYS):
+        self.start = start or date.today()
+        self.days = days
+        self.trees = {}                       # item id -> ReservationTree
+        self.lines = {}                       # line id -> (order id, item id, first day, last day, quantity)
+        self.order_lines = defaultdict(set)   # order id -> line ids
+
+    @classmethod
+    def build(cls, lines, start=None, days=HORIZON_DAYS):
+        """
+        An index of lines, (line id, order id, item id, start date, end date,
+        quantity) tuples, built with one difference array per item.
+        """
+        self = cls(start, days)
+        diffs = {}
+        for line_id, order_id, item_id, start_date, end_date, quantity in lines:
+            first, last = self._span(start_date, end_date)
+            self.lines[line_id] = (order_id, item_id, first, last, quantity)
+            self.order_lines[order_id].add(line_id)
+            if first < last:
+                diff = diffs.get(item_id)
+                if diff is None:
+                    diff = diffs[item_id] = [0] * (days + 1)
+                diff[first] += quantity
+                diff[last] -= quantity
+        for item_id, diff in diffs.items():
+            counts, running = [], 0
+            for change in diff[:days]:
+                running += change
+                counts.append(running)
+            self.trees[item_id] = ReservationTree.from_counts(counts)
+        return self
+
+    def add_line(self, line_id, order_id, item_id, start_date, end_date, quantity):
+        """Reserve quantity of item_id for [start_date, end_date)"""
+        self.remove_line(line_id)
+        first, last = self._span(start_date, end_date)
+        self.lines[line_id] = (order_id, item_id, first, last, quantity)
+        self.order_lines[order_id].add(line_id)
+        self._tree(item_id).add(first, last, quantity)
+
+    def remove_line(self, line_id):
+        """Release a line's reservation (e.g. it was returned or deleted)"""
+        line = self.lines.pop(line_id, None)
+        if line is not None:
+            order_id, item_id, first, last, quantity = line
+            if order_id in self.order_lines:
+                self.order_lines[order_id].discard(line_id)
+            self._tree(item_id).add(first, last, -quantity)
+
+    def replace_orders(self, order_ids, lines):
+        """Swap the reservations of order_ids for lines, their current open lines"""
+        for order_id in order_ids:
+            for line_id in list(self.order_lines.pop(order_id, ())):
+                self.remove_line(line_id)
+        for line in lines:
+            self.add_line(*line)
+
+    def peak(self, item_id, start_date, end_date):
+        """Most units of item_id reserved on any day of [start_date, end_date)"""
+        tree = self.trees.get(item_id)
+        return tree.peak(*self._span(start_date, end_date)) if tree is not None else 0
+
+    def free(self, item_id, total_quantity, start_date, end_date):
+        """Units of item_id free on every day of [start_date, end_date)"""
+        return total_quantity - self.peak(item_id, start_date, end_date)
+
+    def reserved_by_day(self, item_id, start_date, days):
+        """Units of item_id reserved on each of days days from start_date"""
+        return [self.peak(item_id, start_date + timedelta(days=i), start_date + timedelta(days=i + 1))
+                for i in range(days)]
+
+    def _tree(self, item_id):
+        tree = self.trees.get(item_id)
+        if tree is None:
+            tree = self.trees[item_id] = ReservationTree(self.days)
+        return tree
+
+    def _span(self, start_date, end_date):
+        """Day numbers [first, last) of a date range, clipped to the index"""
+        first = min(max((start_date - self.start).days, 0), self.days)
+        last = min(max((end_date - self.start).days, first), self.days)
+        return first, last
+
+
+def open_lines(db, today=None, order_ids=None):
+    """Index tuples for the unreturned rental lines (of order_ids only, if given)"""
+    today = today or date.today()
+    query = db.query(Rental.id, Rental.order_id, Rental.item_id, Rental.rental_date, Rental.return_date,
+                     Rental.quantity - Rental.returned_quantity).filter(Rental.is_returned == False)
+    if order_ids is not None:
+        query = query.filter(Rental.order_id.in_(order_ids))
+    # Overdue lines are still out, so they hold the item at least until tomorrow
+    tomorrow = today + timedelta(days=1)
+    return [(line_id, order_id, item_id, start_date, max(end_date, tomorrow), quantity)
+            for line_id, order_id, item_id, start_date, end_date, quantity in query]
+
+
+def peak_reserved(intervals, start_date, end_date):
+    """Most quantity reserved on any day of [start_date, end_date) by (start, end, quantity) intervals"""
+    changes = defaultdict(int)
+    for first, last, quantity in intervals:
+        first, last = max(first, start_date), min(last, end_date)
+        if first < last:
+            changes[first] += quantity
+            changes[last] -= quantity
+    peak = running = 0
+    for day in sorted(changes):
+        running += changes[day]
+        peak = max(peak, running)
+    return peak
+
+
+def free_quantities(db, item_ids, start_date, end_date, today=None):
+    """
+    Units of each of item_ids free on every day of [start_date, end_date),
+    for use inside the transaction that books them: locks the item rows, in
+    id order so concurrent checkouts cannot deadlock, until commit. Returns
+    {item id: (item, free)}; items that no longer exist are left out.
+    """
+    today = today or date.today()
+    item_ids = sorted(set(item_ids))
+    items = db.query(Item).filter(Item.id.in_(item_ids)).order_by(Item.id).with_for_update().all()
+    if not items:
+        return {}
+    query = db.query(Rental.item_id, Rental.rental_date, Rental.return_date,
+                     Rental.quantity - Rental.returned_quantity).filter(
+        Rental.item_id.in_(item_ids), Rental.is_returned == False, Rental.rental_date < end_date
+    )
+    if start_date > today:
+        query = query.filter(Rental.return_date > start_date)
+    tomorrow = today + timedelta(days=1)
+    intervals = defaultdict(list)
+    for item_id, first, last, quantity in query:
+        intervals[item_id].append((first, max(last, tomorrow), quantity))
+    return {item.id: (item, item.total_quantity - peak_reserved(intervals[item.id], start_date, end_date))
+            for item in items}
+
+
+class LiveAvailability:
+    """An AvailabilityIndex shared by the GUI's worker threads and kept current by invalidate()"""
+    def __init__(self):
+        self._lock = threading.Lock()          # Guards the index; held while it is read or rebuilt
+        self._changes_lock = threading.Lock()  # Guards the pending changes; never held for long
+        self._index = None
+        self._stale = set()                    # Orders whose lines changed since they were indexed
+        self._reset = True                     # Rebuild the whole index on next use
+
+    def invalidate(self, order_ids=None):
+        """Re-read order_ids (None: everything) before the next answer; safe from any thread"""
+        with self._changes_lock:
+            if order_ids is None:
+                self._reset = True
+            else:
+                self._stale.update(order_ids)
+
+    def free(self, db, item_id, total_quantity, start_date, end_date):
+        """Units of item_id free on every day of [start_date, end_date)"""
+        with self._current(db) as index:
+            return index.free(item_id, total_quantity, start_date, end_date)
+
+    def reserved_by_day(self, db, item_id, start_date, days):
+        """Units of item_id reserved on each of days days from start_date"""
+        with self._current(db) as index:
+            return index.reserved_by_day(item_id, start_date, days)
+
+    @contextmanager
+    def _current(self, db):
+        with self._lock:
+            with self._changes_lock:
+                reset, stale = self._reset, self._stale
+                self._reset, self._stale = False, set()
+            today = date.today()
+            if reset or self._index is None or self._index.start != today:
+                self._index = None
+                self._index = AvailabilityIndex.build(open_lines(db, today), today)
+            elif stale:
+                self._index.replace_orders(stale, open_lines(db, today, stale))
+            yield self._index
+
+
+def reserved_matrix(lines, item_ids, start_date, days):
+    """
+    Units reserved per item and day by lines, (start date, end date, item id,
+    quantity) tuples: row i is item_ids[i], column j is start_date + j days.
+    Returns a list of lists.
+    """
+    rows = {item_id: row for row, item_id in enumerate(item_ids)}
+    origin = start_date.toordinal()
+    lines = [(rows[item_id], line_start.toordinal() - origin, line_end.toordinal() - origin, quantity)
+             for line_start, line_end, item_id, quantity in lines if item_id in rows]
+
+    if np is not None:
+        width = days + 1
+        spans = np.array(lines, dtype=np.int64).reshape(-1, 4)
+        row, quantity = spans[:, 0], spans[:, 3]
+        first = np.clip(spans[:, 1], 0, days)
+        last = np.clip(spans[:, 2], first, days)
+        # Each line adds quantity at its first day and takes it off at its last
+        diff = (np.bincount(row * width + first, weights=quantity, minlength=len(item_ids) * width)
+                - np.bincount(row * width + last, weights=quantity, minlength=len(item_ids) * width))
+        return np.cumsum(diff.reshape(len(item_ids), width)[:, :days], axis=1).astype(np.int64).tolist()
+
+    diff = [[0] * (days + 1) for _ in item_ids]
+    for row, first, last, quantity in lines:
+        first = min(max(first, 0), days)
+        last = min(max(last, first), days)
+        diff[row][first] += quantity
+        diff[row][last] -= quantity
+    matrix = []
+    for changes in diff:
+        counts, running = [], 0
+        for change in changes[:days]:
+            running += change
+            counts.append(running)
+        matrix.append(counts)
+    return matrix
+
+
+def catalog_calendar(db, start_date=None, days=CALENDAR_MATRIX_DAYS):
+    """
+    (items, reserved) for every item over days days from start_date: items
+    are (id, name, total quantity) in name order and reserved[i][j] the units
+    of items[i] reserved on start_date + j days.
+    """
+    start_date = start_date or date.today()
+    items = db.query(Item.id, Item.name, Item.total_quantity).order_by(Item.name, Item.id).all()
+    end_date = start_date + timedelta(days=days)
+    lines = [(line_start, line_end, item_id, quantity)
+             for _, _, item_id, line_start, line_end, quantity in open_lines(db)
+             if line_start < end_date and line_end > start_date]
+    return [tuple(item) for item in items], reserved_matrix(lines, [item[0] for item in items], start_date, days)
+
+
+def calendar_payload(items, reserved, start_date):
+    """JSON-ready form of catalog_calendar()'s result"""
+    days = len(reserved[0]) if reserved else 0
+    return {
+        'start_date': start_date.isoformat(),
+        'dates': [(start_date + timedelta(days=offset)).isoformat() for offset in range(days)],
+        'items': [{
+            'id': item_id,
+            'name': name,
+            'total_quantity': total,
+            'reserved': counts,
+            'free': [total - units for units in counts],
+        } for (item_id, name, total), counts in zip(items, reserved)],
+    }
@@ -0,0 +1,517 @@
+"""
+Benchmarks for the rental management system, one subcommand per part.
+
+Each times one part against synthetic data and prints the figures; the
+checks that the results are right are in tests/ and run with pytest.
+
+The database benchmarks book and then remove their own test items and
+customer. They only run against the database given with --database-url
+or TEST_DATABASE_URL (migrated first), never the one in config.py.
+
+    python benchmarks.py tree_sync [--rows N]
+    python benchmarks.py search_index [--items N]
+    python benchmarks.py availability [--bookings N]
+    python benchmarks.py calendar [--bookings N]
+    python benchmarks.py receipts [--receipts N]
+    python benchmarks.py checkout [--terminals N] [--orders N]
+    python benchmarks.py returns [--lines N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+
+class CountingTree:
+    """Treeview proxy counting the calls made into Tk"""
+    def __init__(self, tree):
+        self.tree = tree
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.tree, name)
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            return method(*args, **kwargs)
+        return call
+
+
+def benchmark_tree_sync(total_rows=10000, changed_counts=(0, 10, 100, 1000)):
+    """
+    Time a full reload, TreeSync.apply() and TreeSync.patch() for various
+    numbers of changed rows, with the calls each makes into Tk (what costs
+    most on a real display).
+    """
+    import tkinter as tk
+    from tkinter import ttk
+    from tree_sync import TreeSync
+
+    root = tk.Tk()
+    tree = CountingTree(ttk.Treeview(root, columns=('Name', 'Qty'), show='headings'))
+    rows = [(i, (f"Item {i}", i)) for i in range(total_rows)]
+
+    def timed(label, run):
+        calls = tree.calls
+        start = time.perf_counter()
+        run()
+        print(f"{label}: {(time.perf_counter() - start) * 1000:.1f} ms, {tree.calls - calls} Tk calls")
+
+    def reload():
+        tree.delete(*tree.get_children())
+        for iid, values in rows:
+            tree.insert('', 'end', iid=iid, values=values)
+    timed(f"full reload of {total_rows} rows", reload)
+
+    tree.delete(*tree.get_children())
+    sync = TreeSync(tree)
+    sync.apply(rows)
+    by_position = lambda iid, values: int(iid)
+    for changed in changed_counts:
+        new_rows = [(iid, (name, qty + 1) if iid < changed else (name, qty)) for iid, (name, qty) in rows]
+        timed(f"apply, {changed} changed rows", lambda: sync.apply(new_rows))
+        rows = new_rows
+        # The same change again, given only the changed rows as a ChangeBus event would
+        new_rows = [(iid, (name, qty + 1) if iid < changed else (name, qty)) for iid, (name, qty) in rows]
+        timed(f"patch, {changed} changed rows", lambda: sync.patch(new_rows[:changed], key=by_position))
+        rows = new_rows
+    timed("patch, 1 row deleted and 1 inserted",
+          lambda: sync.patch([(total_rows, ("New", 0))], deleted=[0], key=by_position))
+    root.destroy()
+
+
+def benchmark_search_index(count=50000, queries=("chair", "ch", "round table", "tab 12", "plastic 4999", "sku 4321")):
+    """Time SearchIndex build and query latency over a synthetic catalog"""
+    from search_index import SearchIndex
+
+    kinds = ["Plastic chair", "Round table", "Canopy tent", "Banquet chair", "Table cloth", "Sound system"]
+    index = SearchIndex(("name", "description"))
+    start = time.perf_counter()
+    index.rebuild((i, {"name": f"{kinds[i % len(kinds)]} {i}", "description": f"SKU {i} {kinds[(i * 7) % len(kinds)]}"})
+                  for i in range(count))
+    print(f"indexed {count} items in {(time.perf_counter() - start) * 1000:.0f} ms")
+    for query in queries:
+        # First lookup of each word, then a repeat (e.g. the next keystroke of a longer query)
+        index._tiers = {}
+        index._matched = {}
+        start = time.perf_counter()
+        results = index.search(query, limit=200)
+        cold = (time.perf_counter() - start) * 1000
+        runs = 50
+        start = time.perf_counter()
+        for _ in range(runs):
+            index.search(query, limit=200)
+        warm = (time.perf_counter() - start) / runs * 1000
+        print(f"{query!r}: {len(results)} results, first {cold:.3f} ms, cached {warm:.3f} ms")
+
+
+def benchmark_availability(bookings=1_000_000, items=1000, queries=100_000, seed=1):
+    """Time building, querying and updating an AvailabilityIndex of random bookings against a plain scan"""
+    import random
+    from collections import defaultdict
+    from datetime import date, timedelta
+    from availability import AvailabilityIndex, peak_reserved, HORIZON_DAYS
+
+    rng = random.Random(seed)
+    today = date.today()
+    lines = []
+    for line_id in range(bookings):
+        start = today + timedelta(days=rng.randrange(HORIZON_DAYS - 14))
+        lines.append((line_id, line_id, rng.randrange(items), start,
+                      start + timedelta(days=rng.randint(1, 14)), rng.randint(1, 20)))
+
+    started = time.perf_counter()
+    index = AvailabilityIndex.build(lines, today)
+    print(f"build from {bookings:,} bookings over {items:,} items: {time.perf_counter() - started:.2f} s")
+
+    probes = []
+    for _ in range(queries):
+        start = today + timedelta(days=rng.randrange(HORIZON_DAYS - 30))
+        probes.append((rng.randrange(items), start, start + timedelta(days=rng.randint(1, 30))))
+    started = time.perf_counter()
+    for probe in probes:
+        index.peak(*probe)
+    elapsed = time.perf_counter() - started
+    print(f"{queries:,} range-max queries: {elapsed * 1e6 / queries:.1f} us each")
+
+    by_item = defaultdict(list)
+    for _, _, item_id, start, end, quantity in lines:
+        by_item[item_id].append((start, end, quantity))
+    sample = probes[:1000]
+    started = time.perf_counter()
+    for item_id, start, end in sample:
+        peak_reserved(by_item[item_id], start, end)
+    elapsed = time.perf_counter() - started
+    print(f"plain scan of the item's bookings: {elapsed * 1e6 / len(sample):.1f} us each")
+
+    changes = min(queries, bookings)
+    started = time.perf_counter()
+    for line_id in range(changes):
+        index.remove_line(line_id)
+    for line in lines[:changes]:
+        index.add_line(*line)
+    elapsed = time.perf_counter() - started
+    print(f"{2 * changes:,} booking removals/additions: {elapsed * 1e6 / (2 * changes):.1f} us each")
+
+
+def benchmark_calendar(bookings=1_000_000, items=1000, days=None, seed=1):
+    """Time the catalog availability matrix with and without numpy"""
+    import random
+    from datetime import date, timedelta
+    import availability
+
+    days = days or availability.CALENDAR_MATRIX_DAYS
+    rng = random.Random(seed)
+    today = date.today()
+    lines = []
+    for _ in range(bookings):
+        start = today + timedelta(days=rng.randrange(-14, days))
+        lines.append((start, start + timedelta(days=rng.randint(1, 14)), rng.randrange(items), rng.randint(1, 20)))
+    item_ids = list(range(items))
+
+    numpy = availability.np
+    for label, module in (("numpy", numpy), ("pure Python", None)):
+        if label == "numpy" and module is None:
+            print("numpy not installed, skipping")
+            continue
+        availability.np = module
+        try:
+            started = time.perf_counter()
+            availability.reserved_matrix(lines, item_ids, today, days)
+            print(f"{items:,} items x {days} days from {bookings:,} bookings ({label}): "
+                  f"{time.perf_counter() - started:.2f} s")
+        finally:
+            availability.np = numpy
+
+
+def sample_rental_data(rental_id=1, lines=5):
+    """A typical receipt's data"""
+    items = [{'name': f"Item {n + 1}", 'quantity': n + 1, 'daily_rate': 10.0, 'days': 3,
+              'subtotal': 30.0 * (n + 1)} for n in range(lines)]
+    subtotal = sum(item['subtotal'] for item in items)
+    return {
+        'rental_id': rental_id,
+        'customer_name': "Benchmark Customer",
+        'customer_phone': "0244000000",
+        'customer_address': "Accra",
+        'rental_date': "January 01, 2025",
+        'return_date': "January 04, 2025",
+        'items': items,
+        'subtotal': subtotal,
+        'discount_percent': 10,
+        'discount_amount': subtotal * 0.1,
+        'total_amount': subtotal * 0.9,
+        'currency': 'GHS'
+    }
+
+
+def benchmark_receipts(receipts=50):
+    """Receipts per second building everything per receipt (as before) against reusing the cached parts"""
+    import shutil
+    import tempfile
+    from receipt_generator import ReceiptGenerator, clear_caches
+
+    output_dir = tempfile.mkdtemp(prefix="receipt_benchmark_")
+    try:
+        def run(label, make_generator, before_each=None, lines=5):
+            sizes = []
+            started = time.perf_counter()
+            for n in range(receipts):
+                if before_each:
+                    before_each()
+                path = make_generator().generate_receipt(
+                    sample_rental_data(n + 1, lines), os.path.join(output_dir, f"{label}_{n}.pdf"))
+                sizes.append(os.path.getsize(path))
+            elapsed = time.perf_counter() - started
+            print(f"{label}: {receipts / elapsed:.1f} receipts/s ({elapsed * 1000 / receipts:.1f} ms each), "
+                  f"{sum(sizes) / len(sizes) / 1024:.1f} KB per PDF")
+
+        # Uncached: styles rebuilt and the full-size logo decoded and embedded on every receipt
+        run("uncached", lambda: ReceiptGenerator(logo_dpi=None, template=False), clear_caches)
+        # Cached: one generator, styles built once, downscaled JPEG logo reused
+        flowing = ReceiptGenerator(template=False)
+        run("cached, letterhead flowing", lambda: flowing)
+        # Template: letterhead and footer laid out once and drawn from form XObjects
+        generator = ReceiptGenerator()
+        run("cached, letterhead template", lambda: generator)
+
+        # A long order spilling onto more pages, where every page reuses the footer form
+        run("flowing, 60 lines", lambda: flowing, lines=60)
+        run("template, 60 lines", lambda: generator, lines=60)
+
+        # Cached and rendered in memory, as a service process would
+        started = time.perf_counter()
+        sizes = [len(generator.render_receipt(sample_rental_data(n + 1))) for n in range(receipts)]
+        elapsed = time.perf_counter() - started
+        print(f"template, in memory: {receipts / elapsed:.1f} receipts/s ({elapsed * 1000 / receipts:.1f} ms each), "
+              f"{sum(sizes) / len(sizes) / 1024:.1f} KB per PDF")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def use_database(url):
+    """Migrate the database at url and point every SessionLocal session at it; returns its engine"""
+    from sqlalchemy import create_engine
+    from database import SessionLocal
+    from migrations import run_migrations
+
+    engine = create_engine(url)
+    run_migrations(engine)
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
+def add_test_items(sessions, prefix, count, stock, description):
+    """Ids of count new items with stock units each, on the dashboard counters too"""
+    from database import Item
+    import stats
+
+    db = sessions()
+    try:
+        items = [Item(name=f"{prefix} item {n}", description=description, total_quantity=stock,
+                      available_quantity=stock, daily_rate=1.0) for n in range(count)]
+        db.add_all(items)
+        db.flush()
+        stats.record_items(db, len(items), stock * len(items))
+        db.commit()
+        return [item.id for item in items]
+    finally:
+        db.close()
+
+
+def remove_test_data(sessions, prefix):
+    """Remove a benchmark's orders, items and customer, and take them off the dashboard counters"""
+    from sqlalchemy import delete
+    from database import Customer, Item, Rental, RentalOrder, Job
+    import stats
+
+    db = sessions()
+    try:
+        customer_ids = [row.id for row in db.query(Customer.id).filter(Customer.name.like(f"{prefix}%"))]
+        orders = db.query(RentalOrder).filter(RentalOrder.customer_id.in_(customer_ids)).all()
+        lines = db.query(Rental).filter(Rental.order_id.in_([order.id for order in orders])).all()
+        items = db.query(Item).filter(Item.name.like(f"{prefix}%")).all()
+        db.execute(delete(Job).where(Job.order_id.in_([order.id for order in orders])))
+        db.execute(delete(Rental).where(Rental.id.in_([line.id for line in lines])))
+        db.execute(delete(RentalOrder).where(RentalOrder.id.in_([order.id for order in orders])))
+        db.execute(delete(Customer).where(Customer.id.in_(customer_ids)))
+        db.execute(delete(Item).where(Item.id.in_([item.id for item in items])))
+        stats.record_removed(db, lines, orders)
+        stats.record_items(db, -len(items), -sum(item.total_quantity for item in items),
+                           -sum(item.total_quantity - item.available_quantity for item in items))
+        stats.record_customers(db, -len(customer_ids))
+        db.commit()
+    finally:
+        db.close()
+
+
+def customer_fields(prefix):
+    return {'name': f"{prefix} customer", 'phone': '', 'address': '', 'customer_type': 'Regular',
+            'discount_percentage': 0.0}
+
+
+def benchmark_checkout(engine, terminals=8, orders=50, items=5, stock=100):
+    """
+    Book orders from several threads at once (each its own session, as
+    separate terminals would) for a few shared items and report
+    throughput, latency and statements per checkout.
+    """
+    from datetime import date, timedelta
+    from sqlalchemy import func
+    from checkout import checkout
+    from database import SessionLocal, Item, Rental
+    from queries import count_statements
+
+    start_date = date.today()
+    prefix = f"Load test {time.time_ns()}"
+    item_ids = add_test_items(SessionLocal, prefix, items, stock, "checkout load test")
+    customer = customer_fields(prefix)
+    booked, refused, failed, latencies = [], [], [], []
+    results_lock = threading.Lock()
+
+    def terminal(number):
+        for n in range(orders):
+            # Every order takes one unit of each of two items, overlapping the other terminals
+            first = (number + n) % items
+            quantities = {item_ids[first]: 1, item_ids[(first + 1) % items]: 1}
+            session = SessionLocal()
+            started = time.perf_counter()
+            try:
+                order, _ = checkout(session, customer, quantities, start_date, 3)
+                outcome, value = booked, order.id
+            except ValueError:
+                outcome, value = refused, None
+            except Exception as e:
+                outcome, value = failed, str(e)
+            finally:
+                session.close()
+            with results_lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                outcome.append(value)
+
+    try:
+        threads = [threading.Thread(target=terminal, args=(number,)) for number in range(terminals)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        db = SessionLocal()
+        try:
+            booked_units = dict(db.query(Rental.item_id, func.sum(Rental.quantity))
+                                .filter(Rental.item_id.in_(item_ids)).group_by(Rental.item_id).all())
+            available = {item.id: item.available_quantity for item in db.query(Item).filter(Item.id.in_(item_ids))}
+        finally:
+            db.close()
+
+        attempts = terminals * orders
+        print(f"{attempts} checkouts from {terminals} terminals in {elapsed:.2f} s "
+              f"({attempts / elapsed:.0f}/s): {len(booked)} booked, {len(refused)} refused (sold out), "
+              f"{len(failed)} failed")
+        latencies.sort()
+        print(f"latency: median {statistics.median(latencies):.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms, max {latencies[-1]:.1f} ms")
+        overbooked = [item_id for item_id in item_ids if booked_units.get(item_id, 0) > stock]
+        mismatched = [item_id for item_id in item_ids if available[item_id] != stock - booked_units.get(item_id, 0)]
+        print(f"overbooked items: {overbooked or 'none'}; stock out of step with lines: {mismatched or 'none'}")
+        for error in failed[:5]:
+            print(f"error: {error}")
+
+        # Statements for one checkout, with one and with all of the items, on days nobody booked
+        later = start_date + timedelta(days=30)
+        for quantities in ({item_ids[0]: 1}, {item_id: 1 for item_id in item_ids}):
+            count = count_statements(lambda session: checkout(session, customer, quantities, later, 1), engine)
+            print(f"statements for a {len(quantities)}-line checkout: {count}")
+    finally:
+        remove_test_data(SessionLocal, prefix)
+
+
+def return_order_one_by_one(db, order_id):
+    """The ORM loop returns used to run: lines, then each line's item, one at a time (the baseline)"""
+    from database import RentalOrder
+    import stats
+
+    order = db.query(RentalOrder).filter(RentalOrder.id == order_id).first()
+    returned, units = [], 0
+    for rental in order.lines:
+        if rental.is_returned:
+            continue
+        if rental.is_started:
+            rental.item.available_quantity += rental.quantity - rental.returned_quantity
+            units += rental.quantity - rental.returned_quantity
+        rental.is_returned = True
+        rental.returned_quantity = rental.quantity
+        returned.append(rental)
+    order.status = "Returned"
+    db.flush()
+    stats.record_return(db, returned, units)
+    db.commit()
+
+
+def benchmark_returns(engine, lines=1000, lines_per_order=100):
+    """Time returning lines set-based against the ORM loop, on two identical sets of orders"""
+    from datetime import date
+    from checkout import checkout
+    from database import SessionLocal
+    from queries import count_statements
+    from returns import return_lines, return_orders, outstanding_lines
+
+    prefix = f"Return benchmark {time.time_ns()}"
+    orders = max(lines // lines_per_order, 1)
+    stock = 2 * orders + 2
+    item_ids = add_test_items(SessionLocal, prefix, lines_per_order, stock, "returns benchmark")
+    customer = customer_fields(prefix)
+    start_date = date.today()
+    db = SessionLocal()
+    try:
+        order_sets = []
+        for _ in range(2):
+            order_ids = []
+            for _ in range(orders):
+                order, _ = checkout(db, customer, dict.fromkeys(item_ids, 1), start_date, 1)
+                order_ids.append(order.id)
+            order_sets.append(order_ids)
+        set_based, one_by_one = order_sets
+        total = len(set_based) * lines_per_order
+
+        started = time.perf_counter()
+        statements = count_statements(lambda session: return_orders(session, set_based), engine)
+        elapsed = time.perf_counter() - started
+        print(f"set-based return of {total} lines: {elapsed * 1000:.0f} ms, {statements} statements")
+
+        started = time.perf_counter()
+        statements = count_statements(
+            lambda session: [return_order_one_by_one(session, order_id) for order_id in one_by_one], engine)
+        elapsed = time.perf_counter() - started
+        print(f"ORM loop return of {total} lines: {elapsed * 1000:.0f} ms, {statements} statements")
+
+        # A partial return of one unit on every line of one order
+        order, _ = checkout(db, customer, dict.fromkeys(item_ids, 2), start_date, 1)
+        partial = {line_id: 1 for line_id, *_ in outstanding_lines(db, order.id)}
+        started = time.perf_counter()
+        returned, closed = return_lines(db, partial)
+        elapsed = time.perf_counter() - started
+        left = sum(out for *_, out in outstanding_lines(db, order.id))
+        print(f"partial return of 1 of 2 units on {len(returned)} lines: {elapsed * 1000:.0f} ms, "
+              f"{left} units still out, {len(closed)} orders closed")
+    finally:
+        db.close()
+        remove_test_data(SessionLocal, prefix)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rental system benchmarks")
+    commands = parser.add_subparsers(dest="benchmark", metavar="benchmark")
+    commands.required = True
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument("--database-url", default=os.environ.get("TEST_DATABASE_URL"),
+                          help="Database to book test orders in (default: $TEST_DATABASE_URL)")
+
+    command = commands.add_parser("tree_sync", help="Treeview full reload against apply() and patch()")
+    command.add_argument("--rows", type=int, default=10000)
+    command.set_defaults(run=lambda args: benchmark_tree_sync(args.rows))
+
+    command = commands.add_parser("search_index", help="In-memory search index build and query latency")
+    command.add_argument("--items", type=int, default=50000)
+    command.set_defaults(run=lambda args: benchmark_search_index(args.items))
+
+    command = commands.add_parser("availability", help="Availability index against a plain scan of the bookings")
+    command.add_argument("--bookings", type=int, default=1_000_000)
+    command.set_defaults(run=lambda args: benchmark_availability(args.bookings))
+
+    command = commands.add_parser("calendar", help="Catalog availability matrix with and without numpy")
+    command.add_argument("--bookings", type=int, default=1_000_000)
+    command.set_defaults(run=lambda args: benchmark_calendar(args.bookings))
+
+    command = commands.add_parser("receipts", help="Receipt PDFs uncached, cached and from templates")
+    command.add_argument("--receipts", type=int, default=50)
+    command.set_defaults(run=lambda args: benchmark_receipts(args.receipts))
+
+    command = commands.add_parser("checkout", parents=[database],
+                                  help="Concurrent checkouts from several terminals")
+    command.add_argument("--terminals", type=int, default=8)
+    command.add_argument("--orders", type=int, default=50, help="Checkouts per terminal")
+    command.set_defaults(run=lambda args: benchmark_checkout(database_engine(parser, args), args.terminals, args.orders))
+
+    command = commands.add_parser("returns", parents=[database],
+                                  help="Set-based returns against the ORM loop")
+    command.add_argument("--lines", type=int, default=1000, help="Lines to return at once")
+    command.set_defaults(run=lambda args: benchmark_returns(database_engine(parser, args), args.lines))
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+def database_engine(parser, args):
+    """use_database() on the --database-url given, or exit with usage if there is none"""
+    if not args.database_url:
+        parser.error("give --database-url or set TEST_DATABASE_URL (never the production database)")
+    return use_database(args.database_url)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Rental checkout in one transaction and a fixed number of statements.
+
+checkout() books a new order the same way whichever terminal runs it:
+
+1. find or create the customer
+2. lock every item on the order (SELECT ... FOR UPDATE, in id order, so two
+   checkouts sharing items queue up instead of deadlocking) and check the
+   units free for the rental period against the lines already booked
+3. insert the order header and all of its lines with INSERT ... RETURNING
+4. if the rental starts today, take the units out of stock with one
+   UPDATE ... CASE over all the items
+5. queue the receipt and SMS jobs asked for (see jobs.py), so they are
+   committed with the order and sent after it, off the checkout path
+
+The stock check runs on the locked rows inside the booking transaction, not
+on the item snapshots the form was filled from, so concurrent terminals
+cannot overbook an item. The statement count does not grow with the number
+of lines on the order.
+
+available_quantity counts the units in the shop now, so bookings that start
+later leave it alone until their first day: start_rentals() then takes them
+out of stock (the GUI runs it at launch and whenever the date changes).
+
+Load test: python benchmarks.py checkout [--terminals N] [--orders N]
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+from sqlalchemy import insert, update, case, text
+from database import Customer, Item, Rental, RentalOrder
+from availability import free_quantities
+from jobs import enqueue
+import stats
+
+# What checkout() booked, as plain data the caller can use after commit
+Order = namedtuple('Order', 'id customer_id customer_name customer_phone customer_address '
+                            'rental_date return_date days subtotal total_amount')
+Line = namedtuple('Line', 'id item_id item_name quantity daily_rate return_date total_amount')
+
+
+def checkout(db, customer_fields, quantities, start_date, days, jobs=()):
+    """
+    Book quantities ({item id: units}) from start_date for days days for
+    the customer named customer_fields['name'] (created, or updated with
+    customer_fields), queue a job of each kind in jobs for the order, and
+    commit. Returns (Order, [Line]). Raises
+    ValueError, leaving the transaction rolled back, if an item no longer
+    exists or has too few units free on some day of the period.
+    """
+    return_date = start_date + timedelta(days=days)
+    started = start_date <= date.today()
+    discount = customer_fields['discount_percentage']
+    try:
+        customer = db.query(Customer).filter(Customer.name == customer_fields['name']).first()
+        new_customer = customer is None
+        if new_customer:
+            customer = Customer(**customer_fields)
+            db.add(customer)
+        else:
+            # Update existing customer if details changed
+            for field, value in customer_fields.items():
+                setattr(customer, field, value)
+        db.flush()
+
+        # Lock the items and check them against the lines already booked for the period
+        available = free_quantities(db, quantities, start_date, return_date)
+        for item_id, quantity in sorted(quantities.items()):
+            if item_id not in available:
+                raise ValueError(f"Item {item_id} no longer exists")
+            item, free = available[item_id]
+            if free < quantity:
+                raise ValueError(f"Not enough {item.name} available from {start_date} to {return_date}. "
+                                 f"Only {max(free, 0)} available")
+
+        # Price every line up front so the header is written once
+        priced = []
+        for item_id, quantity in sorted(quantities.items()):
+            item = available[item_id][0]
+            item_total = item.daily_rate * quantity * days
+            priced.append((item, quantity, item_total, item_total - item_total * (discount / 100)))
+        subtotal = sum(item_total for _, _, item_total, _ in priced)
+        total_amount = sum(line_total for _, _, _, line_total in priced)
+
+        order_id = db.execute(insert(RentalOrder).returning(RentalOrder.id), {
+            'customer_id': customer.id,
+            'rental_date': start_date,
+            'return_date': return_date,
+            'days': days,
+            'subtotal': subtotal,
+            'discount_percentage': discount,
+            'total_amount': total_amount,
+            'status': "Active",
+        }).scalar_one()
+
+        # One multi-row INSERT for all lines; RETURNING keeps the input order
+        line_ids = db.execute(insert(Rental).returning(Rental.id, sort_by_parameter_order=True), [{
+            'order_id': order_id,
+            'customer_id': customer.id,
+            'item_id': item.id,
+            'quantity': quantity,
+            'rental_date': start_date,
+            'return_date': return_date,
+            'daily_rate': item.daily_rate,
+            'total_amount': line_total,
+            'is_returned': False,
+            'is_started': started,
+        } for item, quantity, _, line_total in priced]).scalars().all()
+
+        if started:
+            db.execute(
+                update(Item)
+                .where(Item.id.in_(quantities))
+                .values(available_quantity=Item.available_quantity - case(quantities, value=Item.id, else_=0))
+                .execution_options(synchronize_session=False)
+            )
+
+        order = Order(order_id, customer.id, customer.name, customer.phone, customer.address,
+                      start_date, return_date, days, subtotal, total_amount)
+        lines = [Line(line_id, item.id, item.name, quantity, item.daily_rate, return_date, line_total)
+                 for line_id, (item, quantity, _, line_total) in zip(line_ids, priced)]
+        enqueue(db, order_id, jobs)
+        # Last, so the single summary row is locked after the item rows on every path
+        stats.record_rental(db, order, lines, new_customer, started)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return order, lines
+
+
+_START_RENTALS = text("""
+    WITH due AS (
+        UPDATE rentals SET is_started = true
+        WHERE is_started = false AND is_returned = false AND rental_date <= :today
+        RETURNING item_id, quantity - returned_quantity AS units
+    ), per_item AS (
+        SELECT item_id, SUM(units) AS units FROM due GROUP BY item_id
+    )
+    UPDATE items
+    SET available_quantity = items.available_quantity - per_item.units
+    FROM (SELECT id FROM items WHERE id IN (SELECT item_id FROM per_item) ORDER BY id FOR UPDATE) AS locked,
+         per_item
+    WHERE items.id = locked.id AND per_item.item_id = items.id
+    RETURNING items.id, per_item.units
+""")
+
+
+def start_rentals(db, today=None):
+    """
+    Take the units of every open line starting on or before today out of
+    stock and commit; returns the ids of the items whose stock changed.
+    Safe to run from any number of terminals: each line is started once.
+    """
+    try:
+        started = db.execute(_START_RENTALS, {'today': today or date.today()}).all()
+        stats.record_started(db, sum(units for _, units in started))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [item_id for item_id, _ in started]
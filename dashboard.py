@@ -0,0 +1,91 @@
+"""
+Dashboard KPIs for the rental management GUI.
+
+All figures come from one SELECT over the rollups kept by stats.py: the
+single stats_summary row plus the daily_stats rows of the last month (and
+the past days with rentals still out, for the overdue count), so a refresh
+is one round trip that does not grow with the rental history.
+DashboardCache keeps the last result until a mutation invalidates it or the
+day changes.
+"""
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy import select, func, true
+from database import StatsSummary, DailyStats
+
+
+def dashboard_query(today):
+    """The single SELECT returning every dashboard KPI as one row"""
+    week_start = today - timedelta(days=6)
+    month_start = today - timedelta(days=29)
+
+    summary = select(
+        StatsSummary.total_items, StatsSummary.total_units, StatsSummary.units_out,
+        StatsSummary.total_customers, StatsSummary.active_rentals, StatsSummary.total_revenue,
+    ).where(StatsSummary.id == 1).cte('summary')
+
+    # Bookings by order start date, and lines due back before today but still out
+    daily = select(
+        func.coalesce(func.sum(DailyStats.booked_revenue).filter(DailyStats.day == today), 0)
+            .label('revenue_today'),
+        func.coalesce(func.sum(DailyStats.booked_revenue).filter(DailyStats.day.between(week_start, today)), 0)
+            .label('revenue_7d'),
+        func.coalesce(func.sum(DailyStats.booked_revenue).filter(DailyStats.day.between(month_start, today)), 0)
+            .label('revenue_30d'),
+        func.coalesce(func.sum(DailyStats.open_lines).filter(DailyStats.day < today), 0)
+            .label('overdue_rentals'),
+    ).where(
+        (DailyStats.day.between(month_start, today)) | ((DailyStats.day < today) & (DailyStats.open_lines != 0))
+    ).cte('daily')
+
+    return select(summary, daily).select_from(summary.join(daily, true()))
+
+
+def load_dashboard(db, today=None):
+    """Run the dashboard query; returns (stats dict, milliseconds taken)"""
+    today = today or date.today()
+    start = time.perf_counter()
+    row = db.execute(dashboard_query(today)).mappings().one()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    stats = dict(row)
+    for key in ('total_revenue', 'revenue_today', 'revenue_7d', 'revenue_30d'):
+        stats[key] = float(stats[key])
+    stats['utilization'] = stats['units_out'] / stats['total_units'] * 100 if stats['total_units'] else 0.0
+    return stats, elapsed
+
+
+class DashboardCache:
+    """Last dashboard result, kept until invalidate() is called or the date changes"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = None
+        self._day = None
+        self._generation = 0     # Bumped by invalidate(); stale loads are not cached
+
+    def invalidate(self, *args):
+        """Forget the cached result (usable directly as a ChangeBus callback)"""
+        with self._lock:
+            self._generation += 1
+            self._stats = None
+
+    def get(self, db, force=False):
+        """
+        Return (stats, timings) where timings has 'query_ms' (0 on a cache
+        hit), 'total_ms' and 'cached'. Runs on a worker thread.
+        """
+        start = time.perf_counter()
+        today = date.today()
+        with self._lock:
+            if not force and self._stats is not None and self._day == today:
+                return self._stats, {'query_ms': 0.0, 'total_ms': (time.perf_counter() - start) * 1000,
+                                     'cached': True}
+            generation = self._generation
+
+        stats, query_ms = load_dashboard(db, today)
+        with self._lock:
+            # Only keep the result if nothing changed while it was loading
+            if generation == self._generation:
+                self._stats, self._day = stats, today
+        return stats, {'query_ms': query_ms, 'total_ms': (time.perf_counter() - start) * 1000, 'cached': False}
@@ -2,7 +2,7 @@
 Database configuration and models for the rental management system.
 """
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Index, Text, text, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, date
@@ -20,7 +20,7 @@ class Item(Base):
     __tablename__ = "items"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
     description = Column(String)
     total_quantity = Column(Integer, nullable=False, default=0)
     available_quantity = Column(Integer, nullable=False, default=0)
@@ -35,7 +35,7 @@ class Customer(Base):
     __tablename__ = "customers"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
     phone = Column(String)
     email = Column(String)
     address = Column(String)
@@ -46,12 +46,61 @@ class Customer(Base):
     
     # Relationships
     rentals = relationship("Rental", back_populates="customer")
+    orders = relationship("RentalOrder", back_populates="customer")
+
+class RentalOrder(Base):
+    """Rental order header grouping the items rented in one transaction"""
+    __tablename__ = "rental_orders"
+    __table_args__ = (
+        # Active/history listings ordered by start date
+        Index("ix_rental_orders_status_rental_date", "status", "rental_date", "id"),
+        # Keyset pagination of the history view
+        Index("ix_rental_orders_rental_date_id", "rental_date", "id"),
+        Index("ix_rental_orders_customer_id", "customer_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
+    rental_date = Column(Date, nullable=False)
+    return_date = Column(Date, nullable=False)
+    days = Column(Integer, nullable=False)
+    subtotal = Column(Float, nullable=False, default=0.0)  # Total before discount
+    discount_percentage = Column(Float, nullable=False, default=0.0)
+    total_amount = Column(Float, nullable=False, default=0.0)  # Total after discount
+    status = Column(String, nullable=False, default="Active")  # Active, Returned
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    customer = relationship("Customer", back_populates="orders")
+    lines = relationship("Rental", back_populates="order", order_by="Rental.id")
+    
+    def refresh_totals(self):
+        """Recompute the stored totals and status from the order's line items"""
+        self.subtotal = sum(line.daily_rate * line.quantity * self.days for line in self.lines)
+        self.total_amount = sum(line.total_amount for line in self.lines)
+        self.status = "Returned" if all(line.is_returned for line in self.lines) else "Active"
 
 class Rental(Base):
-    """Rental transactions"""
+    """Rental transactions (one line item of a RentalOrder)"""
     __tablename__ = "rentals"
+    __table_args__ = (
+        # Lookups of a customer's rentals by start date (returns, history)
+        Index("ix_rentals_customer_rental_date", "customer_id", "rental_date"),
+        # Active/returned listings and dashboard counters
+        Index("ix_rentals_is_returned_rental_date", "is_returned", "rental_date"),
+        # Item delete checks and per-item rental lookups
+        Index("ix_rentals_item_id", "item_id"),
+        # Only the (small) set of open rentals, for the hot "is_returned = false" paths
+        Index("ix_rentals_active_item", "item_id", "customer_id",
+              postgresql_where=text("is_returned = false")),
+        Index("ix_rentals_order_id", "order_id"),
+        # Booked lines whose units have not been taken out of stock yet (see checkout.start_rentals)
+        Index("ix_rentals_not_started", "rental_date",
+              postgresql_where=text("is_started = false AND is_returned = false")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("rental_orders.id"))
     customer_id = Column(Integer, ForeignKey("customers.id"))
     item_id = Column(Integer, ForeignKey("items.id"))
     quantity = Column(Integer, nullable=False)
@@ -59,16 +108,63 @@ class Rental(Base):
     return_date = Column(Date, nullable=False)
     daily_rate = Column(Float, nullable=False)
     total_amount = Column(Float, nullable=False)
-    is_returned = Column(Boolean, default=False)
+    returned_quantity = Column(Integer, nullable=False, default=0)  # Units back so far
+    is_returned = Column(Boolean, default=False)  # Set once all units are back
+    is_started = Column(Boolean, nullable=False, default=False)  # Units taken off the item's available_quantity
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
+    order = relationship("RentalOrder", back_populates="lines")
     customer = relationship("Customer", back_populates="rentals")
     item = relationship("Item", back_populates="rentals")
 
-def create_tables():
-    """Create all tables in the database"""
-    Base.metadata.create_all(bind=engine)
+class StatsSummary(Base):
+    """Running dashboard totals, kept current by stats.py (a single row, id = 1)"""
+    __tablename__ = "stats_summary"
+    
+    id = Column(Integer, primary_key=True)
+    total_items = Column(Integer, nullable=False, default=0)
+    total_units = Column(Integer, nullable=False, default=0)  # Sum of item total quantities
+    units_out = Column(Integer, nullable=False, default=0)  # Units currently rented out
+    total_customers = Column(Integer, nullable=False, default=0)
+    active_rentals = Column(Integer, nullable=False, default=0)  # Rental lines not yet returned
+    total_revenue = Column(Float, nullable=False, default=0.0)  # Amount of returned rental lines
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DailyStats(Base):
+    """Per-day rollups behind the dashboard trends, kept current by stats.py"""
+    __tablename__ = "daily_stats"
+    __table_args__ = (
+        # The few past days that still have rentals out, for the overdue count
+        Index("ix_daily_stats_open_day", "day", postgresql_where=text("open_lines <> 0")),
+    )
+    
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)  # Orders starting this day
+    booked_revenue = Column(Float, nullable=False, default=0.0)  # Their total amount
+    open_lines = Column(Integer, nullable=False, default=0)  # Unreturned rental lines due back this day
+
+class Job(Base):
+    """Work to do after a rental commits (receipt, SMS), run by jobs.JobWorker"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # The worker's claim query only looks at jobs still to run
+        Index("ix_jobs_open", "id", postgresql_where=text("status IN ('pending', 'running')")),
+        Index("ix_jobs_order_id", "order_id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # receipt, sms
+    order_id = Column(Integer, nullable=False)  # No foreign key: deleting an order must not wait on its jobs
+    owner = Column(String)  # Host whose worker runs it (receipts are saved locally); None: any worker
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    result = Column(Text)  # Receipt path or SMS gateway message
+    error = Column(Text)  # Last failure
+    # Times come from the database clock so terminals with different clocks agree
+    run_after = Column(DateTime, nullable=False, server_default=func.now())
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
 
 def get_db():
     """Get database session"""
@@ -79,6 +175,7 @@ def get_db():
         db.close()
 
 def init_database():
-    """Initialize the database (no default items)"""
-    create_tables()
+    """Initialize the database, migrating only if the schema changed (no default items)"""
+    from migrations import ensure_schema
+    ensure_schema()
     print("Database initialized - ready for your inventory items")
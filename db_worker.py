@@ -0,0 +1,157 @@
+"""
+Background database worker for the rental management GUI.
+
+Queries and mutations run on a small thread pool instead of the Tk mainloop.
+Each worker thread owns its own SQLAlchemy session. Results are queued and
+handed back to callbacks on the UI thread from a root.after() poll, since Tk
+widgets must only be touched from the thread running the mainloop.
+
+Work functions receive a session and must return plain data (tuples, dicts),
+never ORM objects: the session is closed as soon as the work is done.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import SessionLocal
+
+
+class DBRequest:
+    """A unit of database work submitted to the DBExecutor"""
+    def __init__(self, work, on_success, on_error, key):
+        self.work = work
+        self.on_success = on_success
+        self.on_error = on_error
+        self.key = key
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        """Drop this request: skip it if not started yet, and discard its result otherwise"""
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class DBExecutor:
+    """Runs database work off the UI thread and reports back via root.after"""
+    def __init__(self, root, max_workers=2, poll_interval=25, on_busy_change=None):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.on_busy_change = on_busy_change
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self._local = threading.local()
+        self._results = queue.Queue()
+        self._latest = {}  # key -> newest DBRequest for that key
+        self._pending = 0
+        self._polling = False
+        self._closing = False
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def submit(self, work, on_success=None, on_error=None, key=None):
+        """
+        Run work(db) on a worker thread.
+
+        on_success(result) or on_error(exception) is called on the UI thread.
+        Submitting with a key cancels any older request with the same key, so
+        only the newest result (e.g. of a search) reaches the widgets.
+        Must be called from the UI thread.
+        """
+        request = DBRequest(work, on_success, on_error, key)
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = request
+
+        self._pending += 1
+        if self._pending == 1:
+            self._notify_busy(True)
+        request.future = self._pool.submit(self._run, request)
+        request.future.add_done_callback(lambda future: self._on_done(request, future))
+        self._schedule_poll()
+        return request
+
+    def cancel(self, key):
+        """Cancel the outstanding request with the given key, if any"""
+        request = self._latest.pop(key, None)
+        if request is not None:
+            request.cancel()
+
+    def shutdown(self):
+        """Stop accepting work and cancel anything not yet started"""
+        # Queued requests see the flag and return at once (shutdown's
+        # cancel_futures argument needs Python 3.9)
+        self._closing = True
+        self._pool.shutdown(wait=False)
+
+    def _session(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = SessionLocal()
+        return db
+
+    def _run(self, request):
+        """Worker thread: execute the request with this thread's session"""
+        if request.cancelled or self._closing:
+            self._results.put((request, None, None))
+            return
+        db = self._session()
+        try:
+            result = request.work(db)
+            self._results.put((request, result, None))
+        except Exception as e:
+            db.rollback()
+            self._results.put((request, None, e))
+        finally:
+            # Release the connection and identity map between jobs
+            db.close()
+
+    def _on_done(self, request, future):
+        # A request cancelled before it started never reaches _run, so its
+        # pending slot is released here instead
+        if future.cancelled():
+            self._results.put((request, None, None))
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        """UI thread: deliver finished results to their callbacks"""
+        self._polling = False
+        while True:
+            try:
+                request, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if request.key is not None and self._latest.get(request.key) is request:
+                del self._latest[request.key]
+            if request.cancelled:
+                continue
+            try:
+                if error is not None:
+                    if request.on_error:
+                        request.on_error(error)
+                    else:
+                        print(f"Database worker error: {error}")
+                elif request.on_success:
+                    request.on_success(result)
+            except Exception as e:
+                print(f"Database callback error: {e}")
+
+        if self._pending > 0:
+            self._schedule_poll()
+        else:
+            self._notify_busy(False)
+
+    def _notify_busy(self, busy):
+        if self.on_busy_change:
+            try:
+                self.on_busy_change(busy)
+            except Exception as e:
+                print(f"Busy indicator error: {e}")
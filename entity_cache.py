@@ -0,0 +1,100 @@
+"""
+Process-local cache of items and customers for the rental form.
+
+The item and customer combo boxes and their selection handlers used to run
+a query every time they changed. EntityCache keeps plain-data snapshots of
+every row of one table instead and is told which rows changed through
+invalidate(): by this terminal's ChangeBus, and by the other terminals
+through Postgres LISTEN/NOTIFY (see notifications.py). Invalidated rows are
+re-read on the next access, so reads between changes never touch the
+database. hits/misses counters show how well that works.
+"""
+import threading
+
+
+class EntityCache:
+    """Snapshots of every row of one model, kept until invalidated"""
+    def __init__(self, model, snapshot):
+        self.model = model
+        self.snapshot = snapshot     # snapshot(row) -> plain dict with 'id' and 'name'
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._rows = {}              # id -> snapshot
+        self._names = None           # name -> snapshot with the lowest id, rebuilt when needed
+        self._complete = False       # Whether _rows holds every row of the table
+        self._stale = set()          # Ids changed since they were cached
+        self._generation = 0         # Bumped by invalidate(); loads that overlap one are not kept
+
+    def all(self, db):
+        """Snapshots of every row, in id order"""
+        with self._lock:
+            if self._complete and not self._stale:
+                self.hits += 1
+                return [self._rows[row_id] for row_id in sorted(self._rows)]
+            self.misses += 1
+            generation, complete, stale = self._generation, self._complete, set(self._stale)
+
+        if complete:
+            fresh = {row.id: self.snapshot(row) for row in db.query(self.model).filter(self.model.id.in_(stale))}
+        else:
+            fresh = {row.id: self.snapshot(row) for row in db.query(self.model)}
+
+        with self._lock:
+            rows = dict(self._rows) if complete else fresh
+            for row_id in stale:
+                if row_id in fresh:
+                    rows[row_id] = fresh[row_id]
+                else:
+                    rows.pop(row_id, None)
+            # If rows changed again while loading, answer from what was read but cache nothing
+            if generation == self._generation:
+                self._rows, self._complete, self._stale, self._names = rows, True, set(), None
+        return [rows[row_id] for row_id in sorted(rows)]
+
+    def peek_name(self, name):
+        """The cached snapshot named name, or None if it is not cached (no database access)"""
+        with self._lock:
+            if self._names is None:
+                self._names = {}
+                for row_id in sorted(self._rows):
+                    self._names.setdefault(self._rows[row_id]['name'], self._rows[row_id])
+            row = self._names.get(name)
+            if row is None or row['id'] in self._stale:
+                return None
+            self.hits += 1
+            return row
+
+    def by_name(self, db, name):
+        """The snapshot of the first row named name, or None if there is none"""
+        row = self.peek_name(name)
+        if row is not None:
+            return row
+        with self._lock:
+            self.misses += 1
+            generation = self._generation
+        found = db.query(self.model).filter(self.model.name == name).order_by(self.model.id).first()
+        row = self.snapshot(found) if found is not None else None
+        with self._lock:
+            if row is not None and generation == self._generation:
+                self._rows[row['id']] = row
+                self._stale.discard(row['id'])
+                self._names = None
+        return row
+
+    def invalidate(self, ids=None):
+        """Forget the given row ids (None means all rows) so they are re-read on next use"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if ids is None:
+                self._rows, self._names, self._complete, self._stale = {}, None, False, set()
+            else:
+                self._stale.update(ids)
+
+    def stats(self):
+        """Counters for monitoring: hits, misses, invalidations and cached rows"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                    'rows': len(self._rows)}
@@ -0,0 +1,120 @@
+"""
+Change notifications and coalesced view refreshes for the GUI.
+
+Code that changes data publishes which kind of entity changed on a
+ChangeBus instead of calling every affected refresh method itself. A
+RefreshScheduler subscribes each view to the entities it shows and runs at
+most one refresh per view per idle tick, however many changes arrive in a
+burst. Views on notebook tabs that are not showing are only marked dirty
+and refreshed when their tab is selected.
+"""
+
+# Entity names published on the bus
+ITEMS = "items"
+CUSTOMERS = "customers"
+ORDERS = "orders"
+
+
+class ChangeBus:
+    """Publish/subscribe hub for "these entities changed" notifications"""
+    def __init__(self):
+        self._subscribers = {}   # entity -> list of (callback(entity, ids), wants remote changes)
+
+    def subscribe(self, entity, callback, remote=True):
+        """Call callback(entity, ids) whenever entity is published (with remote=False, only local changes)"""
+        self._subscribers.setdefault(entity, []).append((callback, remote))
+
+    def publish(self, entity, ids=None, remote=False):
+        """
+        Announce that rows of entity changed; ids=None means unknown or many
+        rows. remote is True for changes other terminals made.
+        """
+        for callback, wants_remote in list(self._subscribers.get(entity, ())):
+            if remote and not wants_remote:
+                continue
+            try:
+                callback(entity, ids)
+            except Exception as e:
+                print(f"Change handler error for {entity}: {e}")
+
+
+class RefreshScheduler:
+    """Coalesces change events into one refresh per view per idle tick"""
+    def __init__(self, root, bus, notebook=None):
+        self.root = root
+        self.bus = bus
+        self.notebook = notebook
+        self.views = {}          # name -> (refresh, update, tab frames)
+        self.pending = {}        # name -> {entity: set of ids} to apply, or None for a full refresh
+        self.dirty = set()       # Hidden views to refresh in full when their tab is shown
+        self._scheduled = None
+        if notebook is not None:
+            notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed, add='+')
+
+    def register(self, name, refresh, entities, frames=(), update=None, remote=True):
+        """
+        Refresh a view when any of entities changes.
+
+        frames are the notebook tabs the view appears on; with none given the
+        view is always refreshed. If update is given, update({entity: ids})
+        is called instead of refresh() when every change in the burst came
+        with the ids of the rows that changed. With remote=False changes made
+        by other terminals are ignored.
+        """
+        self.views[name] = (refresh, update, tuple(frames))
+        for entity in entities:
+            self.bus.subscribe(entity, lambda entity, ids, name=name: self.request(name, entity, ids), remote)
+
+    def request(self, name, entity=None, ids=None):
+        """Refresh a view on the next idle tick, in full unless entity and ids say which rows changed"""
+        changes = self.pending.get(name, {})
+        if changes is not None:
+            if entity is None or ids is None:
+                changes = None
+            else:
+                changes.setdefault(entity, set()).update(ids)
+        self.pending[name] = changes
+        if self._scheduled is None:
+            self._scheduled = self.root.after_idle(self._flush)
+
+    def _flush(self):
+        self._scheduled = None
+        pending, self.pending = self.pending, {}
+        for name, changes in pending.items():
+            refresh, update, frames = self.views[name]
+            if frames and not self._is_showing(frames):
+                self.dirty.add(name)
+                continue
+            self.dirty.discard(name)
+            try:
+                if changes is not None and update is not None:
+                    update(changes)
+                else:
+                    refresh()
+            except Exception as e:
+                print(f"Refresh error for {name}: {e}")
+
+    def _is_showing(self, frames):
+        if self.notebook is None:
+            return True
+        try:
+            current = self.notebook.index('current')
+            return any(self.notebook.index(frame) == current for frame in frames)
+        except Exception:
+            return True
+
+    def load_tab(self, frame):
+        """Load the views on a tab now even if it is hidden, e.g. to prefetch it"""
+        for name, (refresh, update, frames) in self.views.items():
+            if frame in frames and (name in self.dirty or name in self.pending):
+                self.dirty.discard(name)
+                self.pending.pop(name, None)
+                try:
+                    refresh()
+                except Exception as e:
+                    print(f"Refresh error for {name}: {e}")
+
+    def on_tab_changed(self, event=None):
+        """Refresh views that changed while their tab was hidden"""
+        for name in [name for name in self.dirty if self._is_showing(self.views[name][2])]:
+            self.request(name)
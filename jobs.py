@@ -0,0 +1,295 @@
+"""
+Receipts and SMS notifications, sent after a rental commits.
+
+checkout() adds a row to the jobs table for each receipt or SMS the cashier
+asked for, in the same transaction as the order, so a job exists exactly
+when its order does. JobWorker threads then run them off the checkout
+path: each claims the oldest job it may run with SELECT ... FOR UPDATE SKIP
+LOCKED, so any number of workers share the table without running a job
+twice, and reports every outcome as callback(JobStatus) from its own
+thread.
+
+A job that raises is retried after RETRY_DELAY seconds, doubling each time,
+until it has run MAX_ATTEMPTS times; JobFailed marks it failed straight
+away (the order is gone, SMS is disabled...). A job left "running" by a
+worker that died is picked up again once STALE_AFTER seconds have passed,
+or marked failed if that was its last attempt, so a job that kills its
+worker is not retried forever. A retried receipt overwrites the same file.
+
+Receipts are saved to the local receipts folder, so jobs are owned by the
+host that booked the order and only workers on that host run them. Jobs
+left over when the GUI closes run the next time it starts, or from a
+worker running on its own:
+
+    python jobs.py --worker
+    python jobs.py --status
+"""
+import argparse
+import os
+import socket
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from sqlalchemy import insert, update, func, text
+from database import SessionLocal, Job, RentalOrder
+from lazy_imports import lazy_import, missing_modules
+from queries import with_order_details
+
+receipt_generator = lazy_import('receipt_generator')
+sms_sender = lazy_import('sms_sender')
+
+# Job kinds
+RECEIPT = "receipt"
+SMS = "sms"
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Host whose workers run the jobs this process enqueues
+LOCAL_OWNER = socket.gethostname()
+
+# Runs of a job before it is marked failed
+MAX_ATTEMPTS = 5
+
+# Seconds before the first retry; doubled after each further failure
+RETRY_DELAY = 30
+
+# Seconds a job may stay "running" before another worker takes it over
+STALE_AFTER = 600
+
+# Folder receipts are saved in, one Rental_<order id>.pdf per order
+RECEIPTS_DIR = "receipts"
+
+# Seconds an idle worker waits before looking for jobs again (wake() cuts it short)
+POLL_INTERVAL = 5.0
+
+# A job's outcome as reported to JobWorker callbacks; status is PENDING when it will be retried
+JobStatus = namedtuple('JobStatus', 'id kind order_id status attempts result error')
+
+_CLAIM = text("""
+    UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = now()
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE (owner = :owner OR owner IS NULL)
+          AND ((status = 'pending' AND run_after <= now())
+               OR (status = 'running' AND updated_at < now() - make_interval(secs => :stale)
+                   AND attempts < :max_attempts))
+        ORDER BY id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, order_id, attempts
+""")
+
+# Stale jobs whose last attempt was the one that never finished
+_FAIL_ABANDONED = text("""
+    UPDATE jobs SET status = 'failed', updated_at = now(),
+                    error = 'Worker stopped during each of ' || attempts || ' attempts'
+    WHERE (owner = :owner OR owner IS NULL)
+      AND status = 'running' AND updated_at < now() - make_interval(secs => :stale)
+      AND attempts >= :max_attempts
+""")
+
+
+class JobFailed(Exception):
+    """A job failure that retrying cannot fix"""
+
+
+def enqueue(db, order_id, kinds, owner=LOCAL_OWNER):
+    """Add a pending job of each kind for order_id to db's transaction (not committed)"""
+    if kinds:
+        db.execute(insert(Job), [{'kind': kind, 'order_id': order_id, 'owner': owner} for kind in kinds])
+
+
+def claim(db, owner=LOCAL_OWNER):
+    """Mark the oldest job owner may run as running and commit; its (id, kind, order_id, attempts), or None"""
+    params = {'owner': owner, 'stale': STALE_AFTER, 'max_attempts': MAX_ATTEMPTS}
+    db.execute(_FAIL_ABANDONED, params)
+    row = db.execute(_CLAIM, params).first()
+    db.commit()
+    return row
+
+
+def finish(db, job, error=None, result=None, retry=False):
+    """Record how a claimed job ended and commit; returns its JobStatus"""
+    if error is None:
+        status = DONE
+    elif retry and job.attempts < MAX_ATTEMPTS:
+        status = PENDING
+    else:
+        status = FAILED
+    values = {'status': status, 'result': result, 'error': error, 'updated_at': func.now()}
+    if status == PENDING:
+        values['run_after'] = func.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+    db.execute(update(Job).where(Job.id == job.id).values(**values))
+    db.commit()
+    return JobStatus(job.id, job.kind, job.order_id, status, job.attempts, result, error)
+
+
+def load_order(db, order_id):
+    """The RentalOrder a job is for, with its customer and lines"""
+    order = with_order_details(db.query(RentalOrder)).filter(RentalOrder.id == order_id).first()
+    if order is None:
+        raise JobFailed(f"Rental #{order_id} no longer exists")
+    return order
+
+
+_generator = None
+
+
+def send_receipt(db, order_id):
+    """Save the order's PDF receipt; returns its path"""
+    global _generator
+    missing = missing_modules('reportlab')
+    if missing:
+        raise JobFailed(f"Receipts need the {missing[0]} package")
+    from receipt_batch import order_rental_data, company_details
+    rental_data = order_rental_data(load_order(db, order_id))
+    if _generator is None:
+        _generator = receipt_generator.ReceiptGenerator(**company_details())
+    os.makedirs(RECEIPTS_DIR, exist_ok=True)
+    return _generator.generate_receipt(rental_data, os.path.join(RECEIPTS_DIR, f"Rental_{order_id}.pdf"))
+
+
+def send_sms(db, order_id):
+    """Text the customer their receipt details; returns the gateway's message"""
+    missing = missing_modules('requests')
+    if missing:
+        raise JobFailed(f"SMS needs the {missing[0]} package")
+    from sms_config import get_sms_config
+    order = load_order(db, order_id)
+    if not order.customer.phone:
+        raise JobFailed("Customer has no phone number")
+
+    sms_config = get_sms_config()
+    sender = sms_sender.SMSSender()
+    sender.gateway = sms_config['gateway']
+    sender.api_key = sms_config['api_key']
+    sender.api_secret = sms_config['api_secret']
+    sender.sender_id = sms_config['sender_id']
+    if sender.gateway == 'disabled':
+        raise JobFailed("SMS is disabled. Configure SMS gateway in sms_config.py")
+
+    result = sender.send_receipt_notification(
+        phone_number=order.customer.phone,
+        customer_name=order.customer.name,
+        rental_id=str(order.id),
+        total_amount=float(order.total_amount),
+        return_date=order.return_date.strftime('%Y-%m-%d'),
+        currency='GHS'
+    )
+    if not result.get('success'):
+        raise RuntimeError(result.get('message') or "SMS gateway refused the message")
+    return result.get('message', '')
+
+
+# Job kind -> handler(db, order_id) returning the text stored as the job's result
+HANDLERS = {
+    RECEIPT: send_receipt,
+    SMS: send_sms,
+}
+
+
+def run_next(owner=LOCAL_OWNER):
+    """Claim and run one job; its JobStatus, or None if there was nothing to run"""
+    db = SessionLocal()
+    try:
+        job = claim(db, owner)
+        if job is None:
+            return None
+        try:
+            handler = HANDLERS.get(job.kind)
+            if handler is None:
+                raise JobFailed(f"Unknown job kind {job.kind!r}")
+            result = handler(db, job.order_id)
+        except JobFailed as e:
+            db.rollback()
+            return finish(db, job, error=str(e))
+        except Exception as e:
+            db.rollback()
+            return finish(db, job, error=f"{type(e).__name__}: {e}", retry=True)
+        return finish(db, job, result=result)
+    finally:
+        db.close()
+
+
+class JobWorker(threading.Thread):
+    """Background thread running jobs and reporting each outcome as callback(JobStatus)"""
+    def __init__(self, callback=None, owner=LOCAL_OWNER):
+        super().__init__(name="job-worker", daemon=True)
+        self.callback = callback
+        self.owner = owner
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+
+    def wake(self):
+        """Look for jobs now instead of after POLL_INTERVAL (call after enqueueing)"""
+        self._wake.set()
+
+    def stop(self):
+        """Ask the thread to finish once the job it is running is done"""
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                status = run_next(self.owner)
+            except Exception as e:
+                print(f"Job worker error, retrying in {POLL_INTERVAL:.0f}s: {e}")
+                status = None
+            if status is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+            elif self.callback is not None:
+                try:
+                    self.callback(status)
+                except Exception as e:
+                    print(f"Job worker handler error for job {status.id}: {e}")
+
+
+def start_worker(callback=None, owner=LOCAL_OWNER):
+    """A running JobWorker"""
+    worker = JobWorker(callback, owner)
+    worker.start()
+    return worker
+
+
+def print_status(status):
+    """Print one JobStatus the way the worker CLI reports it"""
+    outcome = status.result if status.status == DONE else status.error
+    print(f"job {status.id} ({status.kind} for rental #{status.order_id}): {status.status} "
+          f"after {status.attempts} attempt(s): {outcome}")
+
+
+def summary(db):
+    """(kind, status, count) over the jobs table"""
+    return [tuple(row) for row in db.query(Job.kind, Job.status, func.count(Job.id))
+            .group_by(Job.kind, Job.status).order_by(Job.kind, Job.status)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receipt and SMS jobs")
+    parser.add_argument("--worker", action="store_true", help="Run jobs until interrupted")
+    parser.add_argument("--status", action="store_true", help="Count jobs by kind and status")
+    args = parser.parse_args()
+    if args.status:
+        db = SessionLocal()
+        try:
+            for kind, status, count in summary(db):
+                print(f"{kind:8} {status:8} {count}")
+        finally:
+            db.close()
+    elif args.worker:
+        worker = start_worker(print_status)
+        print(f"Running jobs for {LOCAL_OWNER}; Ctrl+C to stop")
+        try:
+            while worker.is_alive():
+                worker.join(1.0)
+        except KeyboardInterrupt:
+            worker.stop()
+    else:
+        parser.print_help()
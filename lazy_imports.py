@@ -0,0 +1,56 @@
+"""
+Deferred imports for heavy optional dependencies.
+
+reportlab (receipts), requests and twilio (SMS) and PIL (logo) take a large
+share of startup time but are only needed once a receipt, SMS or image is
+actually produced. lazy_import() returns a stand-in that imports the real
+module on first attribute access, and is_available() checks that a module
+could be imported without importing it.
+"""
+import importlib
+import importlib.util
+import threading
+
+
+def missing_modules(*names):
+    """The names among the given top-level modules that cannot be imported"""
+    missing = []
+    for name in names:
+        try:
+            if importlib.util.find_spec(name) is None:
+                missing.append(name)
+        except (ImportError, ValueError):
+            missing.append(name)
+    return missing
+
+
+def is_available(*names):
+    """Whether all of the given top-level modules can be imported (without importing them)"""
+    return not missing_modules(*names)
+
+
+class LazyModule:
+    """Stands in for a module and imports it the first time an attribute is used"""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Receipts and SMS are produced on worker threads, so guard the import
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """A LazyModule for the named module"""
+    return LazyModule(name)
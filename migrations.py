@@ -0,0 +1,383 @@
+"""
+Versioned schema migrations for the rental management system.
+
+Each migration has an integer version and is applied at most once per
+database; applied versions are recorded in the schema_migrations table.
+Migrations must be idempotent (IF NOT EXISTS etc.) so that installs created
+by an older create_all() call can be upgraded safely.
+
+At launch ensure_schema() compares a fingerprint of the models and the
+migration list with the one stored in the single-row schema_version table,
+and only runs migrations (and their DDL) when they differ.
+"""
+import hashlib
+import sys
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from database import engine, Base, StatsSummary, DailyStats, Job
+import stats
+
+# Arbitrary key for the Postgres advisory lock that serialises migration runs
+# when several terminals start at the same time
+MIGRATION_LOCK_KEY = 7203145
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration function under the given version number"""
+    def decorator(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        return upgrade
+    return decorator
+
+
+@migration(1, "Create base tables")
+def create_base_tables(conn):
+    # The tables as the first release created them; later migrations add the rest
+    statements = [
+        "CREATE TABLE IF NOT EXISTS items ("
+        "id SERIAL PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "description VARCHAR, "
+        "total_quantity INTEGER NOT NULL, "
+        "available_quantity INTEGER NOT NULL, "
+        "daily_rate DOUBLE PRECISION NOT NULL, "
+        "created_at TIMESTAMP)",
+        "CREATE TABLE IF NOT EXISTS customers ("
+        "id SERIAL PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "phone VARCHAR, "
+        "email VARCHAR, "
+        "address VARCHAR, "
+        "customer_type VARCHAR, "
+        "discount_percentage DOUBLE PRECISION, "
+        "notes VARCHAR, "
+        "created_at TIMESTAMP)",
+        "CREATE TABLE IF NOT EXISTS rentals ("
+        "id SERIAL PRIMARY KEY, "
+        "customer_id INTEGER REFERENCES customers (id), "
+        "item_id INTEGER REFERENCES items (id), "
+        "quantity INTEGER NOT NULL, "
+        "rental_date DATE NOT NULL, "
+        "return_date DATE NOT NULL, "
+        "daily_rate DOUBLE PRECISION NOT NULL, "
+        "total_amount DOUBLE PRECISION NOT NULL, "
+        "is_returned BOOLEAN, "
+        "created_at TIMESTAMP)",
+        "CREATE INDEX IF NOT EXISTS ix_items_id ON items (id)",
+        "CREATE INDEX IF NOT EXISTS ix_customers_id ON customers (id)",
+        "CREATE INDEX IF NOT EXISTS ix_rentals_id ON rentals (id)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+@migration(2, "Add lookup and active-rental indexes")
+def add_rental_indexes(conn):
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_items_name ON items (name)",
+        "CREATE INDEX IF NOT EXISTS ix_customers_name ON customers (name)",
+        "CREATE INDEX IF NOT EXISTS ix_rentals_customer_rental_date ON rentals (customer_id, rental_date)",
+        "CREATE INDEX IF NOT EXISTS ix_rentals_is_returned_rental_date ON rentals (is_returned, rental_date)",
+        "CREATE INDEX IF NOT EXISTS ix_rentals_item_id ON rentals (item_id)",
+        "CREATE INDEX IF NOT EXISTS ix_rentals_active_item ON rentals (item_id, customer_id) WHERE is_returned = false",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+@migration(3, "Add rental_orders header table and backfill existing rentals")
+def add_rental_orders(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS rental_orders ("
+        "id SERIAL PRIMARY KEY, "
+        "customer_id INTEGER NOT NULL REFERENCES customers (id), "
+        "rental_date DATE NOT NULL, "
+        "return_date DATE NOT NULL, "
+        "days INTEGER NOT NULL, "
+        "subtotal DOUBLE PRECISION NOT NULL DEFAULT 0, "
+        "discount_percentage DOUBLE PRECISION NOT NULL DEFAULT 0, "
+        "total_amount DOUBLE PRECISION NOT NULL DEFAULT 0, "
+        "status VARCHAR NOT NULL DEFAULT 'Active', "
+        "created_at TIMESTAMP)"
+    ))
+    conn.execute(text("ALTER TABLE rentals ADD COLUMN IF NOT EXISTS order_id INTEGER REFERENCES rental_orders (id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_rental_orders_id ON rental_orders (id)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_rental_orders_status_rental_date ON rental_orders (status, rental_date, id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_rental_orders_customer_id ON rental_orders (customer_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_rentals_order_id ON rentals (order_id)"))
+
+    # Backfill: one order per (customer, start date, return date), which is how
+    # the GUI used to group rentals
+    conn.execute(text("""
+        INSERT INTO rental_orders (customer_id, rental_date, return_date, days, subtotal,
+                                   discount_percentage, total_amount, status, created_at)
+        SELECT customer_id, rental_date, return_date, days, subtotal,
+               CASE WHEN subtotal > 0 THEN ROUND(CAST((1 - total_amount / subtotal) * 100 AS NUMERIC), 2)
+                    ELSE 0 END,
+               total_amount, status, created_at
+        FROM (
+            SELECT customer_id, rental_date, return_date,
+                   GREATEST(return_date - rental_date, 1) AS days,
+                   SUM(daily_rate * quantity * GREATEST(return_date - rental_date, 1)) AS subtotal,
+                   SUM(total_amount) AS total_amount,
+                   CASE WHEN bool_and(COALESCE(is_returned, false)) THEN 'Returned' ELSE 'Active' END AS status,
+                   MIN(created_at) AS created_at
+            FROM rentals
+            WHERE order_id IS NULL AND customer_id IS NOT NULL
+            GROUP BY customer_id, rental_date, return_date
+        ) AS grouped
+    """))
+    conn.execute(text("""
+        UPDATE rentals AS r
+        SET order_id = o.id
+        FROM rental_orders AS o
+        WHERE r.order_id IS NULL
+          AND o.customer_id = r.customer_id
+          AND o.rental_date = r.rental_date
+          AND o.return_date = r.return_date
+    """))
+
+
+@migration(4, "Add keyset pagination index for rental history")
+def add_history_pagination_index(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_rental_orders_rental_date_id ON rental_orders (rental_date, id)"))
+
+
+@migration(5, "Add pg_trgm search indexes when the extension is available")
+def add_trigram_indexes(conn):
+    if not _is_postgres(conn):
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        # Search falls back to ranking in process; run `python migrations.py --trigram`
+        # once the extension has been installed on the server
+        print(f"pg_trgm not available, skipping trigram indexes: {e}")
+        return
+    create_trigram_indexes(conn)
+
+
+@migration(6, "Add stats_summary and daily_stats dashboard rollups")
+def add_stats_rollups(conn):
+    Base.metadata.create_all(bind=conn, tables=[StatsSummary.__table__, DailyStats.__table__])
+    stats.rebuild(conn, *stats.compute(conn))
+
+
+@migration(7, "Add change-notification triggers for items and customers")
+def add_change_notify_triggers(conn):
+    if not _is_postgres(conn):
+        return
+    create_notify_function(conn)
+    create_notify_trigger(conn, "items", "items_changed")
+    create_notify_trigger(conn, "customers", "customers_changed")
+
+
+@migration(8, "Add change-notification triggers for rental orders and their lines")
+def add_order_notify_triggers(conn):
+    if not _is_postgres(conn):
+        return
+    create_notify_function(conn)
+    create_notify_trigger(conn, "rental_orders", "orders_changed")
+    create_notify_trigger(conn, "rentals", "orders_changed", "order_id")
+
+
+@migration(9, "Add rentals.returned_quantity for partial returns")
+def add_returned_quantity(conn):
+    conn.execute(text("ALTER TABLE rentals ADD COLUMN IF NOT EXISTS returned_quantity INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text("UPDATE rentals SET returned_quantity = quantity WHERE is_returned = true"))
+
+
+@migration(10, "Add jobs table for receipts and SMS sent after checkout")
+def add_jobs(conn):
+    Base.metadata.create_all(bind=conn, tables=[Job.__table__])
+
+
+@migration(11, "Add rentals.is_started: take units out of stock when a rental starts")
+def add_is_started(conn):
+    conn.execute(text("ALTER TABLE rentals ADD COLUMN IF NOT EXISTS is_started BOOLEAN NOT NULL DEFAULT false"))
+    # Open bookings that have not started yet were taken out of stock at checkout; put them back
+    conn.execute(text("""
+        UPDATE items SET available_quantity = items.available_quantity + future.units
+        FROM (SELECT item_id, SUM(quantity - returned_quantity) AS units FROM rentals
+              WHERE is_returned = false AND rental_date > CURRENT_DATE GROUP BY item_id) AS future
+        WHERE items.id = future.item_id
+    """))
+    conn.execute(text("UPDATE rentals SET is_started = true WHERE rental_date <= CURRENT_DATE"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_rentals_not_started ON rentals (rental_date) "
+        "WHERE is_started = false AND is_returned = false"
+    ))
+    stats.rebuild(conn, *stats.compute(conn))
+
+
+def create_trigram_indexes(conn):
+    """GIN trigram indexes behind search.search (ILIKE and similarity ranking)"""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_items_name_trgm ON items USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_items_description_trgm ON items USING gin (description gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_customers_name_trgm ON customers USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_customers_phone_trgm ON customers USING gin (phone gin_trgm_ops)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def create_notify_function(conn):
+    """Trigger function sending a row's id column (trigger argument 2) on a channel (argument 1)"""
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION notify_row_change() RETURNS trigger AS $$
+        DECLARE
+            changed jsonb;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := to_jsonb(OLD);
+            ELSE
+                changed := to_jsonb(NEW);
+            END IF;
+            PERFORM pg_notify(TG_ARGV[0], COALESCE(changed ->> TG_ARGV[1], ''));
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+
+
+def create_notify_trigger(conn, table, channel, id_column="id"):
+    """Notify channel with id_column of every row inserted, updated or deleted in table (see notifications.py)"""
+    conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_notify ON {table}"))
+    conn.execute(text(
+        f"CREATE TRIGGER {table}_notify AFTER INSERT OR UPDATE OR DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION notify_row_change('{channel}', '{id_column}')"
+    ))
+
+
+def _is_postgres(conn):
+    return conn.dialect.name == "postgresql"
+
+
+def run_migrations(bind=engine, fingerprint=None):
+    """Apply all pending migrations in version order, then record fingerprint if given"""
+    with bind.connect() as conn:
+        if _is_postgres(conn):
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, "
+                "description VARCHAR NOT NULL, "
+                "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+            ))
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), "
+                "fingerprint VARCHAR NOT NULL, "
+                "updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+            ))
+            applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+            conn.commit()
+
+            for version, description, upgrade in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version in applied:
+                    continue
+                upgrade(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                    {"version": version, "description": description}
+                )
+                conn.commit()
+                print(f"Applied migration {version}: {description}")
+
+            if fingerprint is not None:
+                conn.execute(text(
+                    "INSERT INTO schema_version (id, fingerprint, updated_at) VALUES (1, :fingerprint, CURRENT_TIMESTAMP) "
+                    "ON CONFLICT (id) DO UPDATE SET fingerprint = excluded.fingerprint, updated_at = excluded.updated_at"
+                ), {"fingerprint": fingerprint})
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if _is_postgres(conn):
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                conn.commit()
+
+
+def schema_fingerprint(metadata=Base.metadata):
+    """Hash of the model tables, columns and indexes plus the registered migrations"""
+    parts = [f"migration {version} {description}" for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0])]
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"table {table.name}")
+        for column in table.columns:
+            parts.append(f"column {column.name} {column.type} nullable={column.nullable} pk={column.primary_key} "
+                         f"fk={sorted(fk.target_fullname for fk in column.foreign_keys)}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            parts.append(f"index {index.name} {[str(e) for e in index.expressions]} unique={index.unique} "
+                         f"where={index.dialect_options['postgresql'].get('where')}")
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def stored_fingerprint(bind=engine):
+    """The fingerprint recorded by the last migration run, or None if there is none"""
+    try:
+        with bind.connect() as conn:
+            row = conn.execute(text("SELECT fingerprint FROM schema_version WHERE id = 1")).first()
+    except DBAPIError:
+        # New database, or one migrated before schema_version existed
+        return None
+    return row[0] if row else None
+
+
+def ensure_schema(bind=engine):
+    """
+    Run migrations only if the models or migrations changed since the last
+    run; otherwise the launch costs a single one-row query. Returns True if
+    migrations were run.
+    """
+    start = time.perf_counter()
+    fingerprint = schema_fingerprint()
+    if stored_fingerprint(bind) == fingerprint:
+        print(f"Schema up to date (checked in {(time.perf_counter() - start) * 1000:.1f} ms)")
+        return False
+    run_migrations(bind, fingerprint)
+    print(f"Schema migrated in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return True
+
+
+# Hot-path queries whose plans should use the migration indexes
+HOT_QUERIES = {
+    "active rentals": "SELECT * FROM rentals WHERE is_returned = false",
+    "customer rentals by date": (
+        "SELECT * FROM rentals WHERE customer_id = 1 AND rental_date = CURRENT_DATE AND is_returned = false"
+    ),
+    "active rental count": "SELECT count(*) FROM rentals WHERE is_returned = false",
+    "returned revenue": "SELECT sum(total_amount) FROM rentals WHERE is_returned = true",
+}
+
+
+def explain_hot_queries(bind=engine):
+    """Print EXPLAIN ANALYZE output for the hot-path rental queries"""
+    with bind.connect() as conn:
+        for name, query in HOT_QUERIES.items():
+            print(f"--- {name} ---")
+            for row in conn.execute(text(f"EXPLAIN ANALYZE {query}")):
+                print(row[0])
+            print()
+
+
+if __name__ == "__main__":
+    # python migrations.py            -> apply pending migrations
+    # python migrations.py --explain  -> show query plans for the hot paths
+    # python migrations.py --trigram  -> install pg_trgm and its search indexes
+    if "--explain" in sys.argv:
+        explain_hot_queries()
+    elif "--trigram" in sys.argv:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            create_trigram_indexes(conn)
+    else:
+        run_migrations(fingerprint=schema_fingerprint())
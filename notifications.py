@@ -0,0 +1,119 @@
+"""
+Cross-terminal change notifications over Postgres LISTEN/NOTIFY.
+
+Triggers installed by migrations 7 and 8 send the id of every inserted,
+updated or deleted row (the order id for rental lines) on a channel per
+entity. ChangeListener holds one extra connection that LISTENs on those
+channels and reports each batch of notifications as callback(entity, ids)
+from its own thread, so every terminal hears about changes made by the
+others right after they commit. Changes made through this process's own
+connections are skipped: they are already published on its ChangeBus.
+"""
+import select
+import threading
+from sqlalchemy import event
+from events import ITEMS, CUSTOMERS, ORDERS
+
+# Entity -> channel its table's trigger notifies on
+CHANNELS = {
+    ITEMS: "items_changed",
+    CUSTOMERS: "customers_changed",
+    ORDERS: "orders_changed",
+}
+
+# Seconds between checks for stop() while no notification arrives
+POLL_TIMEOUT = 1.0
+
+# Seconds to wait before reconnecting after the connection dropped
+RETRY_DELAY = 5.0
+
+
+class ChangeListener(threading.Thread):
+    """Background thread turning NOTIFY messages into callback(entity, ids) calls"""
+    def __init__(self, bind, callback, entities=tuple(CHANNELS), ignore_pids=()):
+        super().__init__(name="change-listener", daemon=True)
+        self.bind = bind
+        self.callback = callback
+        self.entities = {CHANNELS[entity]: entity for entity in entities}
+        self.ignore_pids = ignore_pids   # Backends whose notifications are not reported
+        self._stopping = threading.Event()
+        self._connected = False
+
+    def stop(self):
+        """Ask the thread to finish; it exits within POLL_TIMEOUT seconds"""
+        self._stopping.set()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"Change listener error, reconnecting in {RETRY_DELAY:.0f}s: {e}")
+                self._stopping.wait(RETRY_DELAY)
+
+    def _listen(self):
+        raw = self.bind.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                for channel in self.entities:
+                    cursor.execute(f"LISTEN {channel}")
+            # After a reconnect anything may have changed while we were not listening
+            if self._connected:
+                for entity in self.entities.values():
+                    self._report(entity, None)
+            self._connected = True
+
+            while not self._stopping.is_set():
+                if not select.select([conn], [], [], POLL_TIMEOUT)[0]:
+                    continue
+                conn.poll()
+                changes = {}
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    entity = self.entities.get(notify.channel)
+                    if entity is None or notify.pid in self.ignore_pids:
+                        continue
+                    ids = changes.setdefault(entity, set())
+                    if ids is not None and notify.payload.isdigit():
+                        ids.add(int(notify.payload))
+                    else:
+                        changes[entity] = None
+                for entity, ids in changes.items():
+                    self._report(entity, ids)
+        finally:
+            # Drop rather than pool the connection: it is still LISTENing
+            raw.invalidate()
+
+    def _report(self, entity, ids):
+        try:
+            self.callback(entity, ids)
+        except Exception as e:
+            print(f"Change listener handler error for {entity}: {e}")
+
+
+def track_backend_pids(bind):
+    """A set kept filled with the server process ids of bind's pooled connections"""
+    pids = set()
+
+    def checkout(dbapi_connection, record, proxy):
+        if 'backend_pid' not in record.info:
+            record.info['backend_pid'] = dbapi_connection.get_backend_pid()
+        pids.add(record.info['backend_pid'])
+
+    def close(dbapi_connection, record):
+        pids.discard(record.info.get('backend_pid'))
+
+    event.listen(bind, 'checkout', checkout)
+    event.listen(bind, 'close', close)
+    return pids
+
+
+def start_listener(bind, callback, entities=tuple(CHANNELS)):
+    """A running ChangeListener, or None when the database cannot notify (not Postgres)"""
+    if bind.dialect.name != "postgresql":
+        return None
+    listener = ChangeListener(bind, callback, entities, ignore_pids=track_backend_pids(bind))
+    listener.start()
+    return listener
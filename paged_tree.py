@@ -0,0 +1,190 @@
+"""
+Virtual scrolling for large ttk.Treeview lists.
+
+Rows are fetched a page at a time (see queries.keyset_page) through the
+background DBExecutor as the user scrolls, and only a bounded window of rows
+is kept in the Treeview. Rows scrolled far out of view are dropped and
+fetched again if the user scrolls back to them.
+"""
+from queries import PAGE_SIZE
+from tree_sync import TreeSync
+
+
+class PagedTreeview:
+    """Keyset-paginated, windowed loading of a ttk.Treeview"""
+    def __init__(self, tree, scrollbar, executor, fetch_page, name,
+                 page_size=PAGE_SIZE, max_rows=PAGE_SIZE * 5, threshold=0.1, descending=True):
+        """
+        fetch_page(db, after, limit, backward, inclusive) runs on a worker thread
+        and must return a queries.KeysetPage whose items are (iid, values) tuples,
+        in descending key order unless descending is False.
+        """
+        self.tree = tree
+        self.sync = TreeSync(tree)
+        self.scrollbar = scrollbar
+        self.executor = executor
+        self.fetch_page = fetch_page
+        self.name = name
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.threshold = threshold
+        self.descending = descending
+
+        self.keys = []                  # Sort key of each resident row, in display order
+        self.has_more_below = False
+        self.has_more_above = False
+        self.loading = False
+        self.showing_results = False    # A fixed result list is shown instead of pages
+
+        self.tree.configure(yscrollcommand=self._on_scroll)
+
+    def reload(self):
+        """Discard the resident rows and load the first page"""
+        def done(page):
+            self.loading = False
+            self.showing_results = False
+            self.sync.clear()
+            self.keys = []
+            self.has_more_above = False
+            self._append(page)
+            self.tree.yview_moveto(0)
+
+        self._fetch(None, False, done)
+
+    def refresh(self):
+        """Re-read the resident window and apply only the rows that changed"""
+        if not self.keys or self.showing_results:
+            self.reload()
+            return
+
+        def done(page):
+            self.loading = False
+            self.sync.apply(page.items)
+            self.keys = list(page.keys)
+            self.has_more_below = page.has_more
+
+        # Start from the first resident row, or from the top if nothing above
+        # it was dropped, so rows added at the top show up
+        after = self.keys[0] if self.has_more_above else None
+        self._fetch(after, False, done, limit=max(len(self.keys), self.page_size), inclusive=True)
+
+    def show_results(self, fetch_rows):
+        """
+        Show a fixed list of rows, e.g. search results, with paging off until
+        the next reload() or refresh(). fetch_rows(db) runs on a worker thread
+        and returns (iid, values) tuples.
+        """
+        def done(rows):
+            self.loading = False
+            self.showing_results = True
+            self.sync.apply(rows)
+            self.keys = []
+            self.has_more_below = self.has_more_above = False
+
+        self._submit(fetch_rows, done)
+
+    def apply_changes(self, changed, removed=()):
+        """
+        Apply individual row changes without re-reading the window.
+
+        changed holds (iid, values, key) for rows that were added or edited,
+        removed the iids of deleted rows. Added rows are only shown if their
+        key falls inside the loaded window (or above it, when the window
+        starts at the top); search results only have existing rows updated.
+        """
+        if self.loading:
+            # A page load is in flight and would overwrite this; re-read instead
+            self.refresh()
+            return
+        removed = {str(iid) for iid in removed}
+        if self.showing_results:
+            updates = {str(iid): tuple(values) for iid, values, key in changed}
+            self.sync.apply((iid, updates.get(iid, self.sync.rows[iid]))
+                            for iid in self.sync.order if iid not in removed)
+            return
+
+        rows = {iid: (key, self.sync.rows[iid]) for iid, key in zip(self.sync.order, self.keys)
+                if iid not in removed}
+        for iid, values, key in changed:
+            iid = str(iid)
+            # Rows that sort outside the loaded window are left to paging
+            if self.keys and ((self.has_more_below and self._before(self.keys[-1], key)) or
+                              (self.has_more_above and self._before(key, self.keys[0]))):
+                rows.pop(iid, None)
+            else:
+                rows[iid] = (key, tuple(values))
+
+        ordered = sorted(rows.items(), key=lambda row: row[1][0], reverse=self.descending)
+        self.sync.apply((iid, values) for iid, (key, values) in ordered)
+        self.keys = [key for iid, (key, values) in ordered]
+
+    def _before(self, a, b):
+        """Whether key a is shown above key b"""
+        return a > b if self.descending else a < b
+
+    def _fetch(self, after, backward, on_page, limit=None, inclusive=False):
+        limit = limit or self.page_size
+
+        def work(db):
+            return self.fetch_page(db, after, limit, backward, inclusive)
+
+        self._submit(work, on_page)
+
+    def _submit(self, work, on_done):
+        # One key for every load, so a newer page or result list always wins
+        self.loading = True
+
+        def failed(e):
+            self.loading = False
+            print(f"{self.name} page load error: {e}")
+
+        self.executor.submit(work, on_done, failed, key=f"{self.name}_page")
+
+    def _on_scroll(self, first, last):
+        """yscrollcommand hook: update the scrollbar and load more rows near either edge"""
+        self.scrollbar.set(first, last)
+        if self.loading:
+            return
+        if float(last) >= 1.0 - self.threshold and self.has_more_below:
+            self._load_below()
+        elif float(first) <= self.threshold and self.has_more_above:
+            self._load_above()
+
+    def _load_below(self):
+        def done(page):
+            self.loading = False
+            self._append(page)
+            # Drop rows from the top once the window is full
+            excess = len(self.keys) - self.max_rows
+            if excess > 0:
+                self.sync.delete(*self.sync.order[:excess])
+                del self.keys[:excess]
+                self.has_more_above = True
+
+        self._fetch(self.keys[-1] if self.keys else None, False, done)
+
+    def _load_above(self):
+        def done(page):
+            self.loading = False
+            anchor = self.sync.order[:1]
+            for index, (iid, values) in enumerate(page.items):
+                self.sync.insert(index, iid, values)
+            self.keys[:0] = page.keys
+            self.has_more_above = page.has_more
+            # Drop rows from the bottom once the window is full
+            excess = len(self.keys) - self.max_rows
+            if excess > 0:
+                self.sync.delete(*self.sync.order[-excess:])
+                del self.keys[-excess:]
+                self.has_more_below = True
+            # Keep the row the user was looking at in view
+            if anchor:
+                self.tree.see(anchor[0])
+
+        self._fetch(self.keys[0], True, done)
+
+    def _append(self, page):
+        for iid, values in page.items:
+            self.sync.insert('end', iid, values)
+        self.keys.extend(page.keys)
+        self.has_more_below = page.has_more
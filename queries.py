@@ -0,0 +1,132 @@
+"""
+Shared read queries for the rental management GUI and web feeds.
+
+List views touch each order's customer and each line's item. Loaded lazily
+that is extra SELECTs per row, so the order queries here load them up front
+and every list builder issues a fixed number of statements however many
+orders there are (see tests/test_queries.py).
+"""
+from sqlalchemy import and_, or_, event, tuple_
+from sqlalchemy.orm import joinedload
+from database import engine, SessionLocal, Rental, RentalOrder
+
+# Default number of rows fetched per page by the paginated views
+PAGE_SIZE = 200
+
+# Most statements any list builder may issue, regardless of row count
+MAX_LIST_STATEMENTS = 1
+
+# Sort key of the rental history: newest start date first, id breaks ties
+HISTORY_KEY = (RentalOrder.rental_date, RentalOrder.id)
+
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+    def __init__(self, items, keys, has_more):
+        self.items = items          # Rows in display order
+        self.keys = keys            # Sort key tuple of each row
+        self.has_more = has_more    # More rows exist past the end of this page
+
+
+def row_key(row, key_columns):
+    """The sort key tuple of an ORM row for the given key columns"""
+    return tuple(getattr(row, column.key) for column in key_columns)
+
+
+def keyset_page(query, key_columns, after=None, limit=PAGE_SIZE, descending=True, backward=False,
+                inclusive=False):
+    """
+    Fetch one page of query results ordered by key_columns.
+
+    Rows are returned strictly after the key `after` in display order (or
+    strictly before it when backward=True, e.g. when scrolling up past rows
+    that were dropped from a view). The key columns must be unique together
+    and should be covered by an index so each page is a short index range scan
+    regardless of how deep into the results it is. With inclusive=True the
+    row at `after` itself is included, which re-reads a window from its
+    first row.
+    """
+    # Scanning backwards is the same as scanning forwards in the opposite order
+    scan_descending = descending != backward
+    if after is not None:
+        position = tuple_(*key_columns)
+        bound = tuple_(*after)
+        if scan_descending:
+            query = query.filter(position <= bound if inclusive else position < bound)
+        else:
+            query = query.filter(position >= bound if inclusive else position > bound)
+    ordering = [column.desc() if scan_descending else column.asc() for column in key_columns]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    return KeysetPage(rows, [row_key(row, key_columns) for row in rows], has_more)
+
+
+def with_order_details(query):
+    """Load each order's customer, lines and line items in the same SELECT as the orders"""
+    return query.options(
+        joinedload(RentalOrder.customer),
+        joinedload(RentalOrder.lines).joinedload(Rental.item)
+    )
+
+
+def active_orders(db):
+    """Orders with items still out, oldest start date first"""
+    return with_order_details(db.query(RentalOrder)).filter(RentalOrder.status == "Active").order_by(
+        RentalOrder.rental_date, RentalOrder.id
+    ).all()
+
+
+def all_orders(db):
+    """Every order (active and returned), newest first"""
+    return with_order_details(db.query(RentalOrder)).order_by(
+        RentalOrder.rental_date.desc(), RentalOrder.id.desc()
+    ).all()
+
+
+def history_page(db, after=None, limit=PAGE_SIZE, backward=False, inclusive=False):
+    """One page of rental orders (active and returned), newest first"""
+    return keyset_page(with_order_details(db.query(RentalOrder)), HISTORY_KEY, after=after, limit=limit,
+                       descending=True, backward=backward, inclusive=inclusive)
+
+
+def changed_orders(db, order_ids=(), customer_ids=(), item_ids=(), shown_ids=()):
+    """
+    Orders to redraw after a change: those in order_ids, plus those in
+    shown_ids whose customer or one of whose items changed. Orders in
+    order_ids that are missing from the result were deleted.
+    """
+    conditions = []
+    if order_ids:
+        conditions.append(RentalOrder.id.in_(order_ids))
+    related = []
+    if customer_ids:
+        related.append(RentalOrder.customer_id.in_(customer_ids))
+    if item_ids:
+        related.append(RentalOrder.lines.any(Rental.item_id.in_(item_ids)))
+    if related and shown_ids:
+        conditions.append(and_(RentalOrder.id.in_(shown_ids), or_(*related)))
+    if not conditions:
+        return []
+    return with_order_details(db.query(RentalOrder)).filter(or_(*conditions)).all()
+
+
+def count_statements(builder, bind=engine):
+    """Run builder(db) in a fresh session and return how many SQL statements it issued"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", record)
+    db = SessionLocal(bind=bind)
+    try:
+        builder(db)
+    finally:
+        db.close()
+        event.remove(bind, "before_cursor_execute", record)
+    return len(statements)
+
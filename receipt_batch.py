@@ -0,0 +1,183 @@
+"""
+Batch receipt generation across worker processes.
+
+Building a receipt is CPU-bound Python inside reportlab, so threads do not
+help. generate_batch() fans rental_data dicts out to a ProcessPoolExecutor
+and yields a BatchResult for each one as soon as it is done, in completion
+order. A receipt that fails is reported in its result and does not stop
+the batch. Each worker process creates its ReceiptGenerator (and so its
+styles, downscaled logo and letterhead layout, see receipt_generator.py)
+once, when it starts.
+
+Only a bounded number of receipts is in flight at a time, so the input can
+be a generator over any number of orders.
+
+Reissue receipts from the database:
+
+    python receipt_batch.py 12 13 14              # by rental order id
+    python receipt_batch.py --month 2025-01       # every order started that month
+        [--workers N] [--output-dir DIR]
+
+This module only imports the database in the parent process, so spawned
+workers (the default on Windows) start quickly.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date
+from itertools import islice
+
+# Outcome of one receipt: path is set when it was saved, data (the PDF bytes)
+# when output_dir was None, error when it failed
+BatchResult = namedtuple('BatchResult', 'rental_id path data error')
+
+# Receipts queued per worker process; more keeps workers busy, fewer holds less in memory
+IN_FLIGHT_PER_WORKER = 4
+
+# Orders read from the database per query when reissuing receipts
+ORDER_CHUNK_SIZE = 100
+
+_generator = None
+
+
+def _init_worker(company):
+    """Worker process initializer: one ReceiptGenerator per process, with its caches warmed"""
+    global _generator
+    import receipt_generator
+    _generator = receipt_generator.ReceiptGenerator(**company)
+    receipt_generator.receipt_styles()
+    receipt_generator.logo_image_data(_generator.logo_path, _generator.logo_dpi)
+    _generator.layout()
+
+
+def _render(rental_data, output_dir):
+    rental_id = rental_data.get('rental_id')
+    try:
+        if output_dir is None:
+            return BatchResult(rental_id, None, _generator.render_receipt(rental_data), None)
+        import receipt_generator
+        path = os.path.join(output_dir, receipt_generator.receipt_filename(rental_data))
+        return BatchResult(rental_id, _generator.generate_receipt(rental_data, path), None, None)
+    except Exception as e:
+        return BatchResult(rental_id, None, None, f"{type(e).__name__}: {e}")
+
+
+def generate_batch(rental_data_items, output_dir="receipts", workers=None, company=None):
+    """
+    Generate a receipt for each rental_data dict (see
+    ReceiptGenerator.generate_receipt) in worker processes and yield a
+    BatchResult per receipt as it completes. Receipts are saved under
+    output_dir, or returned as bytes if output_dir is None. company holds
+    the ReceiptGenerator keyword arguments (name, phone, ...).
+    """
+    workers = workers or os.cpu_count() or 1
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    items = iter(rental_data_items)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(company or {},)) as executor:
+        pending = {executor.submit(_render, rental_data, output_dir)
+                   for rental_data in islice(items, workers * IN_FLIGHT_PER_WORKER)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            for rental_data in islice(items, len(done)):
+                pending.add(executor.submit(_render, rental_data, output_dir))
+
+
+def order_rental_data(order):
+    """The receipt data of a RentalOrder loaded with its customer, lines and items"""
+    items = [{
+        'name': line.item.name,
+        'quantity': line.quantity,
+        'daily_rate': line.daily_rate,
+        'days': order.days,
+        'subtotal': line.daily_rate * line.quantity * order.days
+    } for line in order.lines]
+    subtotal = sum(item['subtotal'] for item in items)
+    return {
+        'rental_id': order.id,
+        'customer_name': order.customer.name,
+        'customer_phone': order.customer.phone or '',
+        'customer_address': order.customer.address or '',
+        'rental_date': order.rental_date.strftime('%B %d, %Y'),
+        'return_date': order.return_date.strftime('%B %d, %Y'),
+        'items': items,
+        'subtotal': subtotal,
+        'discount_percent': order.discount_percentage,
+        'discount_amount': subtotal * (order.discount_percentage / 100),
+        'total_amount': order.total_amount,
+        'currency': 'GHS'
+    }
+
+
+def orders_rental_data(order_ids=None, month=None):
+    """Yield receipt data for the given order ids, or every order started in month (a date), a chunk at a time"""
+    from database import SessionLocal, RentalOrder
+    from queries import with_order_details
+
+    db = SessionLocal()
+    try:
+        query = db.query(RentalOrder.id)
+        if order_ids:
+            query = query.filter(RentalOrder.id.in_(order_ids))
+        if month:
+            next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+            query = query.filter(RentalOrder.rental_date >= month, RentalOrder.rental_date < next_month)
+        ids = [row.id for row in query.order_by(RentalOrder.id)]
+        for start in range(0, len(ids), ORDER_CHUNK_SIZE):
+            chunk = ids[start:start + ORDER_CHUNK_SIZE]
+            orders = with_order_details(db.query(RentalOrder)).filter(RentalOrder.id.in_(chunk)).all()
+            for order in sorted(orders, key=lambda order: order.id):
+                yield order_rental_data(order)
+    finally:
+        db.close()
+
+
+def company_details():
+    """ReceiptGenerator company arguments from sms_config, as the GUI uses"""
+    try:
+        from sms_config import COMPANY_NAME, COMPANY_PHONE, COMPANY_EMAIL, COMPANY_ADDRESS
+    except ImportError:
+        return {}
+    return {'company_name': COMPANY_NAME, 'company_phone': COMPANY_PHONE,
+            'company_email': COMPANY_EMAIL, 'company_address': COMPANY_ADDRESS}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reissue rental receipts in parallel")
+    parser.add_argument("order_ids", nargs="*", type=int, help="Rental order ids")
+    parser.add_argument("--month", help="Every order whose rental started in this month (YYYY-MM)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", default="receipts")
+    args = parser.parse_args(argv)
+    if not args.order_ids and not args.month:
+        parser.error("give rental order ids or --month")
+    month = None
+    if args.month:
+        year, month_number = (int(part) for part in args.month.split("-"))
+        month = date(year, month_number, 1)
+
+    started = time.perf_counter()
+    count = failed = 0
+    for result in generate_batch(orders_rental_data(args.order_ids, month), args.output_dir,
+                                 args.workers, company_details()):
+        count += 1
+        if result.error:
+            failed += 1
+            print(f"Rental #{result.rental_id}: FAILED {result.error}")
+        else:
+            print(f"Rental #{result.rental_id}: {result.path}")
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    print(f"{count} receipts in {elapsed:.1f} s ({rate:.1f}/s) with "
+          f"{args.workers or os.cpu_count()} workers, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,24 @@
 """
 PDF Receipt Generator for ALYVON Rental Management System
+
+Everything that is the same on every receipt - paragraph styles, table
+styles and the logo - is built once per process and reused. The logo is
+flattened onto white, downscaled to LOGO_DPI at its printed size and kept
+as JPEG bytes, which the PDF embeds as they are instead of re-encoding the
+full-size PNG for every receipt.
+
+In template mode (the default) the letterhead - logo, company details and
+the receipt heading - and the footer are laid out once per ReceiptGenerator.
+Each PDF draws them once, as form XObjects its pages refer to, and only
+the tables that differ from receipt to receipt are laid out per receipt.
+With template=False the letterhead and footer flow with the tables, as
+receipts were built before.
+
+generate_receipt() saves a receipt under receipts/; render_receipt() returns
+the PDF as bytes and write_receipt() streams it to any file-like sink, for
+receipts that are attached, printed or stored elsewhere.
+
+Benchmark: python benchmarks.py receipts [--receipts N]
 """
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
@@ -8,14 +27,304 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from datetime import datetime
+import io
 import os
+import threading
+
+LOGO_PATH = "ALYVON logo.png"
+
+# Printed size of the logo and the resolution it is embedded at
+LOGO_SIZE = 2*inch
+LOGO_DPI = 150
+LOGO_JPEG_QUALITY = 90
+
+# Receipt page and margins
+PAGE_SIZE = A4
+PAGE_MARGIN = 0.75*inch
+
+# Padding platypus frames keep inside the margins, which template mode lays out with too
+FRAME_PADDING = 6
+
+# Space between the last table and the footer
+FOOTER_GAP = 0.4*inch
+
+# Label/value tables (receipt number, customer, rental period)
+INFO_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#7f8c8d')),
+    ('TEXTCOLOR', (1, 0), (1, -1), colors.HexColor('#2c3e50')),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+])
+
+DETAIL_TABLE_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#ecf0f1')),
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
+], parent=INFO_TABLE_STYLE)
+
+ITEMS_TABLE_STYLE = TableStyle([
+    # Header row
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 0), (-1, 0), 12),
+    
+    # Data rows
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#2c3e50')),
+    ('ALIGN', (0, 1), (0, -1), 'LEFT'),  # Item name left-aligned
+    ('ALIGN', (1, 1), (-1, -1), 'CENTER'),  # Numbers center-aligned
+    ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#ecf0f1')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+])
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('TEXTCOLOR', (0, 0), (-1, -2), colors.HexColor('#2c3e50')),
+    ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#27ae60')),  # Total in green
+    ('TEXTCOLOR', (1, -1), (1, -1), colors.HexColor('#27ae60')),
+    ('FONTSIZE', (0, -1), (-1, -1), 14),  # Larger font for total
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#34495e')),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+])
+
+# Built on first use and shared by every ReceiptGenerator in the process
+_cache_lock = threading.Lock()
+_styles = None
+_logos = {}   # (path, modified time, dpi) -> JPEG bytes
+
+
+def receipt_styles():
+    """The receipt's paragraph styles by name, built once per process"""
+    global _styles
+    with _cache_lock:
+        if _styles is None:
+            styles = getSampleStyleSheet()
+            _styles = {
+                'title': ParagraphStyle(
+                    'CustomTitle',
+                    parent=styles['Heading1'],
+                    fontSize=24,
+                    textColor=colors.HexColor('#2c3e50'),
+                    spaceAfter=30,
+                    alignment=TA_CENTER,
+                    fontName='Helvetica-Bold'
+                ),
+                'heading': ParagraphStyle(
+                    'CustomHeading',
+                    parent=styles['Heading2'],
+                    fontSize=14,
+                    textColor=colors.HexColor('#34495e'),
+                    spaceAfter=12,
+                    fontName='Helvetica-Bold'
+                ),
+                'normal': ParagraphStyle(
+                    'CustomNormal',
+                    parent=styles['Normal'],
+                    fontSize=10,
+                    textColor=colors.HexColor('#2c3e50'),
+                    spaceAfter=6
+                ),
+                'footer': ParagraphStyle(
+                    'Footer',
+                    parent=styles['Normal'],
+                    fontSize=9,
+                    textColor=colors.HexColor('#7f8c8d'),
+                    alignment=TA_CENTER,
+                    fontStyle='Italic'
+                ),
+            }
+        return _styles
+
+
+def logo_image_data(path=LOGO_PATH, dpi=LOGO_DPI):
+    """
+    The logo flattened onto white and downscaled to dpi at LOGO_SIZE, as
+    JPEG bytes, or None if there is no logo. Cached until the file changes.
+    """
+    try:
+        key = (path, os.path.getmtime(path), dpi)
+    except OSError:
+        return None
+    with _cache_lock:
+        data = _logos.get(key)
+    if data is not None:
+        return data
+    
+    from PIL import Image as PILImage
+    with PILImage.open(path) as image:
+        image = image.convert('RGBA')
+        flat = PILImage.new('RGB', image.size, 'white')
+        flat.paste(image, mask=image.getchannel('A'))
+    pixels = max(1, round(LOGO_SIZE / inch * dpi))
+    flat.thumbnail((pixels, pixels), PILImage.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    flat.save(buffer, 'JPEG', quality=LOGO_JPEG_QUALITY, optimize=True)
+    data = buffer.getvalue()
+    with _cache_lock:
+        _logos[key] = data
+    return data
+
+
+def receipt_filename(rental_data):
+    """Rental_<id>_<timestamp>.pdf, the name receipts are saved under"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"Rental_{rental_data.get('rental_id', timestamp)}_{timestamp}.pdf"
+
+
+def clear_caches():
+    """Forget the cached styles and logos (the next receipt rebuilds them)"""
+    global _styles
+    with _cache_lock:
+        _styles = None
+        _logos.clear()
+
+
+def stack(flowables, width, top):
+    """
+    Lay flowables out top-down from top within width as a platypus Frame
+    would. Returns (height used, [(flowable, x, y)]) ready for drawOn().
+    """
+    placed = []
+    y = top
+    space_after = 0
+    for flowable in flowables:
+        if placed:
+            y -= max(flowable.getSpaceBefore() - space_after, 0)
+        w, h = flowable.wrap(width, top)
+        align = getattr(flowable, 'hAlign', 'LEFT')
+        x = (width - w) / 2 if align in ('CENTER', 'CENTRE') else width - w if align == 'RIGHT' else 0
+        y -= h
+        placed.append((flowable, x, y))
+        space_after = flowable.getSpaceAfter()
+        y -= space_after
+    return top - y, placed
+
 
 class ReceiptGenerator:
-    def __init__(self, company_name="ALYVON Rentals", company_phone="", company_email="", company_address=""):
+    def __init__(self, company_name="ALYVON Rentals", company_phone="", company_email="", company_address="",
+                 logo_path=LOGO_PATH, logo_dpi=LOGO_DPI, template=True):
         self.company_name = company_name
         self.company_phone = company_phone
         self.company_email = company_email
         self.company_address = company_address
+        self.logo_path = logo_path
+        self.logo_dpi = logo_dpi     # None embeds the logo file as it is, at full resolution
+        self.template = template     # Letterhead and footer drawn from forms laid out once
+        self._layout_lock = threading.Lock()
+        self._layout = None
+        self._draw_lock = threading.Lock()
+    
+    def logo(self):
+        """A new logo flowable for one receipt, or None if there is no logo"""
+        try:
+            if self.logo_dpi is None:
+                if not os.path.exists(self.logo_path):
+                    return None
+                logo = Image(self.logo_path, width=LOGO_SIZE, height=LOGO_SIZE)
+            else:
+                data = logo_image_data(self.logo_path, self.logo_dpi)
+                if data is None:
+                    return None
+                logo = Image(io.BytesIO(data), width=LOGO_SIZE, height=LOGO_SIZE)
+        except Exception:
+            return None
+        logo.hAlign = 'CENTER'
+        return logo
+    
+    def letterhead_flowables(self):
+        """Logo, company details and the receipt heading, as they open every receipt"""
+        styles = receipt_styles()
+        story = []
+        logo = self.logo()
+        if logo is not None:
+            story.append(logo)
+            story.append(Spacer(1, 0.2*inch))
+        
+        # Company header
+        story.append(Paragraph(self.company_name, styles['title']))
+        
+        if self.company_address:
+            story.append(Paragraph(self.company_address, styles['normal']))
+            story.append(Spacer(1, 0.1*inch))
+        if self.company_phone:
+            story.append(Paragraph(f"Phone: {self.company_phone}", styles['normal']))
+        if self.company_email:
+            story.append(Paragraph(f"Email: {self.company_email}", styles['normal']))
+        
+        story.append(Spacer(1, 0.3*inch))
+        
+        # Receipt title
+        story.append(Paragraph("RENTAL RECEIPT", styles['heading']))
+        story.append(Spacer(1, 0.2*inch))
+        return story
+    
+    def footer_flowable(self):
+        """The thank-you note closing every receipt"""
+        footer_text = "Thank you for choosing " + self.company_name + "!<br/>" + \
+                     "Please return items on or before the return date.<br/>" + \
+                     "For inquiries, please contact us using the information above."
+        return Paragraph(footer_text, receipt_styles()['footer'])
+    
+    def layout(self):
+        """
+        The letterhead and footer laid out on the page once for this
+        generator: (letterhead height, its [(flowable, x, y)], footer
+        height, its [(flowable, x, y)]), x from the left edge of the frame
+        and y on the page.
+        """
+        with self._layout_lock:
+            if self._layout is None:
+                page_width, page_height = PAGE_SIZE
+                inset = PAGE_MARGIN + FRAME_PADDING
+                width = page_width - 2 * inset
+                letterhead_height, letterhead = stack(self.letterhead_flowables(), width, page_height - inset)
+                footer_height, footer = stack([self.footer_flowable()], width, page_height)
+                # Sit the footer on the bottom margin
+                footer = [(flowable, x, y - page_height + inset + footer_height) for flowable, x, y in footer]
+                self._layout = (letterhead_height, letterhead, footer_height, footer)
+            return self._layout
+    
+    def draw_form(self, canvas, name, placed):
+        """Place form name on the page, defining it from placed flowables the first time"""
+        if not canvas.hasForm(name):
+            canvas.beginForm(name)
+            # The placed flowables are shared by every receipt and drawOn() sets
+            # their canvas while it draws, so threads take turns
+            with self._draw_lock:
+                for flowable, x, y in placed:
+                    flowable.drawOn(canvas, PAGE_MARGIN + FRAME_PADDING + x, y)
+            canvas.endForm()
+        canvas.doForm(name)
+    
+    def draw_first_page(self, canvas, doc):
+        """First page: letterhead and footer, as one form (most receipts have one page)"""
+        _, letterhead, _, footer = self.layout()
+        self.draw_form(canvas, 'letterhead', letterhead + footer)
+    
+    def draw_later_page(self, canvas, doc):
+        """Later pages: the footer form, shared by all of them"""
+        self.draw_form(canvas, 'footer', self.layout()[3])
         
     def generate_receipt(self, rental_data, output_path=None):
         """
@@ -44,76 +353,41 @@ class ReceiptGenerator:
             # Create receipts directory if it doesn't exist
             receipts_dir = "receipts"
             os.makedirs(receipts_dir, exist_ok=True)
-            
-            # Generate filename with rental ID and timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"Rental_{rental_data.get('rental_id', timestamp)}_{timestamp}.pdf"
-            output_path = os.path.join(receipts_dir, filename)
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(output_path, pagesize=A4,
-                               rightMargin=0.75*inch, leftMargin=0.75*inch,
-                               topMargin=0.75*inch, bottomMargin=0.75*inch)
+            output_path = os.path.join(receipts_dir, receipt_filename(rental_data))
         
+        with open(output_path, 'wb') as sink:
+            self.write_receipt(rental_data, sink)
+        return output_path
+    
+    def render_receipt(self, rental_data):
+        """The PDF receipt for rental_data (see generate_receipt) as bytes, without touching the disk"""
+        buffer = io.BytesIO()
+        self.write_receipt(rental_data, buffer)
+        return buffer.getvalue()
+    
+    def write_receipt(self, rental_data, sink):
+        """
+        Write the PDF receipt for rental_data (see generate_receipt) to sink,
+        any binary file-like object with write(): an open file, a socket's
+        makefile('wb'), an HTTP response body. Returns sink.
+        """
         # Container for the 'Flowable' objects
         story = []
         
-        # Define styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#34495e'),
-            spaceAfter=12,
-            fontName='Helvetica-Bold'
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=6
-        )
-        
-        # Try to add company logo
-        logo_path = "ALYVON logo.png"
-        if os.path.exists(logo_path):
-            try:
-                logo = Image(logo_path, width=2*inch, height=2*inch)
-                logo.hAlign = 'CENTER'
-                story.append(logo)
-                story.append(Spacer(1, 0.2*inch))
-            except:
-                pass
-        
-        # Company header
-        story.append(Paragraph(self.company_name, title_style))
-        
-        if self.company_address:
-            story.append(Paragraph(self.company_address, normal_style))
-            story.append(Spacer(1, 0.1*inch))
-        if self.company_phone:
-            story.append(Paragraph(f"Phone: {self.company_phone}", normal_style))
-        if self.company_email:
-            story.append(Paragraph(f"Email: {self.company_email}", normal_style))
-        
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Receipt title
-        story.append(Paragraph("RENTAL RECEIPT", heading_style))
-        story.append(Spacer(1, 0.2*inch))
+        heading_style = receipt_styles()['heading']
+        
+        if self.template:
+            # Letterhead and footer come from the forms; keep the tables clear of them
+            letterhead_height, _, footer_height, _ = self.layout()
+            doc = SimpleDocTemplate(sink, pagesize=PAGE_SIZE,
+                                   rightMargin=PAGE_MARGIN, leftMargin=PAGE_MARGIN,
+                                   topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN + footer_height + FOOTER_GAP)
+            story.append(Spacer(1, letterhead_height))
+        else:
+            doc = SimpleDocTemplate(sink, pagesize=PAGE_SIZE,
+                                   rightMargin=PAGE_MARGIN, leftMargin=PAGE_MARGIN,
+                                   topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN)
+            story.extend(self.letterhead_flowables())
         
         # Receipt details
         receipt_info = [
@@ -123,18 +397,7 @@ class ReceiptGenerator:
         ]
         
         receipt_table = Table(receipt_info, colWidths=[2*inch, 4*inch])
-        receipt_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#7f8c8d')),
-            ('TEXTCOLOR', (1, 0), (1, -1), colors.HexColor('#2c3e50')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ]))
+        receipt_table.setStyle(INFO_TABLE_STYLE)
         
         story.append(receipt_table)
         story.append(Spacer(1, 0.3*inch))
@@ -151,20 +414,7 @@ class ReceiptGenerator:
             customer_info.append(['Address:', rental_data.get('customer_address', 'N/A')])
         
         customer_table = Table(customer_info, colWidths=[2*inch, 4*inch])
-        customer_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#7f8c8d')),
-            ('TEXTCOLOR', (1, 0), (1, -1), colors.HexColor('#2c3e50')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#ecf0f1')),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
-        ]))
+        customer_table.setStyle(DETAIL_TABLE_STYLE)
         
         story.append(customer_table)
         story.append(Spacer(1, 0.3*inch))
@@ -178,20 +428,7 @@ class ReceiptGenerator:
         ]
         
         period_table = Table(period_info, colWidths=[2*inch, 4*inch])
-        period_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#7f8c8d')),
-            ('TEXTCOLOR', (1, 0), (1, -1), colors.HexColor('#2c3e50')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#ecf0f1')),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
-        ]))
+        period_table.setStyle(DETAIL_TABLE_STYLE)
         
         story.append(period_table)
         story.append(Spacer(1, 0.3*inch))
@@ -216,29 +453,7 @@ class ReceiptGenerator:
             ])
         
         items_table = Table(items_data, colWidths=[2.5*inch, 0.8*inch, 1*inch, 0.7*inch, 1*inch])
-        items_table.setStyle(TableStyle([
-            # Header row
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-            
-            # Data rows
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#2c3e50')),
-            ('ALIGN', (0, 1), (0, -1), 'LEFT'),  # Item name left-aligned
-            ('ALIGN', (1, 1), (-1, -1), 'CENTER'),  # Numbers center-aligned
-            ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#ecf0f1')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ]))
+        items_table.setStyle(ITEMS_TABLE_STYLE)
         
         story.append(items_table)
         story.append(Spacer(1, 0.3*inch))
@@ -259,46 +474,18 @@ class ReceiptGenerator:
         summary_data.append(['TOTAL:', f"{currency} {total_amount:.2f}"])
         
         summary_table = Table(summary_data, colWidths=[4.5*inch, 1.5*inch])
-        summary_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('TEXTCOLOR', (0, 0), (-1, -2), colors.HexColor('#2c3e50')),
-            ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#27ae60')),  # Total in green
-            ('TEXTCOLOR', (1, -1), (1, -1), colors.HexColor('#27ae60')),
-            ('FONTSIZE', (0, -1), (-1, -1), 14),  # Larger font for total
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#34495e')),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#ecf0f1')),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ]))
+        summary_table.setStyle(SUMMARY_TABLE_STYLE)
         
         story.append(Paragraph("TOTAL AMOUNT", heading_style))
         story.append(Spacer(1, 0.1*inch))
         story.append(summary_table)
-        story.append(Spacer(1, 0.4*inch))
-        
-        # Footer
-        footer_text = "Thank you for choosing " + self.company_name + "!<br/>" + \
-                     "Please return items on or before the return date.<br/>" + \
-                     "For inquiries, please contact us using the information above."
-        
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=9,
-            textColor=colors.HexColor('#7f8c8d'),
-            alignment=TA_CENTER,
-            fontStyle='Italic'
-        )
-        
-        story.append(Paragraph(footer_text, footer_style))
         
         # Build PDF
-        doc.build(story)
-        
-        return output_path
-
+        if self.template:
+            doc.build(story, onFirstPage=self.draw_first_page, onLaterPages=self.draw_later_page)
+        else:
+            story.append(Spacer(1, FOOTER_GAP))
+            story.append(self.footer_flowable())
+            doc.build(story)
+        
+        return sink
@@ -4,24 +4,72 @@ Improved rental management system with Ghana Cedis currency and multiple item su
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from datetime import datetime, date, timedelta
-from database import SessionLocal, Item, Customer, Rental, init_database
+from database import Item, Customer, Rental, RentalOrder, engine, init_database
+from db_worker import DBExecutor
+from dashboard import DashboardCache
+from entity_cache import EntityCache
+from notifications import start_listener
+from lazy_imports import lazy_import, missing_modules
+import stats
+from checkout import checkout, start_rentals
+from jobs import start_worker, RECEIPT, SMS, DONE, PENDING
+from returns import return_lines, return_orders, outstanding_lines
+from availability import LiveAvailability, catalog_calendar, calendar_payload, CALENDAR_MATRIX_DAYS
+from events import ChangeBus, RefreshScheduler, ITEMS, CUSTOMERS, ORDERS
+from paged_tree import PagedTreeview
+from queries import active_orders, all_orders, changed_orders, history_page, row_key, HISTORY_KEY
+from search import search, trigram_available
+from search_index import SearchIndex, Debouncer
+from tree_sync import TreeSync
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from PIL import Image, ImageTk
 import os
+import sys
 import json
+import queue
 import shutil
+import time
 
-# Import receipt and SMS modules
+# PIL is only needed for the header logo, which is loaded after the first frame
+Image = lazy_import('PIL.Image')
+ImageTk = lazy_import('PIL.ImageTk')
+
+# Receipt and SMS modules: reportlab and requests are only checked for here and
+# are imported by the job worker the first time a receipt or SMS is produced (see jobs.py)
 try:
-    from receipt_generator import ReceiptGenerator
-    from sms_sender import SMSSender
-    from sms_config import get_sms_config, COMPANY_NAME, COMPANY_PHONE, COMPANY_EMAIL, COMPANY_ADDRESS, SMS_ENABLED
+    missing = missing_modules('reportlab', 'requests')
+    if missing:
+        raise ImportError(f"No module named {missing[0]!r}")
+    from sms_config import SMS_ENABLED
     RECEIPT_AVAILABLE = True
 except ImportError as e:
     print(f"Receipt/SMS modules not available: {e}")
     RECEIPT_AVAILABLE = False
 
+# Quiet time after the last keystroke before a search runs
+SEARCH_DEBOUNCE_MS = 150
+
+# Hidden tabs are built and loaded one at a time, starting this long after startup
+PREFETCH_DELAY_MS = 500
+PREFETCH_INTERVAL_MS = 200
+
+# How often changes announced by other terminals are handed to the views
+REMOTE_CHANGES_POLL_MS = 100
+
+# How often receipt and SMS outcomes from the job worker are shown
+JOB_UPDATES_POLL_MS = 200
+
+# How often to check whether the date changed, so bookings starting that day leave stock
+START_RENTALS_CHECK_MS = 60000
+
+# Days shown in the availability calendar by default
+CALENDAR_DAYS = 42
+
+# Availability heatmap cell size (pixels) and fill per share of stock free, lowest share first
+HEATMAP_CELL_WIDTH = 9
+HEATMAP_CELL_HEIGHT = 18
+HEATMAP_LABEL_WIDTH = 180
+HEATMAP_COLORS = ((0.0, '#c0392b'), (0.25, '#e67e22'), (0.5, '#f1c40f'), (0.75, '#a9dfbf'), (1.0, '#27ae60'))
+
 class RentalManagerApp:
     def __init__(self, root):
         self.root = root
@@ -49,11 +97,51 @@ class RentalManagerApp:
         # Initialize database
         init_database()
         
+        # Background database worker so queries never block the mainloop
+        self.db_executor = DBExecutor(self.root, on_busy_change=self.set_busy)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Mutations publish what changed here; views refresh from it
+        self.change_bus = ChangeBus()
+        
+        # Dashboard figures are reused until any data changes
+        self.dashboard_cache = DashboardCache()
+        for entity in (ITEMS, CUSTOMERS, ORDERS):
+            self.change_bus.subscribe(entity, self.dashboard_cache.invalidate)
+        self.dashboard_timings = {}
+        
+        # Items and customers for the rental form, kept coherent across terminals
+        # by this terminal's change bus and Postgres notifications from the others
+        self.item_cache = EntityCache(Item, item_snapshot)
+        self.customer_cache = EntityCache(Customer, customer_snapshot)
+        self.entity_caches = {ITEMS: self.item_cache, CUSTOMERS: self.customer_cache}
+        for entity, cache in self.entity_caches.items():
+            self.change_bus.subscribe(entity, lambda entity, ids, cache=cache: cache.invalidate(ids))
+        self.remote_changes = queue.Queue()
+        self.change_listener = start_listener(engine, self.on_database_change)
+        
+        # Units reserved per item and day by the open rentals, for date-aware checks
+        self.availability = LiveAvailability()
+        self.change_bus.subscribe(ORDERS, lambda entity, ids: self.availability.invalidate(ids))
+        
+        # Receipts and SMS are produced after checkout commits, by a worker thread (see jobs.py)
+        self.job_updates = queue.Queue()
+        self.job_worker = start_worker(self.job_updates.put)
+        
+        # Searches run in Postgres when pg_trgm is installed, otherwise in process
+        self.server_search = False
+        
         # Rental items list for multiple item support
         self.rental_items = []
         
         # Create main interface
         self.create_widgets()
+        self.db_executor.submit(trigram_available, self.set_server_search)
+        if self.change_listener is not None:
+            self.root.after(REMOTE_CHANGES_POLL_MS, self.apply_remote_changes)
+        self.root.after(JOB_UPDATES_POLL_MS, self.apply_job_updates)
+        self.rentals_started_on = None
+        self.start_due_rentals()
         
     def create_widgets(self):
         """Create the main GUI widgets"""
@@ -62,18 +150,11 @@ class RentalManagerApp:
         header_frame.pack(fill='x', pady=(0, 10))
         header_frame.pack_propagate(False)
         
-        # Try to load and display logo
-        try:
-            logo_image = Image.open("ALYVON logo.png")
-            logo_image = logo_image.resize((65, 65), Image.Resampling.LANCZOS)
-            self.logo_photo = ImageTk.PhotoImage(logo_image)
-            logo_label = tk.Label(header_frame, image=self.logo_photo, bg='#1a237e')
-            logo_label.pack(side='left', padx=15, pady=12)
-        except:
-            # If logo fails to load, just show text
-            logo_label = tk.Label(header_frame, text="ALYVON", font=("Segoe UI", 18, "bold"), 
-                                fg='white', bg='#1a237e')
-            logo_label.pack(side='left', padx=15, pady=12)
+        # Text logo for the first frame; the image is swapped in once the window is up
+        self.logo_label = tk.Label(header_frame, text="ALYVON", font=("Segoe UI", 18, "bold"), 
+                                   fg='white', bg='#1a237e')
+        self.logo_label.pack(side='left', padx=15, pady=12)
+        self.root.after_idle(self.load_logo)
         
         # Title with better styling
         title_label = tk.Label(header_frame, text="Rental Management System", 
@@ -85,34 +166,167 @@ class RentalManagerApp:
                                 font=("Segoe UI", 10), fg='#e3f2fd', bg='#1a237e')
         currency_label.pack(side='right', padx=25, pady=12)
         
+        # Busy indicator shown while background database work is running
+        self.busy_label = tk.Label(header_frame, text="", font=("Segoe UI", 10, "bold"),
+                                   fg='#ffeb3b', bg='#1a237e')
+        self.busy_label.pack(side='right', padx=10, pady=12)
+        
+        # Latest receipt/SMS outcome from the job worker
+        self.job_label = tk.Label(header_frame, text="", font=("Segoe UI", 10),
+                                  fg='#e3f2fd', bg='#1a237e')
+        self.job_label.pack(side='right', padx=10, pady=12)
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
+        self.refresh_scheduler = RefreshScheduler(self.root, self.change_bus, self.notebook)
         
-        # Create tabs
+        # Create tabs; each one is built and loaded the first time it is shown,
+        # or in the background shortly after startup, whichever comes first
+        self.lazy_tabs = {}
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed, add='+')
         try:
-            self.create_dashboard_tab()
-            self.create_rental_tab()
-            self.create_inventory_tab()
-            self.create_customers_tab()
-            self.create_rentals_tab()
-            self.create_reports_tab()
-            self.create_history_tab()
+            self.add_lazy_tab("Dashboard", self.create_dashboard_tab)
+            self.add_lazy_tab("New Rental", self.create_rental_tab)
+            self.add_lazy_tab("Inventory", self.create_inventory_tab)
+            self.add_lazy_tab("Customers", self.create_customers_tab)
+            self.add_lazy_tab("Active Rentals", self.create_rentals_tab)
+            self.add_lazy_tab("Reports", self.create_reports_tab)
+            self.add_lazy_tab("Rental History", self.create_history_tab)
+            self.add_lazy_tab("Calendar", self.create_calendar_tab)
+            self.add_lazy_tab("Availability", self.create_availability_tab)
+            self.on_tab_changed()
             
-            # Load initial data
-            self.refresh_dashboard()
-            self.refresh_inventory()
-            self.refresh_rentals()
-            self.refresh_customers()
-            self.refresh_history()
+            # Keep the website feeds in step with this terminal's changes; other
+            # terminals export their own, so remote changes do not trigger a full export here
+            self.refresh_scheduler.register('web_feeds', self.export_web_feeds, (ITEMS, CUSTOMERS, ORDERS),
+                                            remote=False)
         except Exception as e:
             print(f"Application initialization error: {e}")
             messagebox.showerror("Error", f"Failed to initialize application: {e}")
         
-    def create_dashboard_tab(self):
+        self.root.after(PREFETCH_DELAY_MS, self.prefetch_next_tab)
+    
+    def load_logo(self):
+        """Replace the text logo with the logo image, if there is one"""
+        try:
+            logo_image = Image.open("ALYVON logo.png")
+            logo_image = logo_image.resize((65, 65), Image.Resampling.LANCZOS)
+            self.logo_photo = ImageTk.PhotoImage(logo_image)
+            self.logo_label.config(image=self.logo_photo, text="")
+        except Exception:
+            # If logo fails to load, keep the text
+            pass
+    
+    def add_lazy_tab(self, text, build):
+        """Add an empty notebook tab that build(frame) fills in when it is first needed"""
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=text)
+        self.lazy_tabs[self.notebook.index(frame)] = (frame, build)
+    
+    def build_tab(self, index):
+        """Build a lazy tab now; returns its frame, or None if it was already built"""
+        if index not in self.lazy_tabs:
+            return None
+        frame, build = self.lazy_tabs.pop(index)
+        try:
+            build(frame)
+        except Exception as e:
+            print(f"Tab build error: {e}")
+        return frame
+    
+    def on_tab_changed(self, event=None):
+        """Build the selected tab the first time it is shown"""
+        self.build_tab(self.notebook.index('current'))
+    
+    def prefetch_next_tab(self):
+        """Build and load one hidden tab in the background, then schedule the next"""
+        if not self.lazy_tabs:
+            return
+        # Wait for the user's own loads to finish first
+        if not self.db_executor.busy:
+            frame = self.build_tab(min(self.lazy_tabs))
+            if frame is not None:
+                self.refresh_scheduler.load_tab(frame)
+        self.root.after(PREFETCH_INTERVAL_MS, self.prefetch_next_tab)
+    
+    def set_busy(self, busy):
+        """Show or hide the busy indicator while database work is pending"""
+        self.busy_label.config(text="⏳ Working..." if busy else "")
+        self.root.config(cursor='watch' if busy else '')
+    
+    def set_server_search(self, available):
+        """Use database-side search once pg_trgm is known to be installed"""
+        self.server_search = available
+    
+    def on_database_change(self, entity, ids):
+        """Listener thread: another terminal changed rows of entity (ids None: unknown rows)"""
+        cache = self.entity_caches.get(entity)
+        if cache is not None:
+            cache.invalidate(ids)
+        self.remote_changes.put((entity, ids))
+    
+    def apply_remote_changes(self):
+        """UI thread: publish other terminals' changes so the open views update just those rows"""
+        while True:
+            try:
+                entity, ids = self.remote_changes.get_nowait()
+            except queue.Empty:
+                break
+            self.change_bus.publish(entity, ids, remote=True)
+        self.root.after(REMOTE_CHANGES_POLL_MS, self.apply_remote_changes)
+    
+    def apply_job_updates(self):
+        """UI thread: show the receipts and SMS the job worker finished"""
+        messages, failed = [], False
+        while True:
+            try:
+                status = self.job_updates.get_nowait()
+            except queue.Empty:
+                break
+            what = "Receipt" if status.kind == RECEIPT else "SMS"
+            if status.status == DONE:
+                if status.kind == RECEIPT:
+                    messages.append(f"🧾 Receipt #{status.order_id} saved: {os.path.basename(status.result)}")
+                else:
+                    messages.append(f"📱 SMS for rental #{status.order_id} sent")
+            else:
+                retrying = ", retrying" if status.status == PENDING else ""
+                print(f"{what} for rental #{status.order_id} failed{retrying}: {status.error}")
+                messages.append(f"⚠ {what} for rental #{status.order_id} failed{retrying}")
+                failed = True
+        if messages:
+            self.job_label.config(text="   ".join(messages), fg='#ffab91' if failed else '#e3f2fd')
+        self.root.after(JOB_UPDATES_POLL_MS, self.apply_job_updates)
+    
+    def start_due_rentals(self):
+        """Take the bookings starting today out of stock, at launch and then once each new day"""
+        today = date.today()
+        if today != self.rentals_started_on:
+            self.rentals_started_on = today
+            
+            def done(item_ids):
+                if item_ids:
+                    self.change_bus.publish(ITEMS, item_ids)
+            
+            def failed(e):
+                self.rentals_started_on = None
+                print(f"Error starting today's rentals: {e}")
+            
+            self.db_executor.submit(lambda db: start_rentals(db, today), done, failed)
+        self.root.after(START_RENTALS_CHECK_MS, self.start_due_rentals)
+    
+    def on_close(self):
+        """Stop the database worker and close the window"""
+        if self.change_listener is not None:
+            self.change_listener.stop()
+        # Jobs it has not run yet stay queued for the next start
+        self.job_worker.stop()
+        self.db_executor.shutdown()
+        self.root.destroy()
+        
+    def create_dashboard_tab(self, dashboard_frame):
         """Create dashboard tab"""
-        dashboard_frame = ttk.Frame(self.notebook)
-        self.notebook.add(dashboard_frame, text="Dashboard")
         
         # Dashboard content with modern styling
         title_label = tk.Label(dashboard_frame, text="Rental System Overview", 
@@ -142,13 +356,31 @@ class RentalManagerApp:
         self.total_revenue_label = tk.Label(summary_frame, text="Total Revenue: GHS 0.00", 
                 font=("Arial", 12), bg='white')
         self.total_revenue_label.pack(anchor='w', padx=10, pady=5)
+        
+        self.overdue_rentals_label = tk.Label(summary_frame, text="Overdue Rentals: 0", 
+                font=("Arial", 12), bg='white')
+        self.overdue_rentals_label.pack(anchor='w', padx=10, pady=5)
+        
+        self.revenue_trend_label = tk.Label(summary_frame, 
+                text="Bookings: Today GHS 0.00 | 7 days GHS 0.00 | 30 days GHS 0.00", 
+                font=("Arial", 12), bg='white')
+        self.revenue_trend_label.pack(anchor='w', padx=10, pady=5)
+        
+        self.utilization_label = tk.Label(summary_frame, text="Utilization: 0.0% of units out", 
+                font=("Arial", 12), bg='white')
+        self.utilization_label.pack(anchor='w', padx=10, pady=5)
+        
+        # Where the last refresh spent its time
+        self.dashboard_timing_label = tk.Label(summary_frame, text="", 
+                font=("Arial", 9), fg='#757575', bg='white')
+        self.dashboard_timing_label.pack(anchor='w', padx=10, pady=(0, 5))
             
         # Actions with modern button styling
         actions = tk.Frame(dashboard_frame, bg='#f5f7fa')
         actions.pack(fill='x', padx=20, pady=15)
         
         refresh_btn = tk.Button(actions, text="🔄 Refresh Dashboard", 
-                 command=self.refresh_dashboard, 
+                 command=lambda: self.refresh_dashboard(force=True), 
                  bg='#2196F3', fg='white', font=("Segoe UI", 10, "bold"),
                  relief='flat', padx=15, pady=8, cursor='hand2',
                  activebackground='#1976D2', activeforeground='white')
@@ -160,12 +392,14 @@ class RentalManagerApp:
                  relief='flat', padx=15, pady=8, cursor='hand2',
                  activebackground='#388E3C', activeforeground='white')
         export_btn.pack(side='left', padx=5)
+        
+        # Views load when their tab is first shown and reload when their data changes
+        self.refresh_scheduler.register('dashboard', self.refresh_dashboard, (ITEMS, CUSTOMERS, ORDERS),
+                                        (dashboard_frame,))
+        self.refresh_scheduler.request('dashboard')
     
-    def create_rental_tab(self):
+    def create_rental_tab(self, rental_frame):
         """Create rental management tab with multiple item support"""
-        # Create main container frame
-        rental_frame = ttk.Frame(self.notebook)
-        self.notebook.add(rental_frame, text="New Rental")
         
         # Create scrollable canvas
         canvas = tk.Canvas(rental_frame, bg='#f5f7fa', highlightthickness=0)
@@ -268,6 +502,11 @@ class RentalManagerApp:
         tk.Button(controls_frame, text="Add Item", command=self.add_item_to_rental, 
                  bg='#3498db', fg='white').grid(row=0, column=4, padx=5, pady=5)
         
+        # Units of the selected item free on every day of the rental period
+        self.item_free_var = tk.StringVar()
+        tk.Label(controls_frame, textvariable=self.item_free_var, fg='#555555').grid(
+            row=1, column=1, columnspan=4, sticky='w', padx=5)
+        
         # Rental items list
         list_frame = tk.Frame(item_frame)
         list_frame.pack(fill='both', expand=True, padx=5, pady=5)
@@ -297,6 +536,8 @@ class RentalManagerApp:
         self.days_var = tk.StringVar(value="1")
         tk.Spinbox(period_frame, from_=1, to=365, textvariable=self.days_var, width=10).grid(row=0, column=3, padx=5, pady=5)
         self.days_var.trace('w', self.calculate_total)
+        self.days_var.trace('w', lambda *args: self.show_item_availability())
+        self.start_date_var.trace('w', lambda *args: self.show_item_availability())
         
         # Pricing
         pricing_frame = tk.LabelFrame(rental_content, text="Pricing (Ghana Cedis)", 
@@ -367,42 +608,52 @@ class RentalManagerApp:
         clear_btn.pack(side='left', padx=8)
         
         # Load items and customers
-        self.load_items()
-        self.load_customers()
+        self.refresh_scheduler.register('item_choices', self.load_items, (ITEMS,), (rental_frame,))
+        self.refresh_scheduler.register('customer_choices', self.load_customers, (CUSTOMERS,), (rental_frame,))
+        self.refresh_scheduler.request('item_choices')
+        self.refresh_scheduler.request('customer_choices')
     
     def load_customers(self):
         """Load customers into the combo box"""
-        try:
-            db = SessionLocal()
-            customers = db.query(Customer).all()
-            customer_names = [f"{customer.name} ({customer.customer_type})" for customer in customers]
+        def work(db):
+            return [f"{customer['name']} ({customer['customer_type']})" for customer in self.customer_cache.all(db)]
+        
+        def done(customer_names):
             self.customer_combo['values'] = customer_names
-        except Exception as e:
-            print(f"Customer loading error: {e}")
-            # Don't show error message for missing combo box
-        finally:
-            if 'db' in locals():
-                db.close()
+        
+        # Don't show error message for missing combo box
+        self.db_executor.submit(work, done, lambda e: print(f"Customer loading error: {e}"),
+                                key='load_customers')
     
     def on_customer_selected(self, event):
         """Handle customer selection"""
         selected = self.customer_combo.get()
         if selected:
             customer_name = selected.split(' (')[0]
-            db = SessionLocal()
-            try:
-                customer = db.query(Customer).filter(Customer.name == customer_name).first()
+            
+            def work(db):
+                return self.customer_cache.by_name(db, customer_name)
+            
+            def done(customer):
                 if customer:
-                    self.customer_name_var.set(customer.name)
-                    self.customer_phone_var.set(customer.phone or "")
-                    self.customer_address_var.set(customer.address or "")
-                    self.customer_type_var.set(customer.customer_type)
-                    self.discount_var.set(str(customer.discount_percentage))
+                    self.customer_name_var.set(customer['name'])
+                    self.customer_phone_var.set(customer['phone'] or "")
+                    self.customer_address_var.set(customer['address'] or "")
+                    self.customer_type_var.set(customer['customer_type'])
+                    self.discount_var.set(str(customer['discount_percentage']))
                     self.calculate_total()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load customer details: {e}")
-            finally:
-                db.close()
+            
+            # Cached customers are filled in straight away, without a database round trip
+            cached = self.customer_cache.peek_name(customer_name)
+            if cached is not None:
+                self.db_executor.cancel('customer_details')
+                done(cached)
+                return
+            self.db_executor.submit(
+                work, done,
+                lambda e: messagebox.showerror("Error", f"Failed to load customer details: {e}"),
+                key='customer_details'
+            )
     
     def on_customer_type_changed(self, event):
         """Handle customer type change"""
@@ -456,8 +707,7 @@ class RentalManagerApp:
         
         def save_customer():
             try:
-                db = SessionLocal()
-                customer = Customer(
+                fields = dict(
                     name=name_var.get(),
                     phone=phone_var.get(),
                     email=email_var.get(),
@@ -466,24 +716,31 @@ class RentalManagerApp:
                     discount_percentage=float(discount_var.get()),
                     notes=notes_var.get()
                 )
+            except ValueError as e:
+                messagebox.showerror("Error", f"Failed to add customer: {e}")
+                return
+            
+            def work(db):
+                customer = Customer(**fields)
                 db.add(customer)
+                db.flush()
+                stats.record_customers(db, 1)
                 db.commit()
+                return customer.id
+            
+            def done(customer_id):
                 messagebox.showinfo("Success", "Customer added successfully")
                 dialog.destroy()
-                self.load_customers()
-                self.refresh_customers()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to add customer: {e}")
-            finally:
-                db.close()
+                self.change_bus.publish(CUSTOMERS, [customer_id])
+            
+            self.db_executor.submit(work, done,
+                                    lambda e: messagebox.showerror("Error", f"Failed to add customer: {e}"))
         
         tk.Button(dialog, text="Save Customer", command=save_customer).pack(pady=10)
         tk.Button(dialog, text="Cancel", command=dialog.destroy).pack(pady=5)
     
-    def create_inventory_tab(self):
+    def create_inventory_tab(self, inventory_frame):
         """Create inventory management tab"""
-        inventory_frame = ttk.Frame(self.notebook)
-        self.notebook.add(inventory_frame, text="Inventory")
         
         # Inventory tree
         columns = ('ID', 'Name', 'Description', 'Total Qty', 'Available Qty', 'Daily Rate (GHS)')
@@ -496,6 +753,11 @@ class RentalManagerApp:
         # Scrollbar
         inventory_scrollbar = ttk.Scrollbar(inventory_frame, orient='vertical', command=self.inventory_tree.yview)
         self.inventory_tree.configure(yscrollcommand=inventory_scrollbar.set)
+        self.inventory_sync = TreeSync(self.inventory_tree)
+        # All inventory rows by item id, and a search index over them, so
+        # searching never goes to the database
+        self.inventory_rows = {}
+        self.inventory_index = SearchIndex(('name', 'description'))
         
         self.inventory_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
         inventory_scrollbar.pack(side='right', fill='y')
@@ -506,7 +768,7 @@ class RentalManagerApp:
         
         tk.Label(search_frame, text="Search Items:").pack(side='left', padx=5)
         self.search_var = tk.StringVar()
-        self.search_var.trace('w', self.filter_inventory)
+        self.search_var.trace('w', Debouncer(self.root, SEARCH_DEBOUNCE_MS, self.filter_inventory))
         tk.Entry(search_frame, textvariable=self.search_var, width=30).pack(side='left', padx=5)
         
         tk.Button(search_frame, text="Clear Search", command=self.clear_search).pack(side='left', padx=5)
@@ -522,13 +784,13 @@ class RentalManagerApp:
         tk.Button(button_frame, text="Delete Selected Item", command=self.delete_selected_item, 
                  bg='#e74c3c', fg='white').pack(side='left', padx=5)
         
-        # Load inventory
-        self.refresh_inventory()
+        # Load inventory; changed items are re-read one by one rather than reloading everything
+        self.refresh_scheduler.register('inventory', self.refresh_inventory, (ITEMS,), (inventory_frame,),
+                                        update=self.update_inventory_rows)
+        self.refresh_scheduler.request('inventory')
     
-    def create_customers_tab(self):
+    def create_customers_tab(self, customers_frame):
         """Create customers management tab"""
-        customers_frame = ttk.Frame(self.notebook)
-        self.notebook.add(customers_frame, text="Customers")
         
         # Customers tree
         columns = ('ID', 'Name', 'Type', 'Phone', 'Email', 'Address', 'Discount %', 'Created')
@@ -541,10 +803,20 @@ class RentalManagerApp:
         # Scrollbar
         customers_scrollbar = ttk.Scrollbar(customers_frame, orient='vertical', command=self.customers_tree.yview)
         self.customers_tree.configure(yscrollcommand=customers_scrollbar.set)
+        self.customers_sync = TreeSync(self.customers_tree)
         
         self.customers_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
         customers_scrollbar.pack(side='right', fill='y')
         
+        # Search frame
+        search_frame = tk.Frame(customers_frame)
+        search_frame.pack(fill='x', padx=10, pady=5)
+        
+        tk.Label(search_frame, text="Search Customers:").pack(side='left', padx=5)
+        self.customer_search_var = tk.StringVar()
+        self.customer_search_var.trace('w', Debouncer(self.root, SEARCH_DEBOUNCE_MS, self.refresh_customers))
+        tk.Entry(search_frame, textvariable=self.customer_search_var, width=30).pack(side='left', padx=5)
+        
         # Buttons
         button_frame = tk.Frame(customers_frame)
         button_frame.pack(fill='x', padx=10, pady=5)
@@ -557,12 +829,11 @@ class RentalManagerApp:
                  bg='#e74c3c', fg='white').pack(side='left', padx=5)
         
         # Load customers
-        self.refresh_customers()
+        self.refresh_scheduler.register('customers', self.refresh_customers, (CUSTOMERS,), (customers_frame,))
+        self.refresh_scheduler.request('customers')
     
-    def create_rentals_tab(self):
+    def create_rentals_tab(self, rentals_frame):
         """Create active rentals management tab"""
-        rentals_frame = ttk.Frame(self.notebook)
-        self.notebook.add(rentals_frame, text="Active Rentals")
         
         # Rentals title
         tk.Label(rentals_frame, text="Active Rentals Management", font=("Arial", 14, "bold")).pack(pady=10)
@@ -578,6 +849,7 @@ class RentalManagerApp:
         # Scrollbar
         rentals_scrollbar = ttk.Scrollbar(rentals_frame, orient='vertical', command=self.rentals_tree.yview)
         self.rentals_tree.configure(yscrollcommand=rentals_scrollbar.set)
+        self.rentals_sync = TreeSync(self.rentals_tree)
         
         self.rentals_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
         rentals_scrollbar.pack(side='right', fill='y')
@@ -589,46 +861,51 @@ class RentalManagerApp:
         tk.Button(button_frame, text="Refresh Rentals", command=self.refresh_rentals).pack(side='left', padx=5)
         tk.Button(button_frame, text="Mark as Returned", command=self.mark_as_returned, 
                  bg='#27ae60', fg='white').pack(side='left', padx=5)
+        tk.Button(button_frame, text="Return Items...", command=self.return_items_dialog).pack(side='left', padx=5)
         
         # Load rentals
-        self.refresh_rentals()
+        self.refresh_scheduler.register('rentals', self.refresh_rentals, (ORDERS, CUSTOMERS, ITEMS), (rentals_frame,),
+                                        update=self.update_rental_rows)
+        self.refresh_scheduler.request('rentals')
     
-    def create_reports_tab(self):
+    def create_reports_tab(self, reports_frame):
         """Create reports tab"""
-        reports_frame = ttk.Frame(self.notebook)
-        self.notebook.add(reports_frame, text="Reports")
         
         # Active rentals
         tk.Label(reports_frame, text="Active Rentals", font=("Arial", 14, "bold")).pack(pady=10)
         
         columns = ('ID', 'Customer', 'Items', 'Start Date', 'Return Date', 'Amount (GHS)')
-        self.rentals_tree = ttk.Treeview(reports_frame, columns=columns, show='headings', height=10)
+        self.reports_tree = ttk.Treeview(reports_frame, columns=columns, show='headings', height=10)
         
         for col in columns:
-            self.rentals_tree.heading(col, text=col)
-            self.rentals_tree.column(col, width=120)
+            self.reports_tree.heading(col, text=col)
+            self.reports_tree.column(col, width=120)
         
         # Scrollbar
-        rentals_scrollbar = ttk.Scrollbar(reports_frame, orient='vertical', command=self.rentals_tree.yview)
-        self.rentals_tree.configure(yscrollcommand=rentals_scrollbar.set)
+        reports_scrollbar = ttk.Scrollbar(reports_frame, orient='vertical', command=self.reports_tree.yview)
+        self.reports_tree.configure(yscrollcommand=reports_scrollbar.set)
+        self.reports_sync = TreeSync(self.reports_tree)
         
-        self.rentals_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-        rentals_scrollbar.pack(side='right', fill='y')
+        self.reports_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
+        reports_scrollbar.pack(side='right', fill='y')
         
         # Buttons
         button_frame = tk.Frame(reports_frame)
         button_frame.pack(fill='x', padx=10, pady=5)
         
         tk.Button(button_frame, text="Refresh Rentals", command=self.refresh_rentals).pack(side='left', padx=5)
-        tk.Button(button_frame, text="Mark as Returned", command=self.mark_as_returned).pack(side='left', padx=5)
+        tk.Button(button_frame, text="Mark Selected as Returned",
+                 command=lambda: self.mark_as_returned(self.reports_tree)).pack(side='left', padx=5)
+        tk.Button(button_frame, text="Return Items...",
+                 command=lambda: self.return_items_dialog(self.reports_tree)).pack(side='left', padx=5)
         
         # Load rentals
-        self.refresh_rentals()
+        self.refresh_scheduler.register('reports', self.refresh_rentals, (ORDERS, CUSTOMERS, ITEMS), (reports_frame,),
+                                        update=self.update_rental_rows)
+        self.refresh_scheduler.request('reports')
     
-    def create_history_tab(self):
+    def create_history_tab(self, history_frame):
         """Create rental history tab"""
-        history_frame = ttk.Frame(self.notebook)
-        self.notebook.add(history_frame, text="Rental History")
         
         # History title
         tk.Label(history_frame, text="Rental History - Past Rentals", font=("Arial", 14, "bold")).pack(pady=10)
@@ -643,11 +920,23 @@ class RentalManagerApp:
         
         # Scrollbar
         history_scrollbar = ttk.Scrollbar(history_frame, orient='vertical', command=self.history_tree.yview)
-        self.history_tree.configure(yscrollcommand=history_scrollbar.set)
         
         self.history_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
         history_scrollbar.pack(side='right', fill='y')
         
+        # History grows without bound, so it is loaded a page at a time as the user scrolls
+        self.history_view = PagedTreeview(self.history_tree, history_scrollbar, self.db_executor,
+                                          fetch_history_page, 'history')
+        
+        # Search frame
+        search_frame = tk.Frame(history_frame)
+        search_frame.pack(fill='x', padx=10, pady=5)
+        
+        tk.Label(search_frame, text="Search Customer or Item:").pack(side='left', padx=5)
+        self.history_search_var = tk.StringVar()
+        self.history_search_var.trace('w', Debouncer(self.root, SEARCH_DEBOUNCE_MS, self.refresh_history))
+        tk.Entry(search_frame, textvariable=self.history_search_var, width=30).pack(side='left', padx=5)
+        
         # Buttons
         button_frame = tk.Frame(history_frame)
         button_frame.pack(fill='x', padx=10, pady=5)
@@ -656,34 +945,237 @@ class RentalManagerApp:
         tk.Button(button_frame, text="Export History", command=self.export_history).pack(side='left', padx=5)
         
         # Load history
-        self.refresh_history()
+        self.refresh_scheduler.register('history', self.refresh_history, (ORDERS, CUSTOMERS, ITEMS), (history_frame,),
+                                        update=self.update_history_rows)
+        self.refresh_scheduler.request('history')
+    
+    def create_calendar_tab(self, calendar_frame):
+        """Create availability calendar tab"""
+        
+        # Calendar title
+        tk.Label(calendar_frame, text="Availability Calendar", font=("Arial", 14, "bold")).pack(pady=10)
+        
+        # Item and period selection
+        controls_frame = tk.Frame(calendar_frame)
+        controls_frame.pack(fill='x', padx=10, pady=5)
+        
+        tk.Label(controls_frame, text="Item:").pack(side='left', padx=5)
+        self.calendar_item_var = tk.StringVar()
+        self.calendar_item_combo = ttk.Combobox(controls_frame, textvariable=self.calendar_item_var, width=30, state='readonly')
+        self.calendar_item_combo.pack(side='left', padx=5)
+        self.calendar_item_combo.bind('<<ComboboxSelected>>', lambda event: self.refresh_calendar())
+        
+        tk.Label(controls_frame, text="From:").pack(side='left', padx=5)
+        self.calendar_start_var = tk.StringVar(value=datetime.now().strftime('%Y-%m-%d'))
+        tk.Entry(controls_frame, textvariable=self.calendar_start_var, width=12).pack(side='left', padx=5)
+        
+        tk.Label(controls_frame, text="Days:").pack(side='left', padx=5)
+        self.calendar_days_var = tk.StringVar(value=str(CALENDAR_DAYS))
+        tk.Spinbox(controls_frame, from_=1, to=366, textvariable=self.calendar_days_var, width=5).pack(side='left', padx=5)
+        
+        tk.Button(controls_frame, text="Show", command=self.refresh_calendar).pack(side='left', padx=5)
+        
+        # One row per day
+        columns = ('Date', 'Day', 'Reserved', 'Free')
+        self.calendar_tree = ttk.Treeview(calendar_frame, columns=columns, show='headings', height=15)
+        
+        for col in columns:
+            self.calendar_tree.heading(col, text=col)
+            self.calendar_tree.column(col, width=120)
+        
+        # Scrollbar
+        calendar_scrollbar = ttk.Scrollbar(calendar_frame, orient='vertical', command=self.calendar_tree.yview)
+        self.calendar_tree.configure(yscrollcommand=calendar_scrollbar.set)
+        self.calendar_sync = TreeSync(self.calendar_tree)
+        
+        self.calendar_tree.pack(side='left', fill='both', expand=True, padx=10, pady=10)
+        calendar_scrollbar.pack(side='right', fill='y')
+        
+        # Load calendar
+        self.refresh_scheduler.register('calendar', self.refresh_calendar, (ORDERS, ITEMS), (calendar_frame,))
+        self.refresh_scheduler.request('calendar')
+    
+    def create_availability_tab(self, availability_frame):
+        """Create whole-catalog availability heatmap tab"""
+        
+        # Availability title
+        tk.Label(availability_frame, text=f"Availability - Next {CALENDAR_MATRIX_DAYS} Days", font=("Arial", 14, "bold")).pack(pady=10)
+        
+        # Legend and refresh
+        controls_frame = tk.Frame(availability_frame)
+        controls_frame.pack(fill='x', padx=10, pady=5)
+        
+        tk.Button(controls_frame, text="Refresh", command=self.refresh_availability).pack(side='left', padx=5)
+        tk.Label(controls_frame, text="Free stock:").pack(side='left', padx=(20, 5))
+        for share, color in HEATMAP_COLORS:
+            tk.Label(controls_frame, text=f"{share:.0%}", bg=color, width=5).pack(side='left', padx=1)
+        self.availability_status_label = tk.Label(controls_frame, text="", fg='#555555')
+        self.availability_status_label.pack(side='right', padx=5)
+        
+        # Heatmap: one row per item, one column per day
+        heatmap_frame = tk.Frame(availability_frame)
+        heatmap_frame.pack(fill='both', expand=True, padx=10, pady=10)
+        
+        self.availability_canvas = tk.Canvas(heatmap_frame, bg='white', highlightthickness=0)
+        y_scrollbar = ttk.Scrollbar(heatmap_frame, orient='vertical', command=self.availability_canvas.yview)
+        x_scrollbar = ttk.Scrollbar(heatmap_frame, orient='horizontal', command=self.availability_canvas.xview)
+        self.availability_canvas.configure(yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set)
+        
+        y_scrollbar.pack(side='right', fill='y')
+        x_scrollbar.pack(side='bottom', fill='x')
+        self.availability_canvas.pack(side='left', fill='both', expand=True)
+        
+        # Load availability
+        self.refresh_scheduler.register('availability', self.refresh_availability, (ORDERS, ITEMS), (availability_frame,))
+        self.refresh_scheduler.request('availability')
+    
+    def refresh_availability(self):
+        """Recompute the catalog availability matrix and redraw the heatmap"""
+        start_date = datetime.now().date()
+        
+        def work(db):
+            started = time.perf_counter()
+            items, reserved = catalog_calendar(db, start_date)
+            return items, reserved, (time.perf_counter() - started) * 1000
+        
+        def done(result):
+            items, reserved, query_ms = result
+            started = time.perf_counter()
+            self.draw_availability_heatmap(items, reserved, start_date)
+            draw_ms = (time.perf_counter() - started) * 1000
+            self.availability_status_label.config(
+                text=f"{len(items)} items - load {query_ms:.0f} ms, draw {draw_ms:.0f} ms")
+        
+        self.db_executor.submit(work, done,
+                                lambda e: messagebox.showerror("Error", f"Failed to load availability: {e}"),
+                                key='availability')
+    
+    def draw_availability_heatmap(self, items, reserved, start_date):
+        """Draw one row of day cells per item, coloured by the share of its stock that is free"""
+        canvas = self.availability_canvas
+        canvas.delete('all')
+        days = len(reserved[0]) if reserved else 0
+        left, top = HEATMAP_LABEL_WIDTH, HEATMAP_CELL_HEIGHT * 2
+        
+        # Week markers along the top
+        for offset in range(0, days, 7):
+            day = start_date + timedelta(days=offset)
+            x = left + offset * HEATMAP_CELL_WIDTH
+            canvas.create_text(x, HEATMAP_CELL_HEIGHT, text=day.strftime('%d %b'), anchor='w', font=("Arial", 8))
+            canvas.create_line(x, top - 4, x, top + len(items) * HEATMAP_CELL_HEIGHT, fill='#dddddd')
+        
+        for row, ((item_id, name, total), counts) in enumerate(zip(items, reserved)):
+            y = top + row * HEATMAP_CELL_HEIGHT
+            canvas.create_text(left - 6, y + HEATMAP_CELL_HEIGHT / 2, text=f"{name} ({total})", anchor='e',
+                               font=("Arial", 9))
+            # Reservations change on few days, so runs of equal colour are drawn as one rectangle
+            run_start, run_color = 0, None
+            for offset in range(days + 1):
+                color = heatmap_color(total - counts[offset], total) if offset < days else None
+                if color != run_color:
+                    if run_color is not None:
+                        canvas.create_rectangle(left + run_start * HEATMAP_CELL_WIDTH, y,
+                                                left + offset * HEATMAP_CELL_WIDTH, y + HEATMAP_CELL_HEIGHT - 2,
+                                                fill=run_color, outline='')
+                    run_start, run_color = offset, color
+        
+        canvas.configure(scrollregion=(0, 0, left + days * HEATMAP_CELL_WIDTH + 10,
+                                       top + len(items) * HEATMAP_CELL_HEIGHT + 10))
+    
+    def refresh_calendar(self):
+        """Show reserved and free units of the chosen item for each day of the period"""
+        try:
+            start_date = datetime.strptime(self.calendar_start_var.get(), '%Y-%m-%d').date()
+            days = int(self.calendar_days_var.get())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid start date and number of days")
+            return
+        item_name = self.calendar_item_var.get()
+        
+        def work(db):
+            names = [item['name'] for item in self.item_cache.all(db)]
+            item = self.item_cache.by_name(db, item_name) if item_name else None
+            reserved = self.availability.reserved_by_day(db, item['id'], start_date, days) if item else []
+            return names, item, reserved
+        
+        def done(result):
+            names, item, reserved = result
+            self.calendar_item_combo['values'] = names
+            rows = []
+            for offset, units in enumerate(reserved):
+                day = start_date + timedelta(days=offset)
+                rows.append((day.isoformat(), (day.isoformat(), day.strftime('%a'), units,
+                                               max(item['total_quantity'] - units, 0))))
+            self.calendar_sync.apply(rows)
+        
+        self.db_executor.submit(work, done,
+                                lambda e: messagebox.showerror("Error", f"Failed to load calendar: {e}"),
+                                key='calendar')
     
     def load_items(self):
         """Load items into the combo box"""
-        db = SessionLocal()
-        try:
-            items = db.query(Item).all()
-            item_names = [f"{item.name} (Available: {item.available_quantity})" for item in items]
+        def work(db):
+            return [f"{item['name']} (Available: {item['available_quantity']})" for item in self.item_cache.all(db)]
+        
+        def done(item_names):
             self.item_combo['values'] = item_names
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load items: {e}")
-        finally:
-            db.close()
+        
+        self.db_executor.submit(work, done,
+                                lambda e: messagebox.showerror("Error", f"Failed to load items: {e}"),
+                                key='load_items')
     
     def on_item_selected(self, event):
         """Handle item selection"""
         selected = self.item_combo.get()
         if selected:
             item_name = selected.split(' (Available:')[0]
-            db = SessionLocal()
-            try:
-                item = db.query(Item).filter(Item.name == item_name).first()
+            
+            def work(db):
+                return self.item_cache.by_name(db, item_name)
+            
+            def done(item):
                 if item:
                     self.current_item = item
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load item details: {e}")
-            finally:
-                db.close()
+                    self.show_item_availability()
+            
+            cached = self.item_cache.peek_name(item_name)
+            if cached is not None:
+                self.db_executor.cancel('item_details')
+                done(cached)
+                return
+            self.db_executor.submit(
+                work, done,
+                lambda e: messagebox.showerror("Error", f"Failed to load item details: {e}"),
+                key='item_details'
+            )
+    
+    def rental_period(self):
+        """(start date, return date) from the rental form; raises ValueError if invalid"""
+        start_date = datetime.strptime(self.start_date_var.get(), '%Y-%m-%d').date()
+        days = int(self.days_var.get())
+        if days <= 0:
+            raise ValueError("Number of days must be greater than 0")
+        return start_date, start_date + timedelta(days=days)
+    
+    def show_item_availability(self):
+        """Show how many units of the selected item are free for the whole rental period"""
+        item = getattr(self, 'current_item', None)
+        if not item or not hasattr(self, 'item_free_var'):
+            return
+        try:
+            start_date, return_date = self.rental_period()
+        except ValueError:
+            self.item_free_var.set("")
+            return
+        
+        def work(db):
+            return self.availability.free(db, item['id'], item['total_quantity'], start_date, return_date)
+        
+        def done(free):
+            self.item_free_var.set(f"{item['name']}: {max(free, 0)} free from {start_date} to {return_date}")
+        
+        self.db_executor.submit(work, done, lambda e: print(f"Availability check error: {e}"),
+                                key='item_availability')
     
     def add_item_to_rental(self):
         """Add item to rental list"""
@@ -696,23 +1188,35 @@ class RentalManagerApp:
             if quantity <= 0:
                 messagebox.showerror("Error", "Quantity must be greater than 0")
                 return
-            
-            if self.current_item.available_quantity < quantity:
-                messagebox.showerror("Error", f"Not enough items available. Only {self.current_item.available_quantity} available")
+            start_date, return_date = self.rental_period()
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid quantity, start date and number of days")
+            return
+        
+        # Check if item already in rental
+        item = self.current_item
+        for rental_item in self.rental_items:
+            if rental_item['item']['id'] == item['id']:
+                messagebox.showwarning("Warning", "This item is already in the rental. Please remove it first to change quantity.")
+                return
+        
+        # Units already booked on any day of the period don't count as available
+        def work(db):
+            return self.availability.free(db, item['id'], item['total_quantity'], start_date, return_date)
+        
+        def done(free):
+            if free < quantity:
+                messagebox.showerror("Error", f"Not enough items available from {start_date} to {return_date}. "
+                                              f"Only {max(free, 0)} available")
+                return
+            if any(rental_item['item']['id'] == item['id'] for rental_item in self.rental_items):
                 return
-            
-            # Check if item already in rental
-            for rental_item in self.rental_items:
-                if rental_item['item'].id == self.current_item.id:
-                    messagebox.showwarning("Warning", "This item is already in the rental. Please remove it first to change quantity.")
-                    return
             
             # Add to rental items
-            rental_item = {
-                'item': self.current_item,
+            self.rental_items.append({
+                'item': item,
                 'quantity': quantity
-            }
-            self.rental_items.append(rental_item)
+            })
             
             # Update listbox
             self.update_rental_items_display()
@@ -721,9 +1225,9 @@ class RentalManagerApp:
             # Clear selection
             self.item_var.set("")
             self.quantity_var.set("1")
-            
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid quantity")
+        
+        self.db_executor.submit(work, done,
+                                lambda e: messagebox.showerror("Error", f"Failed to check availability: {e}"))
     
     def remove_selected_item(self):
         """Remove selected item from rental"""
@@ -744,8 +1248,8 @@ class RentalManagerApp:
         for rental_item in self.rental_items:
             item = rental_item['item']
             quantity = rental_item['quantity']
-            total_price = item.daily_rate * quantity
-            display_text = f"{item.name} x{quantity} @ GHS {item.daily_rate:.2f} = GHS {total_price:.2f}"
+            total_price = item['daily_rate'] * quantity
+            display_text = f"{item['name']} x{quantity} @ GHS {item['daily_rate']:.2f} = GHS {total_price:.2f}"
             self.items_listbox.insert(tk.END, display_text)
     
     def calculate_total(self, *args):
@@ -758,7 +1262,7 @@ class RentalManagerApp:
             for rental_item in self.rental_items:
                 item = rental_item['item']
                 quantity = rental_item['quantity']
-                total += item.daily_rate * quantity * days
+                total += item['daily_rate'] * quantity * days
             
             # Apply discount
             discount_amount = total * (discount / 100)
@@ -789,139 +1293,59 @@ class RentalManagerApp:
                 messagebox.showerror("Error", "Number of days must be greater than 0")
                 return
             
-            # Get or create customer
-            db = SessionLocal()
-            try:
-                customer = db.query(Customer).filter(Customer.name == self.customer_name_var.get()).first()
-                if not customer:
-                    customer = Customer(
-                        name=self.customer_name_var.get(),
-                        phone=self.customer_phone_var.get(),
-                        address=self.customer_address_var.get(),
-                        customer_type=self.customer_type_var.get(),
-                        discount_percentage=float(self.discount_var.get())
-                    )
-                    db.add(customer)
-                    db.flush()
+            # Capture the form on the UI thread; the worker must not touch Tk variables
+            customer_fields = {
+                'name': self.customer_name_var.get(),
+                'phone': self.customer_phone_var.get(),
+                'address': self.customer_address_var.get(),
+                'customer_type': self.customer_type_var.get(),
+                'discount_percentage': float(self.discount_var.get())
+            }
+            start_date = datetime.strptime(self.start_date_var.get(), '%Y-%m-%d').date()
+            rental_items = list(self.rental_items)
+            jobs = []
+            sms_message = ""
+            if RECEIPT_AVAILABLE and self.generate_receipt_var.get():
+                jobs.append(RECEIPT)
+            if RECEIPT_AVAILABLE and self.send_sms_var.get() and customer_fields['phone']:
+                if SMS_ENABLED:
+                    jobs.append(SMS)
                 else:
-                    # Update existing customer if details changed
-                    customer.phone = self.customer_phone_var.get()
-                    customer.address = self.customer_address_var.get()
-                    customer.customer_type = self.customer_type_var.get()
-                    customer.discount_percentage = float(self.discount_var.get())
-                
-                # Create rental for each item
-                total_amount = 0
-                discount = float(self.discount_var.get())
-                start_date = datetime.strptime(self.start_date_var.get(), '%Y-%m-%d').date()
-                return_date = start_date + timedelta(days=days)
-                
-                for rental_item in self.rental_items:
-                    item = rental_item['item']
-                    quantity = rental_item['quantity']
-                    
-                    # Check availability again
-                    if item.available_quantity < quantity:
-                        messagebox.showerror("Error", f"Not enough {item.name} available. Only {item.available_quantity} available")
-                        return
-                    
-                    # Calculate item total with discount
-                    item_total = item.daily_rate * quantity * days
-                    discount_amount = item_total * (discount / 100)
-                    final_item_total = item_total - discount_amount
-                    
-                    # Create rental record
-                    rental = Rental(
-                        customer_id=customer.id,
-                        item_id=item.id,
-                        quantity=quantity,
-                        rental_date=start_date,
-                        return_date=return_date,
-                        daily_rate=item.daily_rate,
-                        total_amount=final_item_total
-                    )
-                    
-                    db.add(rental)
-                    
-                    # Update available quantity
-                    item.available_quantity -= quantity
-                    total_amount += rental.total_amount
-                
-                db.commit()
-                
-                # Get the first rental ID for receipt (they all share the same customer/date)
-                first_rental = db.query(Rental).filter(
-                    Rental.customer_id == customer.id,
-                    Rental.rental_date == start_date
-                ).first()
-                
-                rental_id = first_rental.id if first_rental else "N/A"
-                
-                # Generate receipt and send SMS if requested
-                receipt_path = None
-                sms_sent = False
-                sms_message = ""
-                
-                if RECEIPT_AVAILABLE and self.generate_receipt_var.get():
-                    try:
-                        receipt_path = self.generate_receipt(
-                            rental_id=rental_id,
-                            customer=customer,
-                            rental_items=self.rental_items,
-                            start_date=start_date,
-                            return_date=return_date,
-                            days=days,
-                            discount=discount,
-                            total_amount=total_amount
-                        )
-                    except Exception as e:
-                        print(f"Receipt generation error: {e}")
-                        receipt_path = None
-                
-                if RECEIPT_AVAILABLE and self.send_sms_var.get() and customer.phone:
-                    if SMS_ENABLED:
-                        try:
-                            sms_result = self.send_receipt_sms(
-                                customer.phone,
-                                customer.name,
-                                rental_id,
-                                total_amount,
-                                return_date.strftime('%Y-%m-%d'),
-                                receipt_path
-                            )
-                            sms_sent = sms_result.get('success', False)
-                            sms_message = sms_result.get('message', '')
-                        except Exception as e:
-                            print(f"SMS sending error: {e}")
-                            sms_message = f"SMS error: {str(e)}"
-                    else:
-                        sms_message = "SMS is disabled. Configure SMS gateway in sms_config.py"
-                
-                # Success message
-                success_msg = f"Rental created successfully!\nTotal Amount: GHS {total_amount:.2f}"
-                if receipt_path:
-                    success_msg += f"\n\nReceipt saved: {receipt_path}"
-                if sms_sent:
-                    success_msg += f"\n\nSMS sent successfully!"
-                elif self.send_sms_var.get() and sms_message:
-                    success_msg += f"\n\nSMS: {sms_message}"
-                
-                messagebox.showinfo("Success", success_msg)
-                self.clear_rental_form()
-                self.refresh_inventory()
-                self.refresh_rentals()
-                self.refresh_history()
-                self.refresh_dashboard()
-                self.export_web_json_feeds()
-                
-            except Exception as e:
-                db.rollback()
-                messagebox.showerror("Error", f"Failed to create rental: {e}")
-            finally:
-                db.close()
-                
+                    sms_message = "SMS is disabled. Configure SMS gateway in sms_config.py"
         except ValueError:
             messagebox.showerror("Error", "Please enter valid numbers for days")
+            return
+        
+        def work(db):
+            # Lock, check and book every item in one transaction (see checkout.py)
+            quantities = {rental_item['item']['id']: rental_item['quantity'] for rental_item in rental_items}
+            # The receipt and SMS are queued in the same transaction and sent by the job worker
+            order, _ = checkout(db, customer_fields, quantities, start_date, days, jobs)
+            return {
+                'order_id': order.id,
+                'customer_id': order.customer_id,
+                'item_ids': list(quantities),
+                'total_amount': order.total_amount
+            }
+        
+        def done(result):
+            # Success message
+            success_msg = f"Rental created successfully!\nTotal Amount: GHS {result['total_amount']:.2f}"
+            if jobs:
+                self.job_worker.wake()
+                queued = " and ".join("Receipt" if kind == RECEIPT else "SMS" for kind in jobs)
+                success_msg += f"\n\n{queued} on the way; progress is shown in the top bar"
+            if sms_message:
+                success_msg += f"\n\nSMS: {sms_message}"
+            
+            messagebox.showinfo("Success", success_msg)
+            self.clear_rental_form()
+            self.change_bus.publish(ORDERS, [result['order_id']])
+            self.change_bus.publish(ITEMS, result['item_ids'])
+            self.change_bus.publish(CUSTOMERS, [result['customer_id']])
+        
+        self.db_executor.submit(work, done,
+                                lambda e: messagebox.showerror("Error", f"Failed to create rental: {e}"))
     
     def clear_rental_form(self):
         """Clear the rental form"""
@@ -944,166 +1368,238 @@ class RentalManagerApp:
         if hasattr(self, 'send_sms_var'):
             self.send_sms_var.set(False)
     
-    def refresh_dashboard(self):
-        """Refresh dashboard data"""
-        try:
-            db = SessionLocal()
-            
-            # Get total items
-            total_items = db.query(Item).count()
-            
-            # Get total customers
-            total_customers = db.query(Customer).count()
-            
-            # Get active rentals
-            active_rentals = db.query(Rental).filter(Rental.is_returned == False).count()
-            
-            # Get total revenue
-            total_revenue = db.query(Rental).filter(Rental.is_returned == True).with_entities(
-                func.sum(Rental.total_amount)
-            ).scalar() or 0
-            
+    def refresh_dashboard(self, force=False):
+        """Refresh dashboard data (one query, or none if nothing changed since the last one)"""
+        requested = time.perf_counter()
+        
+        def work(db):
+            started = time.perf_counter()
+            stats, timings = self.dashboard_cache.get(db, force)
+            timings['wait_ms'] = (started - requested) * 1000
+            return stats, timings
+        
+        def done(result):
+            stats, timings = result
+            render_start = time.perf_counter()
             # Update dashboard labels if they exist
             if hasattr(self, 'total_items_label'):
-                self.total_items_label.config(text=f"Total Items: {total_items}")
-            if hasattr(self, 'total_customers_label'):
-                self.total_customers_label.config(text=f"Total Customers: {total_customers}")
-            if hasattr(self, 'active_rentals_label'):
-                self.active_rentals_label.config(text=f"Active Rentals: {active_rentals}")
-            if hasattr(self, 'total_revenue_label'):
-                self.total_revenue_label.config(text=f"Total Revenue: GHS {total_revenue:.2f}")
-                
-        except Exception as e:
-            print(f"Dashboard refresh error: {e}")
-        finally:
-            db.close()
+                self.total_items_label.config(text=f"Total Items: {stats['total_items']}")
+                self.total_customers_label.config(text=f"Total Customers: {stats['total_customers']}")
+                self.active_rentals_label.config(text=f"Active Rentals: {stats['active_rentals']}")
+                self.total_revenue_label.config(text=f"Total Revenue: GHS {stats['total_revenue']:.2f}")
+                self.overdue_rentals_label.config(text=f"Overdue Rentals: {stats['overdue_rentals']}")
+                self.revenue_trend_label.config(
+                    text=f"Bookings: Today GHS {stats['revenue_today']:.2f} | "
+                         f"7 days GHS {stats['revenue_7d']:.2f} | 30 days GHS {stats['revenue_30d']:.2f}")
+                self.utilization_label.config(
+                    text=f"Utilization: {stats['utilization']:.1f}% of units out "
+                         f"({stats['units_out']} of {stats['total_units']})")
+            timings['render_ms'] = (time.perf_counter() - render_start) * 1000
+            self.dashboard_timings = timings
+            if hasattr(self, 'dashboard_timing_label'):
+                source = "cached" if timings['cached'] else f"query {timings['query_ms']:.1f} ms"
+                caches = ", ".join(
+                    f"{entity} {cache.hits}/{cache.hits + cache.misses}"
+                    for entity, cache in self.entity_caches.items()
+                )
+                self.dashboard_timing_label.config(
+                    text=f"Last refresh: wait {timings['wait_ms']:.1f} ms, {source}, "
+                         f"render {timings['render_ms']:.1f} ms | Cache hits: {caches}")
+        
+        self.db_executor.submit(work, done, lambda e: print(f"Dashboard refresh error: {e}"),
+                                key='refresh_dashboard')
     
     def refresh_inventory(self):
         """Refresh inventory display"""
-        # Clear existing items
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
+        def work(db):
+            return [inventory_row(item) for item in db.query(Item).all()]
         
-        db = SessionLocal()
-        try:
-            items = db.query(Item).all()
-            for item in items:
-                self.inventory_tree.insert('', 'end', values=(
-                    item.id,
-                    item.name,
-                    item.description,
-                    item.total_quantity,
-                    item.available_quantity,
-                    f"GHS {item.daily_rate:.2f}"
-                ))
-        except Exception as e:
-            print(f"Inventory refresh error: {e}")
-        finally:
-            if 'db' in locals():
-                db.close()
+        def done(rows):
+            self.inventory_rows = {row[0]: row for row in rows}
+            self.inventory_index.rebuild((row[0], inventory_search_fields(row)) for row in rows)
+            self.filter_inventory()
+        
+        self.db_executor.submit(work, done, lambda e: print(f"Inventory refresh error: {e}"),
+                                key='inventory')
     
-    def refresh_customers(self):
-        """Refresh customers display"""
-        try:
-            # Clear existing customers
-            for customer in self.customers_tree.get_children():
-                self.customers_tree.delete(customer)
-            
-            db = SessionLocal()
-            customers = db.query(Customer).all()
-            for customer in customers:
-                self.customers_tree.insert('', 'end', values=(
-                    customer.id,
-                    customer.name,
-                    customer.customer_type,
-                    customer.phone or "",
-                    customer.email or "",
-                    customer.address or "",
-                    f"{customer.discount_percentage}%",
-                    customer.created_at.strftime('%Y-%m-%d')
-                ))
-        except Exception as e:
-            print(f"Customer refresh error: {e}")
-        finally:
-            if 'db' in locals():
-                db.close()
+    def update_inventory_rows(self, changes):
+        """Re-read only the changed items and update their rows and search entries"""
+        item_ids = changes.get(ITEMS, set())
+        
+        def work(db):
+            return [inventory_row(item) for item in db.query(Item).filter(Item.id.in_(item_ids)).all()]
+        
+        def done(rows):
+            for row in rows:
+                self.inventory_rows[row[0]] = row
+                self.inventory_index.upsert(row[0], inventory_search_fields(row))
+            # Items that no longer exist were deleted
+            deleted = item_ids - {row[0] for row in rows}
+            for item_id in deleted:
+                self.inventory_rows.pop(item_id, None)
+                self.inventory_index.remove(item_id)
+            if self.search_var.get().strip():
+                # Matches and their ranking may have changed
+                self.filter_inventory()
+            else:
+                self.inventory_sync.patch([(row[0], row) for row in rows], deleted)
+        
+        self.db_executor.submit(work, done, lambda e: print(f"Inventory update error: {e}"))
+    
+    def refresh_customers(self, *args):
+        """Refresh customers display, limited to the current search if any"""
+        search_term = self.customer_search_var.get().strip()
+        
+        def work(db):
+            if search_term:
+                customers = search(db, 'customers', search_term)
+            else:
+                customers = db.query(Customer).all()
+            return [customer_row(customer) for customer in customers]
+        
+        def done(rows):
+            self.customers_sync.apply((row[0], row) for row in rows)
+        
+        self.db_executor.submit(work, done, lambda e: print(f"Customer refresh error: {e}"),
+                                key='refresh_customers')
     
     def refresh_rentals(self):
         """Refresh rentals display"""
-        # Clear existing rentals
-        for rental in self.rentals_tree.get_children():
-            self.rentals_tree.delete(rental)
+        def work(db):
+            return [order_row(order) for order in active_orders(db)]
         
-        db = SessionLocal()
-        try:
-            rentals = db.query(Rental).filter(Rental.is_returned == False).all()
-            # Group rentals by customer and date
-            rental_groups = {}
-            for rental in rentals:
-                key = f"{rental.customer.name}_{rental.rental_date}_{rental.return_date}"
-                if key not in rental_groups:
-                    rental_groups[key] = {
-                        'customer': rental.customer.name,
-                        'start_date': rental.rental_date,
-                        'return_date': rental.return_date,
-                        'items': [],
-                        'total_amount': 0
-                    }
-                rental_groups[key]['items'].append(f"{rental.item.name} x{rental.quantity}")
-                rental_groups[key]['total_amount'] += rental.total_amount
-            
-            for group in rental_groups.values():
-                items_str = ", ".join(group['items'])
-                self.rentals_tree.insert('', 'end', values=(
-                    "",  # No single ID for grouped rentals
-                    group['customer'],
-                    items_str,
-                    group['start_date'].strftime('%Y-%m-%d'),
-                    group['return_date'].strftime('%Y-%m-%d'),
-                    f"GHS {group['total_amount']:.2f}"
-                ))
-        except Exception as e:
-            print(f"Rentals refresh error: {e}")
-        finally:
-            if 'db' in locals():
-                db.close()
+        def done(rows):
+            # Either tab may not have been built yet
+            for sync in (getattr(self, 'rentals_sync', None), getattr(self, 'reports_sync', None)):
+                if sync is not None:
+                    sync.apply((row[0], row) for row in rows)
+        
+        self.db_executor.submit(work, done, lambda e: print(f"Rentals refresh error: {e}"),
+                                key='refresh_rentals')
+    
+    def update_rental_rows(self, changes):
+        """Re-read only the changed orders and update them in the active rental lists"""
+        syncs = [sync for sync in (getattr(self, 'rentals_sync', None), getattr(self, 'reports_sync', None))
+                 if sync is not None]
+        shown = {int(iid) for sync in syncs for iid in sync.rows}
+        order_ids = changes.get(ORDERS, set())
+        
+        def work(db):
+            return [(str(order.id), order.status, order_row(order)) for order in changed_orders(
+                db, order_ids, changes.get(CUSTOMERS), changes.get(ITEMS), shown
+            )]
+        
+        def done(rows):
+            found = {iid for iid, status, row in rows}
+            active = [(iid, row) for iid, status, row in rows if status == "Active"]
+            # Orders that are gone or no longer active
+            gone = [iid for iid, status, row in rows if status != "Active"]
+            gone += [str(order_id) for order_id in order_ids if str(order_id) not in found]
+            for sync in syncs:
+                # Oldest start date first, as in active_orders
+                sync.patch(active, gone, key=lambda iid, row: (row[3], int(iid)))
+        
+        self.db_executor.submit(work, done, lambda e: print(f"Rentals update error: {e}"))
     
-    def mark_as_returned(self):
-        """Mark selected rental as returned"""
-        selection = self.rentals_tree.selection()
+    def mark_as_returned(self, tree=None):
+        """Mark every selected rental as returned"""
+        tree = tree or self.rentals_tree
+        selection = tree.selection()
         if not selection:
             messagebox.showwarning("Warning", "Please select a rental to mark as returned")
             return
         
-        # For grouped rentals, we need to find all related rentals
-        customer_name = self.rentals_tree.item(selection[0])['values'][1]
-        start_date = self.rentals_tree.item(selection[0])['values'][3]
+        order_ids = [tree.item(iid)['values'][0] for iid in selection]
         
-        db = SessionLocal()
-        try:
-            # Find all rentals for this customer and date
-            rentals = db.query(Rental).join(Customer).filter(
-                Customer.name == customer_name,
-                Rental.rental_date == datetime.strptime(start_date, '%Y-%m-%d').date(),
-                Rental.is_returned == False
-            ).all()
+        def work(db):
+            return return_orders(db, order_ids)
+        
+        def done(result):
+            lines, closed = result
+            if not lines:
+                messagebox.showerror("Error", "Rental not found or already returned")
+                return
+            if len(order_ids) == 1:
+                messagebox.showinfo("Success", "Rental marked as returned")
+            else:
+                messagebox.showinfo("Success", f"{len(closed)} rentals marked as returned")
+            self.publish_returns(lines)
+        
+        self.db_executor.submit(
+            work, done,
+            lambda e: messagebox.showerror("Error", f"Failed to mark rental as returned: {e}")
+        )
+    
+    def return_items_dialog(self, tree=None):
+        """Return some of the units of the selected rental"""
+        tree = tree or self.rentals_tree
+        selection = tree.selection()
+        if not selection:
+            messagebox.showwarning("Warning", "Please select a rental to return items from")
+            return
+        
+        order_id = tree.item(selection[0])['values'][0]
+        
+        def show(lines):
+            if not lines:
+                messagebox.showerror("Error", "Rental not found or already returned")
+                return
+            
+            dialog = tk.Toplevel(self.root)
+            dialog.title(f"Return Items - Rental #{order_id}")
+            dialog.geometry("420x360")
+            dialog.transient(self.root)
+            dialog.grab_set()
             
-            for rental in rentals:
-                rental.is_returned = True
-                # Return items to available quantity
-                rental.item.available_quantity += rental.quantity
+            tk.Label(dialog, text="Units coming back now:", font=("Arial", 11, "bold")).pack(pady=10)
             
-            db.commit()
-            messagebox.showinfo("Success", "Rental marked as returned")
-            self.refresh_rentals()
-            self.refresh_inventory()
-            self.refresh_history()  # Refresh history to show returned rental
-            self.export_web_json_feeds()
-        except Exception as e:
-            db.rollback()
-            messagebox.showerror("Error", f"Failed to mark rental as returned: {e}")
-        finally:
-            db.close()
+            lines_frame = tk.Frame(dialog)
+            lines_frame.pack(fill='both', expand=True, padx=15)
+            unit_vars = {}
+            for row, (line_id, item_name, quantity, outstanding) in enumerate(lines):
+                tk.Label(lines_frame, text=f"{item_name} ({outstanding} of {quantity} out)").grid(
+                    row=row, column=0, sticky='w', pady=3)
+                unit_vars[line_id] = tk.StringVar(value=str(outstanding))
+                tk.Spinbox(lines_frame, from_=0, to=outstanding, textvariable=unit_vars[line_id],
+                           width=6).grid(row=row, column=1, padx=10, pady=3)
+            
+            def save_return():
+                try:
+                    units = {line_id: int(var.get()) for line_id, var in unit_vars.items()}
+                except ValueError:
+                    messagebox.showerror("Error", "Please enter whole numbers of units")
+                    return
+                units = {line_id: count for line_id, count in units.items() if count}
+                if not units:
+                    messagebox.showwarning("Warning", "Enter the units being returned")
+                    return
+                
+                def done(result):
+                    lines, closed = result
+                    dialog.destroy()
+                    returned = sum(line.units for line in lines)
+                    message = f"{returned} units returned"
+                    if closed:
+                        message += " - rental fully returned"
+                    messagebox.showinfo("Success", message)
+                    self.publish_returns(lines)
+                
+                self.db_executor.submit(
+                    lambda db: return_lines(db, units), done,
+                    lambda e: messagebox.showerror("Error", f"Failed to return items: {e}")
+                )
+            
+            tk.Button(dialog, text="Return", command=save_return, bg='#27ae60', fg='white').pack(pady=10)
+        
+        self.db_executor.submit(
+            lambda db: outstanding_lines(db, order_id), show,
+            lambda e: messagebox.showerror("Error", f"Failed to load rental: {e}")
+        )
+    
+    def publish_returns(self, lines):
+        """Tell the views about rental lines that units were returned on"""
+        self.change_bus.publish(ORDERS, sorted({line.order_id for line in lines}))
+        self.change_bus.publish(ITEMS, sorted({line.item_id for line in lines}))
     
     def add_new_item(self):
         """Add a new item to inventory"""
@@ -1133,56 +1629,55 @@ class RentalManagerApp:
         
         def save_item():
             try:
-                db = SessionLocal()
-                item = Item(
+                fields = dict(
                     name=name_var.get(),
                     description=desc_var.get(),
                     total_quantity=int(qty_var.get()),
                     available_quantity=int(qty_var.get()),
                     daily_rate=float(rate_var.get())
                 )
+            except ValueError as e:
+                messagebox.showerror("Error", f"Failed to add item: {e}")
+                return
+            
+            def work(db):
+                item = Item(**fields)
                 db.add(item)
+                db.flush()
+                stats.record_items(db, 1, item.total_quantity, item.total_quantity - item.available_quantity)
                 db.commit()
+                return item.id
+            
+            def done(item_id):
                 messagebox.showinfo("Success", "Item added successfully")
                 dialog.destroy()
-                self.refresh_inventory()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to add item: {e}")
-            finally:
-                db.close()
+                self.change_bus.publish(ITEMS, [item_id])
+            
+            self.db_executor.submit(work, done,
+                                    lambda e: messagebox.showerror("Error", f"Failed to add item: {e}"))
         
         tk.Button(dialog, text="Save", command=save_item).pack(pady=10)
         tk.Button(dialog, text="Cancel", command=dialog.destroy).pack(pady=5)
     
     def filter_inventory(self, *args):
-        """Filter inventory based on search term"""
-        search_term = self.search_var.get().lower()
-        
-        # Clear existing items
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
-        
-        db = SessionLocal()
-        try:
-            items = db.query(Item).all()
-            for item in items:
-                # Check if search term matches item name or description
-                if (search_term == "" or 
-                    search_term in item.name.lower() or 
-                    search_term in (item.description or "").lower()):
-                    
-                    self.inventory_tree.insert('', 'end', values=(
-                        item.id,
-                        item.name,
-                        item.description,
-                        item.total_quantity,
-                        item.available_quantity,
-                        f"GHS {item.daily_rate:.2f}"
-                    ))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to filter inventory: {e}")
-        finally:
-            db.close()
+        """Filter inventory based on search term, best matches first"""
+        search_term = self.search_var.get().strip()
+        if search_term and self.server_search:
+            def work(db):
+                return [inventory_row(item) for item in search(db, 'items', search_term)]
+            
+            # A newer search supersedes an older one, but never a refresh of inventory_rows
+            self.db_executor.submit(work, lambda rows: self.inventory_sync.apply((row[0], row) for row in rows),
+                                    lambda e: messagebox.showerror("Error", f"Failed to filter inventory: {e}"),
+                                    key='inventory_search')
+            return
+        # A server search still running must not replace these rows when it finishes
+        self.db_executor.cancel('inventory_search')
+        if search_term:
+            rows = [self.inventory_rows[item_id] for item_id in self.inventory_index.search(search_term)]
+        else:
+            rows = self.inventory_rows.values()
+        self.inventory_sync.apply((row[0], row) for row in rows)
     
     def clear_search(self):
         """Clear search and show all items"""
@@ -1199,9 +1694,11 @@ class RentalManagerApp:
         # Get selected item ID
         item_id = self.inventory_tree.item(selection[0])['values'][0]
         
-        db = SessionLocal()
-        try:
+        def work(db):
             item = db.query(Item).filter(Item.id == item_id).first()
+            return item_snapshot(item) if item else None
+        
+        def show_dialog(item):
             if not item:
                 messagebox.showerror("Error", "Item not found")
                 return
@@ -1215,49 +1712,63 @@ class RentalManagerApp:
             
             # Form fields with current values
             tk.Label(dialog, text="Item Name:").pack(pady=5)
-            name_var = tk.StringVar(value=item.name)
+            name_var = tk.StringVar(value=item['name'])
             tk.Entry(dialog, textvariable=name_var, width=30).pack(pady=5)
             
             tk.Label(dialog, text="Description:").pack(pady=5)
-            desc_var = tk.StringVar(value=item.description or "")
+            desc_var = tk.StringVar(value=item['description'] or "")
             tk.Entry(dialog, textvariable=desc_var, width=30).pack(pady=5)
             
             tk.Label(dialog, text="Total Quantity:").pack(pady=5)
-            qty_var = tk.StringVar(value=str(item.total_quantity))
+            qty_var = tk.StringVar(value=str(item['total_quantity']))
             tk.Spinbox(dialog, from_=0, to=1000, textvariable=qty_var, width=10).pack(pady=5)
             
             tk.Label(dialog, text="Available Quantity:").pack(pady=5)
-            avail_var = tk.StringVar(value=str(item.available_quantity))
+            avail_var = tk.StringVar(value=str(item['available_quantity']))
             tk.Spinbox(dialog, from_=0, to=1000, textvariable=avail_var, width=10).pack(pady=5)
             
             tk.Label(dialog, text="Daily Rate (GHS):").pack(pady=5)
-            rate_var = tk.StringVar(value=str(item.daily_rate))
+            rate_var = tk.StringVar(value=str(item['daily_rate']))
             tk.Entry(dialog, textvariable=rate_var, width=15).pack(pady=5)
             
             def save_changes():
                 try:
-                    # Update item
-                    item.name = name_var.get()
-                    item.description = desc_var.get()
-                    item.total_quantity = int(qty_var.get())
-                    item.available_quantity = int(avail_var.get())
-                    item.daily_rate = float(rate_var.get())
-                    
+                    changes = dict(
+                        name=name_var.get(),
+                        description=desc_var.get(),
+                        total_quantity=int(qty_var.get()),
+                        available_quantity=int(avail_var.get()),
+                        daily_rate=float(rate_var.get())
+                    )
+                except ValueError as e:
+                    messagebox.showerror("Error", f"Failed to update item: {e}")
+                    return
+                
+                def save_work(db):
+                    # Update item, keeping the dashboard unit counters in step
+                    old = db.query(Item).filter(Item.id == item['id']).with_for_update().one()
+                    old_total, old_out = old.total_quantity, old.total_quantity - old.available_quantity
+                    db.query(Item).filter(Item.id == item['id']).update(changes)
+                    # The summary row is locked last, after the item, as checkout does
+                    stats.record_items(
+                        db, 0, changes['total_quantity'] - old_total,
+                        (changes['total_quantity'] - changes['available_quantity']) - old_out
+                    )
                     db.commit()
+                
+                def saved(_):
                     messagebox.showinfo("Success", "Item updated successfully")
                     dialog.destroy()
-                    self.refresh_inventory()
-                    self.load_items()  # Refresh combo box
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to update item: {e}")
+                    self.change_bus.publish(ITEMS, [item['id']])
+                
+                self.db_executor.submit(save_work, saved,
+                                        lambda e: messagebox.showerror("Error", f"Failed to update item: {e}"))
             
             tk.Button(dialog, text="Save Changes", command=save_changes).pack(pady=10)
             tk.Button(dialog, text="Cancel", command=dialog.destroy).pack(pady=5)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load item: {e}")
-        finally:
-            db.close()
+        
+        self.db_executor.submit(work, show_dialog,
+                                lambda e: messagebox.showerror("Error", f"Failed to load item: {e}"))
     
     def delete_selected_item(self):
         """Delete the selected item"""
@@ -1275,8 +1786,7 @@ class RentalManagerApp:
                                      f"Are you sure you want to delete '{item_name}'?\n\nThis will also delete all related rental records!")
         
         if confirm:
-            db = SessionLocal()
-            try:
+            def work(db):
                 # Check if item has active rentals
                 active_rentals = db.query(Rental).filter(
                     Rental.item_id == item_id,
@@ -1284,74 +1794,73 @@ class RentalManagerApp:
                 ).count()
                 
                 if active_rentals > 0:
-                    messagebox.showerror("Error", f"Cannot delete item. It has {active_rentals} active rental(s).\nPlease mark all rentals as returned first.")
-                    return
+                    return active_rentals, []
                 
-                # Delete all rentals for this item first
-                db.query(Rental).filter(Rental.item_id == item_id).delete()
+                # Delete all rentals for this item first, then fix up the orders they belonged to
+                lines = db.query(Rental).filter(Rental.item_id == item_id).all()
+                order_ids = sorted({line.order_id for line in lines if line.order_id is not None})
+                db.query(Rental).filter(Rental.item_id == item_id).delete(synchronize_session=False)
+                
+                deleted_orders, changed_orders = [], []
+                for order in db.query(RentalOrder).filter(RentalOrder.id.in_(order_ids)).all():
+                    if order.lines:
+                        changed_orders.append((order, order.total_amount))
+                        order.refresh_totals()
+                    else:
+                        deleted_orders.append(order)
+                        db.delete(order)
                 
                 # Delete the item
+                total, available = db.query(Item.total_quantity, Item.available_quantity).filter(
+                    Item.id == item_id
+                ).one()
                 db.query(Item).filter(Item.id == item_id).delete()
+                db.flush()
                 
+                # The summary row is locked last, after the rows above, as checkout does
+                stats.record_items(db, -1, -total, -(total - available))
+                stats.record_removed(db, lines, deleted_orders, changed_orders)
                 db.commit()
+                return 0, order_ids
+            
+            def done(result):
+                active_rentals, order_ids = result
+                if active_rentals > 0:
+                    messagebox.showerror("Error", f"Cannot delete item. It has {active_rentals} active rental(s).\nPlease mark all rentals as returned first.")
+                    return
                 messagebox.showinfo("Success", f"Item '{item_name}' deleted successfully")
-                self.refresh_inventory()
-                self.load_items()  # Refresh combo box
-                
-            except Exception as e:
-                db.rollback()
-                messagebox.showerror("Error", f"Failed to delete item: {e}")
-            finally:
-                db.close()
+                self.change_bus.publish(ITEMS, [item_id])
+                self.change_bus.publish(ORDERS, order_ids)
+            
+            self.db_executor.submit(work, done,
+                                    lambda e: messagebox.showerror("Error", f"Failed to delete item: {e}"))
     
-    def refresh_history(self):
-        """Refresh rental history display"""
-        # Clear existing history
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
+    def update_history_rows(self, changes):
+        """Re-read only the changed orders and update them in the history window"""
+        view = self.history_view
+        shown = {int(iid) for iid in view.sync.rows}
+        order_ids = changes.get(ORDERS, set())
         
-        db = SessionLocal()
-        try:
-            # Get all rentals (both active and returned)
-            rentals = db.query(Rental).all()
-            
-            # Group rentals by customer and date
-            rental_groups = {}
-            for rental in rentals:
-                key = f"{rental.customer.name}_{rental.rental_date}_{rental.return_date}"
-                if key not in rental_groups:
-                    rental_groups[key] = {
-                        'id': rental.id,
-                        'customer': rental.customer.name,
-                        'start_date': rental.rental_date,
-                        'return_date': rental.return_date,
-                        'items': [],
-                        'total_amount': 0,
-                        'is_returned': rental.is_returned
-                    }
-                rental_groups[key]['items'].append(f"{rental.item.name} x{rental.quantity}")
-                rental_groups[key]['total_amount'] += rental.total_amount
-            
-            # Sort by start date (newest first)
-            sorted_groups = sorted(rental_groups.values(), key=lambda x: x['start_date'], reverse=True)
-            
-            for group in sorted_groups:
-                items_str = ", ".join(group['items'])
-                status = "Returned" if group['is_returned'] else "Active"
-                self.history_tree.insert('', 'end', values=(
-                    group['id'],
-                    group['customer'],
-                    items_str,
-                    group['start_date'].strftime('%Y-%m-%d'),
-                    group['return_date'].strftime('%Y-%m-%d'),
-                    f"GHS {group['total_amount']:.2f}",
-                    status
-                ))
-        except Exception as e:
-            print(f"History refresh error: {e}")
-        finally:
-            if 'db' in locals():
-                db.close()
+        def work(db):
+            return [(str(order.id), history_row(order), row_key(order, HISTORY_KEY)) for order in changed_orders(
+                db, order_ids, changes.get(CUSTOMERS), changes.get(ITEMS), shown
+            )]
+        
+        def done(rows):
+            view.apply_changes(rows, {str(order_id) for order_id in order_ids} - {row[0] for row in rows})
+        
+        self.db_executor.submit(work, done, lambda e: print(f"History update error: {e}"))
+    
+    def refresh_history(self, *args):
+        """Refresh rental history display, limited to the current search if any"""
+        search_term = self.history_search_var.get().strip()
+        if search_term:
+            self.history_view.show_results(
+                lambda db: [(str(order.id), history_row(order)) for order in search(db, 'orders', search_term)]
+            )
+            return
+        # Re-reads only the loaded window; older pages are fetched as the user scrolls
+        self.history_view.refresh()
     
     def export_history(self):
         """Export rental history to a text file"""
@@ -1364,58 +1873,45 @@ class RentalManagerApp:
                 filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
                 title="Save Rental History"
             )
-            
-            if filename:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write("ALYVON Rental Management System - Rental History\n")
-                    f.write("=" * 60 + "\n\n")
-                    
-                    # Get all rental data
-                    db = SessionLocal()
-                    try:
-                        rentals = db.query(Rental).all()
-                        
-                        # Group rentals
-                        rental_groups = {}
-                        for rental in rentals:
-                            key = f"{rental.customer.name}_{rental.rental_date}_{rental.return_date}"
-                            if key not in rental_groups:
-                                rental_groups[key] = {
-                                    'customer': rental.customer.name,
-                                    'start_date': rental.rental_date,
-                                    'return_date': rental.return_date,
-                                    'items': [],
-                                    'total_amount': 0,
-                                    'is_returned': rental.is_returned
-                                }
-                            rental_groups[key]['items'].append(f"{rental.item.name} x{rental.quantity}")
-                            rental_groups[key]['total_amount'] += rental.total_amount
-                        
-                        # Sort by start date
-                        sorted_groups = sorted(rental_groups.values(), key=lambda x: x['start_date'], reverse=True)
-                        
-                        for i, group in enumerate(sorted_groups, 1):
-                            f.write(f"Rental #{i}\n")
-                            f.write(f"Customer: {group['customer']}\n")
-                            f.write(f"Items: {', '.join(group['items'])}\n")
-                            f.write(f"Start Date: {group['start_date'].strftime('%Y-%m-%d')}\n")
-                            f.write(f"Return Date: {group['return_date'].strftime('%Y-%m-%d')}\n")
-                            f.write(f"Total Amount: GHS {group['total_amount']:.2f}\n")
-                            f.write(f"Status: {'Returned' if group['is_returned'] else 'Active'}\n")
-                            f.write("-" * 40 + "\n\n")
-                        
-                        f.write(f"Total Rentals: {len(sorted_groups)}\n")
-                        f.write(f"Total Revenue: GHS {sum(g['total_amount'] for g in sorted_groups):.2f}\n")
-                        
-                    except Exception as e:
-                        f.write(f"Error loading data: {e}\n")
-                    finally:
-                        db.close()
-                
-                messagebox.showinfo("Success", f"Rental history exported to:\n{filename}")
-                
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export history: {e}")
+            return
+        
+        if not filename:
+            return
+        
+        def work(db):
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write("ALYVON Rental Management System - Rental History\n")
+                f.write("=" * 60 + "\n\n")
+                
+                # Get all rental data
+                try:
+                    # Newest orders first
+                    orders = all_orders(db)
+                    
+                    for order in orders:
+                        items_str = ", ".join(line_label(line) for line in order.lines)
+                        f.write(f"Rental #{order.id}\n")
+                        f.write(f"Customer: {order.customer.name}\n")
+                        f.write(f"Items: {items_str}\n")
+                        f.write(f"Start Date: {order.rental_date.strftime('%Y-%m-%d')}\n")
+                        f.write(f"Return Date: {order.return_date.strftime('%Y-%m-%d')}\n")
+                        f.write(f"Total Amount: GHS {order.total_amount:.2f}\n")
+                        f.write(f"Status: {order.status}\n")
+                        f.write("-" * 40 + "\n\n")
+                    
+                    f.write(f"Total Rentals: {len(orders)}\n")
+                    f.write(f"Total Revenue: GHS {sum(o.total_amount for o in orders):.2f}\n")
+                    
+                except Exception as e:
+                    f.write(f"Error loading data: {e}\n")
+        
+        self.db_executor.submit(
+            work,
+            lambda _: messagebox.showinfo("Success", f"Rental history exported to:\n{filename}"),
+            lambda e: messagebox.showerror("Error", f"Failed to export history: {e}")
+        )
     
     def edit_selected_customer(self):
         """Edit the selected customer"""
@@ -1427,9 +1923,21 @@ class RentalManagerApp:
         # Get selected customer ID
         customer_id = self.customers_tree.item(selection[0])['values'][0]
         
-        db = SessionLocal()
-        try:
+        def work(db):
             customer = db.query(Customer).filter(Customer.id == customer_id).first()
+            if not customer:
+                return None
+            return {
+                'name': customer.name,
+                'phone': customer.phone,
+                'email': customer.email,
+                'address': customer.address,
+                'customer_type': customer.customer_type,
+                'discount_percentage': customer.discount_percentage,
+                'notes': customer.notes
+            }
+        
+        def show_dialog(customer):
             if not customer:
                 messagebox.showerror("Error", "Customer not found")
                 return
@@ -1443,61 +1951,68 @@ class RentalManagerApp:
             
             # Form fields with current values
             tk.Label(dialog, text="Customer Name:").pack(pady=5)
-            name_var = tk.StringVar(value=customer.name)
+            name_var = tk.StringVar(value=customer['name'])
             tk.Entry(dialog, textvariable=name_var, width=40).pack(pady=5)
             
             tk.Label(dialog, text="Phone:").pack(pady=5)
-            phone_var = tk.StringVar(value=customer.phone or "")
+            phone_var = tk.StringVar(value=customer['phone'] or "")
             tk.Entry(dialog, textvariable=phone_var, width=40).pack(pady=5)
             
             tk.Label(dialog, text="Email:").pack(pady=5)
-            email_var = tk.StringVar(value=customer.email or "")
+            email_var = tk.StringVar(value=customer['email'] or "")
             tk.Entry(dialog, textvariable=email_var, width=40).pack(pady=5)
             
             tk.Label(dialog, text="Address:").pack(pady=5)
-            address_var = tk.StringVar(value=customer.address or "")
+            address_var = tk.StringVar(value=customer['address'] or "")
             tk.Entry(dialog, textvariable=address_var, width=40).pack(pady=5)
             
             tk.Label(dialog, text="Customer Type:").pack(pady=5)
-            type_var = tk.StringVar(value=customer.customer_type)
+            type_var = tk.StringVar(value=customer['customer_type'])
             type_combo = ttk.Combobox(dialog, textvariable=type_var, 
                                      values=["Regular", "Reseller", "VIP"], width=37, state='readonly')
             type_combo.pack(pady=5)
             
             tk.Label(dialog, text="Discount Percentage:").pack(pady=5)
-            discount_var = tk.StringVar(value=str(customer.discount_percentage))
+            discount_var = tk.StringVar(value=str(customer['discount_percentage']))
             tk.Entry(dialog, textvariable=discount_var, width=40).pack(pady=5)
             
             tk.Label(dialog, text="Notes:").pack(pady=5)
-            notes_var = tk.StringVar(value=customer.notes or "")
+            notes_var = tk.StringVar(value=customer['notes'] or "")
             tk.Entry(dialog, textvariable=notes_var, width=40).pack(pady=5)
             
             def save_changes():
                 try:
+                    changes = dict(
+                        name=name_var.get(),
+                        phone=phone_var.get(),
+                        email=email_var.get(),
+                        address=address_var.get(),
+                        customer_type=type_var.get(),
+                        discount_percentage=float(discount_var.get()),
+                        notes=notes_var.get()
+                    )
+                except ValueError as e:
+                    messagebox.showerror("Error", f"Failed to update customer: {e}")
+                    return
+                
+                def save_work(db):
                     # Update customer
-                    customer.name = name_var.get()
-                    customer.phone = phone_var.get()
-                    customer.email = email_var.get()
-                    customer.address = address_var.get()
-                    customer.customer_type = type_var.get()
-                    customer.discount_percentage = float(discount_var.get())
-                    customer.notes = notes_var.get()
-                    
+                    db.query(Customer).filter(Customer.id == customer_id).update(changes)
                     db.commit()
+                
+                def saved(_):
                     messagebox.showinfo("Success", "Customer updated successfully")
                     dialog.destroy()
-                    self.refresh_customers()
-                    self.load_customers()  # Refresh combo box
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to update customer: {e}")
+                    self.change_bus.publish(CUSTOMERS, [customer_id])
+                
+                self.db_executor.submit(save_work, saved,
+                                        lambda e: messagebox.showerror("Error", f"Failed to update customer: {e}"))
             
             tk.Button(dialog, text="Save Changes", command=save_changes).pack(pady=10)
             tk.Button(dialog, text="Cancel", command=dialog.destroy).pack(pady=5)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load customer: {e}")
-        finally:
-            db.close()
+        
+        self.db_executor.submit(work, show_dialog,
+                                lambda e: messagebox.showerror("Error", f"Failed to load customer: {e}"))
     
     def delete_selected_customer(self):
         """Delete the selected customer"""
@@ -1515,8 +2030,7 @@ class RentalManagerApp:
                                      f"Are you sure you want to delete customer '{customer_name}'?\n\nThis will also delete all related rental records!")
         
         if confirm:
-            db = SessionLocal()
-            try:
+            def work(db):
                 # Check if customer has active rentals
                 active_rentals = db.query(Rental).filter(
                     Rental.customer_id == customer_id,
@@ -1524,117 +2038,137 @@ class RentalManagerApp:
                 ).count()
                 
                 if active_rentals > 0:
-                    messagebox.showerror("Error", f"Cannot delete customer. They have {active_rentals} active rental(s).\nPlease mark all rentals as returned first.")
-                    return
+                    return active_rentals
+                
+                lines = db.query(Rental).filter(Rental.customer_id == customer_id).all()
+                orders = db.query(RentalOrder).filter(RentalOrder.customer_id == customer_id).all()
                 
-                # Delete all rentals for this customer first
-                db.query(Rental).filter(Rental.customer_id == customer_id).delete()
+                # Delete all rentals and orders for this customer first
+                db.query(Rental).filter(Rental.customer_id == customer_id).delete(synchronize_session=False)
+                db.query(RentalOrder).filter(RentalOrder.customer_id == customer_id).delete(synchronize_session=False)
                 
                 # Delete the customer
                 db.query(Customer).filter(Customer.id == customer_id).delete()
                 
+                # Take the customer's rentals and orders out of the dashboard counters;
+                # the summary row is locked last, after the rows above, as checkout does
+                stats.record_customers(db, -1)
+                stats.record_removed(db, lines, orders)
                 db.commit()
-                messagebox.showinfo("Success", f"Customer '{customer_name}' deleted successfully")
-                self.refresh_customers()
-                self.load_customers()  # Refresh combo box
-                
-            except Exception as e:
-                db.rollback()
-                messagebox.showerror("Error", f"Failed to delete customer: {e}")
-            finally:
-                db.close()
-
-    def generate_receipt(self, rental_id, customer, rental_items, start_date, return_date, days, discount, total_amount):
-        """Generate PDF receipt for a rental"""
-        if not RECEIPT_AVAILABLE:
-            return None
-        
-        try:
-            generator = ReceiptGenerator(
-                company_name=COMPANY_NAME,
-                company_phone=COMPANY_PHONE,
-                company_email=COMPANY_EMAIL,
-                company_address=COMPANY_ADDRESS
-            )
-            
-            # Prepare items data
-            items_data = []
-            subtotal = 0
-            for rental_item in rental_items:
-                item = rental_item['item']
-                quantity = rental_item['quantity']
-                item_subtotal = item.daily_rate * quantity * days
-                subtotal += item_subtotal
-                
-                items_data.append({
-                    'name': item.name,
-                    'quantity': quantity,
-                    'daily_rate': item.daily_rate,
-                    'days': days,
-                    'subtotal': item_subtotal
-                })
-            
-            discount_amount = subtotal * (discount / 100)
-            
-            rental_data = {
-                'rental_id': rental_id,
-                'customer_name': customer.name,
-                'customer_phone': customer.phone or '',
-                'customer_address': customer.address or '',
-                'rental_date': start_date.strftime('%B %d, %Y') if isinstance(start_date, date) else str(start_date),
-                'return_date': return_date.strftime('%B %d, %Y') if isinstance(return_date, date) else str(return_date),
-                'items': items_data,
-                'subtotal': subtotal,
-                'discount_percent': discount,
-                'discount_amount': discount_amount,
-                'total_amount': total_amount,
-                'currency': 'GHS'
-            }
-            
-            receipt_path = generator.generate_receipt(rental_data)
-            return receipt_path
-        except Exception as e:
-            print(f"Receipt generation error: {e}")
-            return None
-    
-    def send_receipt_sms(self, phone_number, customer_name, rental_id, total_amount, return_date, receipt_path=None):
-        """Send receipt notification via SMS"""
-        if not RECEIPT_AVAILABLE:
-            return {'success': False, 'message': 'SMS module not available'}
-        
-        try:
-            # Configure SMS sender
-            sms_config = get_sms_config()
-            sender = SMSSender()
-            sender.gateway = sms_config['gateway']
-            sender.api_key = sms_config['api_key']
-            sender.api_secret = sms_config['api_secret']
-            sender.sender_id = sms_config['sender_id']
-            
-            if sender.gateway == 'disabled':
-                return {'success': False, 'message': 'SMS is disabled. Configure SMS gateway in sms_config.py'}
+                return 0
             
-            # Send SMS
-            result = sender.send_receipt_notification(
-                phone_number=phone_number,
-                customer_name=customer_name,
-                rental_id=str(rental_id),
-                total_amount=float(total_amount),
-                return_date=return_date,
-                currency='GHS'
-            )
+            def done(active_rentals):
+                if active_rentals > 0:
+                    messagebox.showerror("Error", f"Cannot delete customer. They have {active_rentals} active rental(s).\nPlease mark all rentals as returned first.")
+                    return
+                messagebox.showinfo("Success", f"Customer '{customer_name}' deleted successfully")
+                self.change_bus.publish(CUSTOMERS, [customer_id])
+                self.change_bus.publish(ORDERS)
             
-            return result
-        except Exception as e:
-            return {'success': False, 'message': f'Error sending SMS: {str(e)}'}
+            self.db_executor.submit(work, done,
+                                    lambda e: messagebox.showerror("Error", f"Failed to delete customer: {e}"))
 
     def export_web_feeds_button(self):
         """Export JSON feeds and copy logo for the website (dashboard button)."""
-        try:
-            export_web_json_feeds()
-            messagebox.showinfo("Export Complete", "Website feeds exported to web/data/ and logo copied.")
-        except Exception as e:
-            messagebox.showerror("Export Failed", f"Could not export web feeds: {e}")
+        self.db_executor.submit(
+            write_web_json_feeds,
+            lambda _: messagebox.showinfo("Export Complete", "Website feeds exported to web/data/ and logo copied."),
+            lambda e: messagebox.showerror("Export Failed", f"Could not export web feeds: {e}")
+        )
+    
+    def export_web_feeds(self):
+        """Re-export the website feeds in the background after a change"""
+        # Non-blocking: don't bother the user if the export fails
+        self.db_executor.submit(write_web_json_feeds, None,
+                                lambda e: print(f"Web feed export error: {e}"),
+                                key='export_web_feeds')
+
+def inventory_row(item):
+    """Inventory tree values for an Item"""
+    return (
+        item.id,
+        item.name,
+        item.description,
+        item.total_quantity,
+        item.available_quantity,
+        f"GHS {item.daily_rate:.2f}"
+    )
+
+def customer_row(customer):
+    """Customers tree values for a Customer"""
+    return (
+        customer.id,
+        customer.name,
+        customer.customer_type,
+        customer.phone or "",
+        customer.email or "",
+        customer.address or "",
+        f"{customer.discount_percentage}%",
+        customer.created_at.strftime('%Y-%m-%d')
+    )
+
+def inventory_search_fields(row):
+    """Searchable text of an inventory tree row"""
+    return {'name': row[1], 'description': row[2]}
+
+def line_label(line):
+    """'Chair x5' for a rental line, with the units already back if only some are"""
+    label = f"{line.item.name} x{line.quantity}"
+    if line.returned_quantity and not line.is_returned:
+        label += f" ({line.returned_quantity} returned)"
+    return label
+
+def order_row(order):
+    """Rentals tree values for a RentalOrder"""
+    return (
+        order.id,
+        order.customer.name,
+        ", ".join(line_label(line) for line in order.lines),
+        order.rental_date.strftime('%Y-%m-%d'),
+        order.return_date.strftime('%Y-%m-%d'),
+        f"GHS {order.total_amount:.2f}"
+    )
+
+def history_row(order):
+    """History tree values for a RentalOrder"""
+    return order_row(order) + (order.status,)
+
+def fetch_history_page(db, after, limit, backward, inclusive=False):
+    """One page of history tree rows (both active and returned orders), newest first"""
+    page = history_page(db, after=after, limit=limit, backward=backward, inclusive=inclusive)
+    page.items = [(str(order.id), history_row(order)) for order in page.items]
+    return page
+
+def item_snapshot(item):
+    """Plain-data copy of an Item that can safely outlive its session"""
+    return {
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'total_quantity': item.total_quantity,
+        'available_quantity': item.available_quantity,
+        'daily_rate': item.daily_rate
+    }
+
+def customer_snapshot(customer):
+    """Plain-data copy of a Customer that can safely outlive its session"""
+    return {
+        'id': customer.id,
+        'name': customer.name,
+        'phone': customer.phone,
+        'address': customer.address,
+        'customer_type': customer.customer_type,
+        'discount_percentage': customer.discount_percentage
+    }
+
+def heatmap_color(free, total):
+    """Heatmap fill for an item with free of total units free on a day"""
+    share = free / total if total > 0 else 0.0
+    fill = HEATMAP_COLORS[0][1]
+    for threshold, color in HEATMAP_COLORS:
+        if share >= threshold:
+            fill = color
+    return fill
 
 def main():
     """Main function to run the application"""
@@ -1642,6 +2176,24 @@ def main():
     app = RentalManagerApp(root)
     root.mainloop()
 
+def measure_startup():
+    """Print the time to the first interactive frame and until the first tab's data is shown"""
+    start = time.perf_counter()
+    root = tk.Tk()
+    app = RentalManagerApp(root)
+    constructed = time.perf_counter()
+    # Draws the window; from here on it responds to input
+    root.update()
+    first_frame = time.perf_counter()
+    while app.db_executor.busy or app.refresh_scheduler.pending:
+        root.update()
+        time.sleep(0.005)
+    loaded = time.perf_counter()
+    print(f"constructor:         {(constructed - start) * 1000:.0f} ms")
+    print(f"first frame:         {(first_frame - start) * 1000:.0f} ms")
+    print(f"first tab loaded:    {(loaded - start) * 1000:.0f} ms")
+    app.on_close()
+
 # ---- Web JSON feeds (read-only site support) ----
 def ensure_web_paths():
     try:
@@ -1649,70 +2201,54 @@ def ensure_web_paths():
     except Exception:
         pass
 
+def order_payload(order, lines):
+    return {
+        'customer': order.customer.name,
+        'start_date': order.rental_date.isoformat() if order.rental_date else None,
+        'return_date': order.return_date.isoformat() if order.return_date else None,
+        'items': [line_label(line) for line in lines],
+        'total_amount': sum(float(line.total_amount or 0) for line in lines)
+    }
+
 def build_active_rentals_payload(db):
-    rentals = db.query(Rental).filter(Rental.is_returned == False).all()
-    groups = {}
-    for r in rentals:
-        key = f"{r.customer.name}_{r.rental_date}_{r.return_date}"
-        if key not in groups:
-            groups[key] = {
-                'customer': r.customer.name,
-                'start_date': r.rental_date.isoformat() if r.rental_date else None,
-                'return_date': r.return_date.isoformat() if r.return_date else None,
-                'items': [],
-                'total_amount': 0
-            }
-        groups[key]['items'].append(f"{r.item.name} x{r.quantity}")
-        groups[key]['total_amount'] += float(r.total_amount or 0)
-    return list(groups.values())
+    # Only the lines still out, as the feed has always listed them
+    return [order_payload(o, [line for line in o.lines if not line.is_returned]) for o in active_orders(db)]
 
 def build_history_payload(db):
-    rentals = db.query(Rental).all()
-    groups = {}
-    for r in rentals:
-        key = f"{r.customer.name}_{r.rental_date}_{r.return_date}"
-        if key not in groups:
-            groups[key] = {
-                'customer': r.customer.name,
-                'start_date': r.rental_date.isoformat() if r.rental_date else None,
-                'return_date': r.return_date.isoformat() if r.return_date else None,
-                'items': [],
-                'total_amount': 0,
-                'is_returned': bool(r.is_returned)
-            }
-        groups[key]['items'].append(f"{r.item.name} x{r.quantity}")
-        groups[key]['total_amount'] += float(r.total_amount or 0)
-        # If any rental in the group is active, keep as active; only mark returned if all are returned
-        groups[key]['is_returned'] = groups[key]['is_returned'] and bool(r.is_returned)
-    return list(groups.values())
-
-def export_web_json_feeds():
-    try:
-        ensure_web_paths()
-        db = SessionLocal()
-        active_payload = build_active_rentals_payload(db)
-        history_payload = build_history_payload(db)
-        with open(os.path.join('web','data','active_rentals.json'), 'w', encoding='utf-8') as f:
-            json.dump(active_payload, f, ensure_ascii=False)
-        with open(os.path.join('web','data','rental_history.json'), 'w', encoding='utf-8') as f:
-            json.dump(history_payload, f, ensure_ascii=False)
-        # Copy logo for web branding if present
-        for candidate in ["ALYVON logo.png", "ALYVON logo.jpg", "ALYVON logo.jpeg"]:
-            if os.path.exists(candidate):
-                try:
-                    shutil.copyfile(candidate, os.path.join('web','logo.png'))
-                    break
-                except Exception as _e:
-                    pass
-    except Exception as e:
-        # Non-blocking: don't crash app if export fails
-        print(f"Web feed export error: {e}")
-    finally:
-        try:
-            db.close()
-        except Exception:
-            pass
+    orders = all_orders(db)
+    payload = []
+    for o in orders:
+        entry = order_payload(o, o.lines)
+        # An order only counts as returned once all of its items are back
+        entry['is_returned'] = o.status == "Returned"
+        payload.append(entry)
+    return payload
 
+def write_web_json_feeds(db):
+    """Write the website JSON feeds using the given session"""
+    ensure_web_paths()
+    active_payload = build_active_rentals_payload(db)
+    history_payload = build_history_payload(db)
+    with open(os.path.join('web','data','active_rentals.json'), 'w', encoding='utf-8') as f:
+        json.dump(active_payload, f, ensure_ascii=False)
+    with open(os.path.join('web','data','rental_history.json'), 'w', encoding='utf-8') as f:
+        json.dump(history_payload, f, ensure_ascii=False)
+    start_date = datetime.now().date()
+    availability_payload = calendar_payload(*catalog_calendar(db, start_date), start_date)
+    with open(os.path.join('web','data','availability.json'), 'w', encoding='utf-8') as f:
+        json.dump(availability_payload, f, ensure_ascii=False)
+    # Copy logo for web branding if present
+    for candidate in ["ALYVON logo.png", "ALYVON logo.jpg", "ALYVON logo.jpeg"]:
+        if os.path.exists(candidate):
+            try:
+                shutil.copyfile(candidate, os.path.join('web','logo.png'))
+                break
+            except Exception as _e:
+                pass
 
 if __name__ == "__main__":
-    main()
+    # python rental_manager_improved.py --startup-benchmark -> time startup instead of running
+    if "--startup-benchmark" in sys.argv:
+        measure_startup()
+    else:
+        main()
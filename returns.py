@@ -0,0 +1,112 @@
+"""
+Returning rented units, whole orders or a few units of a line at a time.
+
+return_lines() handles any number of lines in a fixed number of statements:
+
+1. one UPDATE ... RETURNING over all the lines, which locks them (in id
+   order), adds the units to returned_quantity and marks each line returned
+   once all its units are back
+2. one UPDATE of items putting the units back in stock, summed per item and
+   applied with the item rows locked in id order, as checkout.py does (lines
+   returned before their rental started never left stock and are skipped)
+3. one UPDATE marking the orders whose lines are now all back "Returned"
+
+A line stays open (is_returned false) until its last unit is back, so its
+amount only counts as earned revenue then; the units already back are free
+for new bookings straight away.
+
+Benchmark: python benchmarks.py returns [--lines N]
+"""
+from collections import namedtuple, defaultdict
+from sqlalchemy import text
+from database import Item, Rental
+import stats
+
+# A line some units were just returned on; units is how many
+ReturnedLine = namedtuple('ReturnedLine', 'id order_id item_id quantity return_date total_amount is_returned '
+                                           'is_started units')
+
+_RETURN_LINES = text("""
+    WITH requested AS (
+        SELECT * FROM unnest(CAST(:ids AS integer[]), CAST(:units AS integer[])) AS requested (id, units)
+    ), locked AS (
+        SELECT r.id, r.returned_quantity,
+               LEAST(COALESCE(requested.units, r.quantity), r.quantity - r.returned_quantity) AS units
+        FROM rentals AS r JOIN requested ON requested.id = r.id
+        WHERE r.is_returned = false
+        ORDER BY r.id
+        FOR UPDATE OF r
+    )
+    UPDATE rentals AS r
+    SET returned_quantity = locked.returned_quantity + locked.units,
+        is_returned = locked.returned_quantity + locked.units >= r.quantity
+    FROM locked
+    WHERE r.id = locked.id AND locked.units > 0
+    RETURNING r.id, r.order_id, r.item_id, r.quantity, r.return_date, r.total_amount, r.is_returned,
+              r.is_started, locked.units
+""")
+
+_RESTOCK = text("""
+    UPDATE items
+    SET available_quantity = items.available_quantity + back.units
+    FROM (SELECT id FROM items WHERE id = ANY(CAST(:ids AS integer[])) ORDER BY id FOR UPDATE) AS locked,
+         unnest(CAST(:ids AS integer[]), CAST(:units AS integer[])) AS back (id, units)
+    WHERE items.id = locked.id AND back.id = items.id
+""")
+
+_CLOSE_ORDERS = text("""
+    UPDATE rental_orders SET status = 'Returned'
+    WHERE id = ANY(CAST(:ids AS integer[])) AND status <> 'Returned'
+      AND NOT EXISTS (SELECT 1 FROM rentals WHERE rentals.order_id = rental_orders.id AND rentals.is_returned = false)
+    RETURNING id
+""")
+
+
+def return_lines(db, units_by_line):
+    """
+    Return units_by_line ({rental line id: units, or None for all units
+    still out}) and commit. Lines already returned are skipped and units
+    beyond those still out are ignored. Returns ([ReturnedLine], ids of
+    the orders this completed).
+    """
+    if any(units is not None and units <= 0 for units in units_by_line.values()):
+        raise ValueError("Units to return must be greater than 0")
+    if not units_by_line:
+        return [], []
+    try:
+        lines = [ReturnedLine(*row) for row in db.execute(_RETURN_LINES, {
+            'ids': list(units_by_line),
+            'units': list(units_by_line.values()),
+        })]
+
+        restock = defaultdict(int)
+        for line in lines:
+            if line.is_started:
+                restock[line.item_id] += line.units
+        if restock:
+            db.execute(_RESTOCK, {'ids': list(restock), 'units': list(restock.values())})
+
+        closed = [row[0] for row in db.execute(_CLOSE_ORDERS, {'ids': sorted({line.order_id for line in lines})})]
+        stats.record_return(db, [line for line in lines if line.is_returned], sum(restock.values()))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return lines, closed
+
+
+def return_orders(db, order_ids):
+    """Return every unit still out on the given orders; see return_lines()"""
+    line_ids = [row.id for row in db.query(Rental.id).filter(
+        Rental.order_id.in_(order_ids), Rental.is_returned == False
+    )]
+    return return_lines(db, dict.fromkeys(line_ids))
+
+
+def outstanding_lines(db, order_id):
+    """(line id, item name, quantity, units still out) for each open line of an order"""
+    return [tuple(row) for row in db.query(
+        Rental.id, Item.name, Rental.quantity, Rental.quantity - Rental.returned_quantity
+    ).join(Item, Item.id == Rental.item_id).filter(
+        Rental.order_id == order_id, Rental.is_returned == False
+    ).order_by(Rental.id)]
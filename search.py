@@ -0,0 +1,135 @@
+"""
+Ranked search over items, customers and rental orders.
+
+search(db, kind, term) is the one entry point the GUI tabs use. When the
+pg_trgm extension is installed (see migration 5) matching and ranking run in
+Postgres on trigram GIN indexes and only the top `limit` rows are returned.
+Without it, rows are narrowed down with plain ILIKE, at most
+FALLBACK_CANDIDATES of them (those whose main field starts with the term
+first) are loaded, and those are ranked in process by
+search_index.SearchIndex.
+"""
+from sqlalchemy import and_, or_, func, select, text
+from sqlalchemy.orm import contains_eager, selectinload
+from database import Item, Customer, Rental, RentalOrder
+from search_index import SearchIndex, tokenize
+
+# Most rows a search returns
+SEARCH_LIMIT = 200
+
+# Without pg_trgm: most ILIKE matches loaded and ranked in process, per row returned
+FALLBACK_CANDIDATES = 5
+
+# Database URL -> whether pg_trgm is installed there
+_trigram_available = {}
+
+
+class SearchSpec:
+    """How to search one kind of record"""
+    def __init__(self, query, match, rank, order, fields, texts, primary):
+        self.query = query      # query(db) -> base ORM query
+        self.match = match      # match(pattern) -> filter for one ILIKE pattern
+        self.rank = rank        # rank(term) -> trigram similarity expression
+        self.primary = primary  # Main text column; prefix matches on it are loaded first without pg_trgm
+        self.order = order      # Tie-breaking ORDER BY columns
+        self.fields = fields    # Field names for the in-process index
+        self.texts = texts      # texts(row) -> {field: text} for the in-process index
+
+
+def _like(column, pattern):
+    return column.ilike(pattern, escape='\\')
+
+
+def _order_item_rank(term):
+    """Best similarity between term and the names of an order's items"""
+    return select(func.max(func.word_similarity(term, Item.name))).join(
+        Rental, Rental.item_id == Item.id
+    ).where(Rental.order_id == RentalOrder.id).correlate(RentalOrder).scalar_subquery()
+
+
+SEARCHES = {
+    'items': SearchSpec(
+        query=lambda db: db.query(Item),
+        match=lambda p: or_(_like(Item.name, p), _like(Item.description, p)),
+        rank=lambda term: func.greatest(
+            func.word_similarity(term, Item.name),
+            func.word_similarity(term, func.coalesce(Item.description, '')) * 0.5
+        ),
+        order=(Item.name, Item.id),
+        fields=('name', 'description'),
+        texts=lambda item: {'name': item.name, 'description': item.description},
+        primary=Item.name,
+    ),
+    'customers': SearchSpec(
+        query=lambda db: db.query(Customer),
+        match=lambda p: or_(_like(Customer.name, p), _like(Customer.phone, p)),
+        rank=lambda term: func.greatest(
+            func.word_similarity(term, Customer.name),
+            func.word_similarity(term, func.coalesce(Customer.phone, ''))
+        ),
+        order=(Customer.name, Customer.id),
+        fields=('name', 'phone'),
+        texts=lambda customer: {'name': customer.name, 'phone': customer.phone},
+        primary=Customer.name,
+    ),
+    'orders': SearchSpec(
+        query=lambda db: db.query(RentalOrder).join(RentalOrder.customer).options(
+            contains_eager(RentalOrder.customer),
+            selectinload(RentalOrder.lines).joinedload(Rental.item)
+        ),
+        match=lambda p: or_(_like(Customer.name, p),
+                            RentalOrder.lines.any(Rental.item.has(_like(Item.name, p)))),
+        rank=lambda term: func.greatest(
+            func.word_similarity(term, Customer.name),
+            func.coalesce(_order_item_rank(term), 0)
+        ),
+        order=(RentalOrder.rental_date.desc(), RentalOrder.id.desc()),
+        fields=('customer', 'items'),
+        texts=lambda order: {'customer': order.customer.name,
+                             'items': " ".join(line.item.name for line in order.lines)},
+        primary=Customer.name,
+    ),
+}
+
+
+def trigram_available(db):
+    """Whether pg_trgm is installed in the session's database (checked once per database)"""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _trigram_available:
+        _trigram_available[key] = bind.dialect.name == 'postgresql' and db.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+    return _trigram_available[key]
+
+
+def search(db, kind, term, limit=SEARCH_LIMIT):
+    """
+    Up to limit records of the given kind ('items', 'customers' or 'orders')
+    matching every word of term, best match first.
+    """
+    words = tokenize(term)
+    if not words:
+        return []
+    spec = SEARCHES[kind]
+    query = spec.query(db).filter(and_(*(spec.match(_pattern(word)) for word in words)))
+
+    if trigram_available(db):
+        return query.order_by(spec.rank(term).desc(), *spec.order).limit(limit).all()
+
+    prefix = _like(spec.primary, _escape(term.strip()) + "%")
+    rows = query.order_by(prefix.desc(), *spec.order).limit(limit * FALLBACK_CANDIDATES).all()
+    index = SearchIndex(spec.fields)
+    index.rebuild((row.id, spec.texts(row)) for row in rows)
+    by_id = {row.id: row for row in rows}
+    return [by_id[row_id] for row_id in index.search(term, limit)]
+
+
+def _escape(text):
+    """text with LIKE wildcards escaped"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _pattern(word):
+    """ILIKE pattern matching word anywhere, with LIKE wildcards escaped"""
+    return "%" + _escape(word) + "%"
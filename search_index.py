@@ -0,0 +1,198 @@
+"""
+In-memory search for the rental management GUI.
+
+SearchIndex keeps per-field token postings and a trigram index over the
+vocabulary of a few text fields per record, so "type to filter" lookups
+never go to the database. Queries match like the old substring filter
+(every query word must occur in one of the fields) and results are ranked:
+whole-word matches beat prefixes, which beat substrings, and matches in
+earlier fields (e.g. the name) beat later ones (e.g. the description).
+
+Benchmark: python benchmarks.py search_index [--items N]
+"""
+import re
+from bisect import bisect_left, insort
+from itertools import islice, product
+
+_WORD = re.compile(r"\w+")
+
+# Score for a query word matching a field word exactly / as a prefix / anywhere inside
+EXACT, PREFIX, SUBSTRING = 4, 2, 1
+
+
+def tokenize(text):
+    """Lowercase word tokens of a string"""
+    return _WORD.findall((text or "").lower())
+
+
+def trigrams(word):
+    """The set of three-character substrings of a word"""
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class SearchIndex:
+    """Token and n-gram index over the text fields of a set of records"""
+    def __init__(self, fields, weights=None):
+        self.fields = tuple(fields)
+        # Earlier fields weigh more unless weights are given
+        self.weights = tuple(weights or range(len(self.fields), 0, -1))
+        self._docs = {}                                   # id -> token tuple per field
+        self._postings = [{} for _ in self.fields]        # per field: token -> set of ids
+        self._vocab = {}                                  # token -> number of records using it
+        self._sorted_vocab = None                         # sorted tokens for prefix lookups
+        self._grams = {}                                  # trigram -> set of vocabulary tokens
+        self._tiers = {}                                  # query word -> cached score tiers
+        self._matched = {}                                # query word -> cached ids matching it at all
+
+    def __len__(self):
+        return len(self._docs)
+
+    def rebuild(self, records):
+        """Replace the index contents with an iterable of (id, {field: text}) pairs"""
+        self.__init__(self.fields, self.weights)
+        for doc_id, record in records:
+            self.upsert(doc_id, record)
+        self._sorted_vocab = sorted(self._vocab)
+
+    def upsert(self, doc_id, record):
+        """Add a record, or re-index it after an edit"""
+        if doc_id in self._docs:
+            self.remove(doc_id)
+        tokens = tuple(tuple(set(tokenize(record.get(field)))) for field in self.fields)
+        self._docs[doc_id] = tokens
+        for postings, field_tokens in zip(self._postings, tokens):
+            for token in field_tokens:
+                postings.setdefault(token, set()).add(doc_id)
+        for token in {token for field_tokens in tokens for token in field_tokens}:
+            if token not in self._vocab:
+                self._vocab[token] = 0
+                if self._sorted_vocab is not None:
+                    insort(self._sorted_vocab, token)
+                for gram in trigrams(token):
+                    self._grams.setdefault(gram, set()).add(token)
+            self._vocab[token] += 1
+        self._tiers = {}
+        self._matched = {}
+
+    def remove(self, doc_id):
+        """Drop a record from the index"""
+        tokens = self._docs.pop(doc_id, None)
+        if tokens is None:
+            return
+        for postings, field_tokens in zip(self._postings, tokens):
+            for token in field_tokens:
+                ids = postings[token]
+                ids.discard(doc_id)
+                if not ids:
+                    del postings[token]
+        for token in {token for field_tokens in tokens for token in field_tokens}:
+            self._vocab[token] -= 1
+            if not self._vocab[token]:
+                del self._vocab[token]
+                if self._sorted_vocab is not None:
+                    del self._sorted_vocab[bisect_left(self._sorted_vocab, token)]
+                for gram in trigrams(token):
+                    self._grams[gram].discard(token)
+                    if not self._grams[gram]:
+                        del self._grams[gram]
+        self._tiers = {}
+        self._matched = {}
+
+    def search(self, query, limit=None):
+        """Ids of the records matching every word of query, best match first"""
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        word_tiers = [self._word_tiers(word) for word in words]
+        if len(word_tiers) == 1:
+            candidates = None
+        else:
+            # Records matching every word at all
+            matched = sorted((self._all_matches(word) for word in words), key=len)
+            candidates = matched[0].intersection(*matched[1:])
+            if not candidates:
+                return []
+
+        # Walk the combinations of per-word score tiers from the best total
+        # down; a record is placed by the first (best) combination it is in
+        results = []
+        seen = set()
+        combos = product(*word_tiers)
+        for _, combo in sorted(((sum(score for score, _ in combo), combo) for combo in combos),
+                               key=lambda scored: -scored[0]):
+            sets = [ids for _, ids in combo]
+            if candidates is not None:
+                sets.append(candidates)
+            sets.sort(key=len)
+            ids = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+            if seen:
+                ids = ids - seen
+            if not ids:
+                continue
+            need = limit - len(results) if limit else len(ids)
+            results.extend(sorted(ids) if len(ids) <= 1000 else islice(ids, need))
+            if limit and len(results) >= limit:
+                return results[:limit]
+            seen = seen | ids
+        return results
+
+    def _all_matches(self, word):
+        """Ids of the records matching one query word with any score"""
+        ids = self._matched.get(word)
+        if ids is None:
+            ids = self._matched[word] = set().union(*(ids for _, ids in self._word_tiers(word)))
+        return ids
+
+    def _word_tiers(self, word):
+        """[(score, ids)] for one query word, best score first"""
+        tiers = self._tiers.get(word)
+        if tiers is not None:
+            return tiers
+
+        matches = {}
+        if self._sorted_vocab is None:
+            self._sorted_vocab = sorted(self._vocab)
+        index = bisect_left(self._sorted_vocab, word)
+        while index < len(self._sorted_vocab) and self._sorted_vocab[index].startswith(word):
+            token = self._sorted_vocab[index]
+            matches[token] = EXACT if token == word else PREFIX
+            index += 1
+        if len(word) >= 3:
+            grams = sorted(trigrams(word), key=lambda gram: len(self._grams.get(gram, ())))
+            tokens = self._grams.get(grams[0], set()).intersection(*(self._grams.get(g, ()) for g in grams[1:]))
+            for token in tokens:
+                if token not in matches and word in token:
+                    matches[token] = SUBSTRING
+
+        by_score = {}
+        for token, match in matches.items():
+            for weight, postings in zip(self.weights, self._postings):
+                ids = postings.get(token)
+                if ids:
+                    by_score.setdefault(match * weight, []).append(ids)
+        # Single posting sets are used as they are; the cache is dropped on any change
+        tiers = [(score, sets[0] if len(sets) == 1 else set().union(*sets))
+                 for score, sets in sorted(by_score.items(), reverse=True)]
+        if len(self._tiers) > 256:
+            self._tiers = {}
+            self._matched = {}
+        self._tiers[word] = tiers
+        return tiers
+
+
+class Debouncer:
+    """Calls callback once input has been quiet for delay_ms (Tk after-based)"""
+    def __init__(self, widget, delay_ms, callback):
+        self.widget = widget
+        self.delay_ms = delay_ms
+        self.callback = callback
+        self._pending = None
+
+    def __call__(self, *args):
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+        self._pending = self.widget.after(self.delay_ms, self._fire)
+
+    def _fire(self):
+        self._pending = None
+        self.callback()
@@ -2,9 +2,24 @@
 SMS Sender for ALYVON Rental Management System
 Supports multiple SMS gateway providers
 """
-import requests
 import os
 from typing import Optional, Dict
+from lazy_imports import lazy_import
+
+# Only the HTTP gateways need requests; import it on the first send
+requests = lazy_import('requests')
+
+# Twilio clients by (account SID, auth token), reused across sends
+_twilio_clients = {}
+
+def get_twilio_client(account_sid: str, auth_token: str):
+    """Create the Twilio client for these credentials once and reuse it"""
+    key = (account_sid, auth_token)
+    client = _twilio_clients.get(key)
+    if client is None:
+        from twilio.rest import Client
+        client = _twilio_clients[key] = Client(account_sid, auth_token)
+    return client
 
 class SMSSender:
     def __init__(self):
@@ -71,8 +86,7 @@ class SMSSender:
         twilio_phone = self.sender_id  # Your Twilio phone number
         
         try:
-            from twilio.rest import Client
-            client = Client(account_sid, auth_token)
+            client = get_twilio_client(account_sid, auth_token)
             
             message_obj = client.messages.create(
                 body=message,
@@ -0,0 +1,80 @@
+"""
+Import-time startup benchmark for the rental management GUI.
+
+Runs `python -X importtime -c "import rental_manager_improved"` in fresh
+interpreters, then prints the median total import time, the slowest
+top-level imports and whether any of the heavy optional dependencies
+(reportlab, twilio, requests, PIL) were imported at startup. They should
+not be; see lazy_imports.py.
+
+Usage: python startup_benchmark.py [--runs N] [--top N] [--module NAME]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Imported lazily by the app, so they should never show up at startup
+HEAVY_MODULES = ("reportlab", "twilio", "requests", "PIL")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module):
+    """[(name, self_us, cumulative_us, depth)] from one -X importtime run of `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def direct_imports(entries, module):
+    """[(name, cumulative_us)] for the modules imported directly by module"""
+    # -X importtime prints a module's imports just before the module itself
+    children = []
+    for name, _, cumulative_us, depth in entries:
+        if depth == 0:
+            if name == module:
+                return children
+            children = []
+        elif depth == 1:
+            children.append((name, cumulative_us))
+    return []
+
+
+def run(module="rental_manager_improved", runs=5, top=15):
+    totals = []
+    for _ in range(runs):
+        entries = import_times(module)
+        totals.append(sum(self_us for _, self_us, _, _ in entries))
+
+    print(f"import {module}: median {statistics.median(totals) / 1000:.0f} ms over {runs} runs "
+          f"(min {min(totals) / 1000:.0f} ms, max {max(totals) / 1000:.0f} ms)")
+
+    print(f"\nSlowest imports made by {module} (last run):")
+    for name, cumulative_us in sorted(direct_imports(entries, module), key=lambda e: e[1], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    loaded = sorted({name.split(".")[0] for name, _, _, _ in entries} & set(HEAVY_MODULES))
+    print(f"\nHeavy optional modules imported at startup: {', '.join(loaded) if loaded else 'none'}")
+    return not loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--module", default="rental_manager_improved")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.module, args.runs, args.top) else 1)
@@ -0,0 +1,227 @@
+"""
+Incrementally maintained dashboard counters.
+
+stats_summary holds one row of running totals and daily_stats one row per
+day of orders booked and rental lines due back. Every GUI mutation adjusts
+them with the record_* functions below in the same transaction as its own
+changes, so the dashboard reads a few small rows however long the rental
+history grows. Every mutation records its stats as the last statements
+before commit (after flushing its own changes), so the single summary row
+is always locked after the item, order and customer rows and concurrent
+mutations cannot deadlock on it.
+
+reconcile() recomputes both from the raw tables, reports any drift and
+rewrites them:
+
+    python stats.py --reconcile [--dry-run]
+"""
+import argparse
+import sys
+from collections import defaultdict
+from sqlalchemy import select, func, text
+from database import SessionLocal, Item, Customer, Rental, RentalOrder
+
+SUMMARY_FIELDS = ('total_items', 'total_units', 'units_out', 'total_customers', 'active_rentals', 'total_revenue')
+DAILY_FIELDS = ('orders', 'booked_revenue', 'open_lines')
+
+# Money is stored as floats; smaller differences than this are not drift
+TOLERANCE = 0.005
+
+
+def apply(db, summary=None, days=None):
+    """
+    Add deltas to the counters: summary is {field: delta} and days is
+    {date: {field: delta}}. The summary row is always updated first, so
+    concurrent writers (and reconcile) take its row lock in the same order.
+    """
+    summary = {field: delta for field, delta in (summary or {}).items() if delta}
+    unknown = (set(summary) - set(SUMMARY_FIELDS)) | {f for d in (days or {}).values() for f in d if f not in DAILY_FIELDS}
+    if unknown:
+        raise ValueError(f"Unknown stats fields: {sorted(unknown)}")
+
+    assignments = "".join(f"{field} = {field} + :{field}, " for field in summary)
+    db.execute(text(f"UPDATE stats_summary SET {assignments}updated_at = CURRENT_TIMESTAMP WHERE id = 1"), summary)
+
+    rows = [dict({field: deltas.get(field, 0) for field in DAILY_FIELDS}, day=day)
+            for day, deltas in (days or {}).items() if any(deltas.values())]
+    if rows:
+        db.execute(text(
+            "INSERT INTO daily_stats (day, orders, booked_revenue, open_lines) "
+            "VALUES (:day, :orders, :booked_revenue, :open_lines) "
+            "ON CONFLICT (day) DO UPDATE SET orders = daily_stats.orders + excluded.orders, "
+            "booked_revenue = daily_stats.booked_revenue + excluded.booked_revenue, "
+            "open_lines = daily_stats.open_lines + excluded.open_lines"
+        ), rows)
+
+
+def _days():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def record_items(db, count=0, units=0, units_out=0):
+    """Items added (count=1) or removed (count=-1), or their quantities edited"""
+    apply(db, {'total_items': count, 'total_units': units, 'units_out': units_out})
+
+
+def record_customers(db, count):
+    """Customers added or removed"""
+    apply(db, {'total_customers': count})
+
+
+def record_rental(db, order, lines, new_customer=False, started=True):
+    """A just-created order and its lines: the booking, the open lines and (if started) the stock they took out"""
+    days = _days()
+    days[order.rental_date]['orders'] += 1
+    days[order.rental_date]['booked_revenue'] += order.total_amount
+    for line in lines:
+        days[line.return_date]['open_lines'] += 1
+    apply(db, {
+        'total_customers': 1 if new_customer else 0,
+        'active_rentals': len(lines),
+        'units_out': sum(line.quantity for line in lines) if started else 0,
+    }, days)
+
+
+def record_started(db, units):
+    """Units of booked lines just taken out of stock because their rental started"""
+    apply(db, {'units_out': units})
+
+
+def record_return(db, lines, units=None):
+    """
+    Rental lines just marked returned (their amount is earned) and the units
+    put back in stock, by default all units of those lines. Partial returns
+    pass units with only the lines they completed.
+    """
+    days = _days()
+    for line in lines:
+        days[line.return_date]['open_lines'] -= 1
+    apply(db, {
+        'active_rentals': -len(lines),
+        'units_out': -(sum(line.quantity for line in lines) if units is None else units),
+        'total_revenue': sum(line.total_amount for line in lines),
+    }, days)
+
+
+def record_removed(db, lines=(), orders=(), changed_orders=()):
+    """
+    Rental lines and orders just deleted (as loaded before the delete), and
+    orders whose total changed as (order, old_total). Stock is not touched: deletes only run
+    once the rentals have been returned.
+    """
+    summary = defaultdict(int)
+    days = _days()
+    for line in lines:
+        if line.is_returned:
+            summary['total_revenue'] -= line.total_amount
+        else:
+            summary['active_rentals'] -= 1
+            days[line.return_date]['open_lines'] -= 1
+    for order in orders:
+        days[order.rental_date]['orders'] -= 1
+        days[order.rental_date]['booked_revenue'] -= order.total_amount
+    for order, old_total in changed_orders:
+        days[order.rental_date]['booked_revenue'] += order.total_amount - old_total
+    apply(db, summary, days)
+
+
+def compute(db):
+    """(summary, {day: {field: value}}) recomputed from the raw tables"""
+    # Units out are those taken off available_quantity: rentals that have started, not later bookings
+    items = db.execute(select(
+        func.count(),
+        func.coalesce(func.sum(Item.total_quantity), 0),
+        func.coalesce(func.sum(Item.total_quantity - Item.available_quantity), 0),
+    ).select_from(Item)).one()
+    customers = db.execute(select(func.count()).select_from(Customer)).scalar()
+    rentals = db.execute(select(
+        func.count().filter(Rental.is_returned == False),
+        func.coalesce(func.sum(Rental.total_amount).filter(Rental.is_returned == True), 0),
+    ).select_from(Rental)).one()
+    summary = dict(zip(SUMMARY_FIELDS, (items[0], items[1], items[2], customers, rentals[0], float(rentals[1]))))
+
+    days = defaultdict(lambda: dict.fromkeys(DAILY_FIELDS, 0))
+    for day, orders, revenue in db.execute(select(
+        RentalOrder.rental_date, func.count(), func.sum(RentalOrder.total_amount)
+    ).group_by(RentalOrder.rental_date)):
+        days[day]['orders'] = orders
+        days[day]['booked_revenue'] = float(revenue or 0)
+    for day, open_lines in db.execute(select(Rental.return_date, func.count()).where(
+        Rental.is_returned == False
+    ).group_by(Rental.return_date)):
+        days[day]['open_lines'] = open_lines
+    return summary, dict(days)
+
+
+def stored(db):
+    """(summary, {day: {field: value}}) as currently recorded"""
+    row = db.execute(text(f"SELECT {', '.join(SUMMARY_FIELDS)} FROM stats_summary WHERE id = 1")).first()
+    summary = dict(zip(SUMMARY_FIELDS, row)) if row else dict.fromkeys(SUMMARY_FIELDS, 0)
+    days = {row[0]: dict(zip(DAILY_FIELDS, row[1:])) for row in db.execute(
+        text(f"SELECT day, {', '.join(DAILY_FIELDS)} FROM daily_stats")
+    )}
+    return summary, days
+
+
+def rebuild(db, summary, days):
+    """Replace the recorded counters with the given ones"""
+    db.execute(text(
+        f"INSERT INTO stats_summary (id, {', '.join(SUMMARY_FIELDS)}, updated_at) "
+        f"VALUES (1, {', '.join(':' + field for field in SUMMARY_FIELDS)}, CURRENT_TIMESTAMP) "
+        f"ON CONFLICT (id) DO UPDATE SET "
+        + ", ".join(f"{field} = excluded.{field}" for field in SUMMARY_FIELDS + ('updated_at',))
+    ), summary)
+    db.execute(text("DELETE FROM daily_stats"))
+    rows = [dict(values, day=day) for day, values in days.items() if any(values.values())]
+    if rows:
+        db.execute(text(
+            "INSERT INTO daily_stats (day, orders, booked_revenue, open_lines) "
+            "VALUES (:day, :orders, :booked_revenue, :open_lines)"
+        ), rows)
+
+
+def drift(expected, actual):
+    """Descriptions of every counter where actual differs from expected"""
+    (summary, days), (stored_summary, stored_days) = expected, actual
+    problems = [f"{field}: recorded {stored_summary[field]}, actual {summary[field]}"
+                for field in SUMMARY_FIELDS if abs(stored_summary[field] - summary[field]) > TOLERANCE]
+    zero = dict.fromkeys(DAILY_FIELDS, 0)
+    for day in sorted(set(days) | set(stored_days)):
+        for field in DAILY_FIELDS:
+            want, have = days.get(day, zero)[field], stored_days.get(day, zero)[field]
+            if abs(want - have) > TOLERANCE:
+                problems.append(f"{day} {field}: recorded {have}, actual {want}")
+    return problems
+
+
+def reconcile(db, fix=True):
+    """Compare the counters with the raw tables, print any drift and (if fix) rebuild them"""
+    # Hold the summary row so no mutation commits counter changes mid-way
+    db.execute(text("SELECT id FROM stats_summary WHERE id = 1 FOR UPDATE"))
+    expected = compute(db)
+    problems = drift(expected, stored(db))
+    for problem in problems:
+        print(f"Drift: {problem}")
+    if not problems:
+        print("Dashboard counters match the raw data")
+    elif fix:
+        rebuild(db, *expected)
+        print(f"Rebuilt dashboard counters ({len(problems)} differences)")
+    db.commit()
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dashboard counter maintenance")
+    parser.add_argument("--reconcile", action="store_true", help="Rebuild the counters from the raw tables")
+    parser.add_argument("--dry-run", action="store_true", help="With --reconcile, only report drift")
+    args = parser.parse_args()
+    if not args.reconcile:
+        parser.print_help()
+        sys.exit(0)
+    db = SessionLocal()
+    try:
+        problems = reconcile(db, fix=not args.dry_run)
+    finally:
+        db.close()
+    sys.exit(1 if problems and args.dry_run else 0)
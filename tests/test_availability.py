@@ -0,0 +1,84 @@
+"""
+ReservationTree, AvailabilityIndex and the catalog matrix agree with a
+plain scan of the bookings, through random bookings, releases and
+re-bookings.
+"""
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+import pytest
+import availability
+from availability import ReservationTree, AvailabilityIndex, peak_reserved
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 100])
+def test_reservation_tree_matches_scan(seed, size):
+    rng = random.Random(seed)
+    counts = [rng.randrange(5) for _ in range(size)]
+    tree = ReservationTree.from_counts(counts)
+    for _ in range(200):
+        first = rng.randrange(size + 1)
+        last = rng.randrange(first, size + 1)
+        if rng.random() < 0.5:
+            quantity = rng.randint(-3, 5)
+            tree.add(first, last, quantity)
+            for day in range(first, last):
+                counts[day] += quantity
+        else:
+            assert tree.peak(first, last) == (max(counts[first:last]) if first < last else 0)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_index_matches_scan(seed):
+    rng = random.Random(seed)
+    start = date(2026, 1, 1)
+    days = 60
+    lines = []
+    for line_id in range(300):
+        first = start + timedelta(days=rng.randrange(-5, days))
+        lines.append((line_id, line_id // 3, rng.randrange(8), first,
+                      first + timedelta(days=rng.randint(1, 14)), rng.randint(1, 5)))
+    index = AvailabilityIndex.build(lines, start, days)
+
+    def check(lines):
+        by_item = defaultdict(list)
+        for _, _, item_id, first, last, quantity in lines:
+            by_item[item_id].append((max(first, start), min(last, start + timedelta(days=days)), quantity))
+        for _ in range(200):
+            item_id = rng.randrange(8)
+            first = start + timedelta(days=rng.randrange(days))
+            last = first + timedelta(days=rng.randint(1, 20))
+            assert index.peak(item_id, first, last) == peak_reserved(by_item[item_id], first, last)
+
+    check(lines)
+    released = set(rng.sample(range(len(lines)), 100))
+    for line_id in released:
+        index.remove_line(line_id)
+    check([line for line in lines if line[0] not in released])
+    for line in lines:
+        if line[0] in released:
+            index.add_line(*line)
+    check(lines)
+    # Replacing an order's lines drops the old ones
+    index.replace_orders([0], [(1000, 0, 0, start, start + timedelta(days=2), 9)])
+    check([line for line in lines if line[1] != 0] + [(1000, 0, 0, start, start + timedelta(days=2), 9)])
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_reserved_matrix_matches_scan(monkeypatch, use_numpy):
+    if use_numpy:
+        if availability.np is None:
+            pytest.skip("numpy is not installed")
+    else:
+        monkeypatch.setattr(availability, "np", None)
+    rng = random.Random(1)
+    start, days, item_ids = date(2026, 1, 1), 30, [3, 1, 4]
+    lines = []
+    for _ in range(200):
+        first = start + timedelta(days=rng.randrange(-10, days + 5))
+        lines.append((first, first + timedelta(days=rng.randint(1, 14)), rng.choice([1, 3, 4, 5]), rng.randint(1, 5)))
+    expected = [[sum(quantity for first, last, item_id, quantity in lines
+                     if item_id == row_item and first <= start + timedelta(days=day) < last)
+                 for day in range(days)] for row_item in item_ids]
+    assert availability.reserved_matrix(lines, item_ids, start, days) == expected
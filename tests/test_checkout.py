@@ -0,0 +1,122 @@
+"""
+checkout() takes stock out only for rentals that have started, never
+books more units than an item has on any day (from one terminal or
+several), keeps the dashboard counters in step, and issues the same
+statements however many lines an order has.
+"""
+import threading
+from datetime import date, timedelta
+import pytest
+from sqlalchemy.orm import sessionmaker
+from checkout import checkout, start_rentals
+from database import Item
+from queries import count_statements
+import stats
+from benchmarks import add_test_items, remove_test_data, customer_fields
+
+TODAY = date.today()
+
+
+def add_items(db, count=2, stock=10):
+    items = [Item(name=f"Checkout test item {n}", description="checkout test", total_quantity=stock,
+                  available_quantity=stock, daily_rate=2.0) for n in range(count)]
+    db.add_all(items)
+    db.flush()
+    stats.record_items(db, len(items), stock * len(items))
+    db.commit()
+    return items
+
+
+def available(db, item):
+    db.expire_all()
+    return db.get(Item, item.id).available_quantity
+
+
+def assert_no_drift(db):
+    assert stats.drift(stats.compute(db), stats.stored(db)) == []
+
+
+def test_checkout_today_takes_stock(db):
+    chair, table = add_items(db)
+    order, lines = checkout(db, customer_fields("Checkout test"), {chair.id: 6, table.id: 1}, TODAY, 3)
+    assert [(line.item_id, line.quantity) for line in lines] == [(chair.id, 6), (table.id, 1)]
+    assert order.total_amount == 2.0 * 7 * 3
+    assert (available(db, chair), available(db, table)) == (4, 9)
+    assert_no_drift(db)
+
+
+def test_future_booking_takes_stock_when_started(db):
+    chair, = add_items(db, 1)
+    customer = customer_fields("Checkout test")
+    checkout(db, customer, {chair.id: 6}, TODAY, 3)
+    later = TODAY + timedelta(days=10)
+    checkout(db, customer, {chair.id: 8}, later, 2)
+    # Units booked ahead stay on the shelf for rentals ending before then
+    assert available(db, chair) == 4
+    assert_no_drift(db)
+
+    assert start_rentals(db, later - timedelta(days=1)) == []
+    # Started while the first rental is still out, as a late return would leave it
+    assert start_rentals(db, later) == [chair.id]
+    assert available(db, chair) == -4
+    assert start_rentals(db, later) == []
+    assert available(db, chair) == -4
+    assert_no_drift(db)
+
+
+def test_overbooking_is_refused(db):
+    chair, = add_items(db, 1)
+    customer = customer_fields("Checkout test")
+    checkout(db, customer, {chair.id: 8}, TODAY + timedelta(days=5), 5)
+    with pytest.raises(ValueError, match="Only 2 available"):
+        checkout(db, customer, {chair.id: 3}, TODAY + timedelta(days=8), 5)
+    # Outside the booked days the whole stock is free
+    checkout(db, customer, {chair.id: 10}, TODAY + timedelta(days=10), 5)
+    with pytest.raises(ValueError, match="no longer exists"):
+        checkout(db, customer, {-1: 1}, TODAY, 1)
+    assert_no_drift(db)
+
+
+def test_statement_count_does_not_grow_with_lines(connection, db):
+    items = add_items(db, 5)
+    later = TODAY + timedelta(days=30)
+
+    def statements(count):
+        quantities = {item.id: 1 for item in items[:count]}
+        customer = customer_fields("Checkout test")
+        return count_statements(lambda session: checkout(session, customer, quantities, later, 1), connection)
+
+    statements(1)  # creates the customer
+    assert statements(1) == statements(5)
+
+
+def test_concurrent_checkouts_never_overbook(engine):
+    """Terminals on their own connections racing for the same units"""
+    sessions = sessionmaker(bind=engine)
+    prefix = "Concurrent checkout test"
+    stock, terminals, orders = 5, 4, 5
+    item_ids = add_test_items(sessions, prefix, 2, stock, "checkout test")
+    booked, refused = [], []
+
+    def terminal():
+        for _ in range(orders):
+            with sessions() as session:
+                try:
+                    booked.append(checkout(session, customer_fields(prefix), dict.fromkeys(item_ids, 1), TODAY, 2))
+                except ValueError:
+                    refused.append(1)
+
+    try:
+        threads = [threading.Thread(target=terminal) for _ in range(terminals)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert (len(booked), len(refused)) == (stock, terminals * orders - stock)
+        with sessions() as session:
+            assert [session.get(Item, item_id).available_quantity for item_id in item_ids] == [0, 0]
+            assert_no_drift(session)
+    finally:
+        remove_test_data(sessions, prefix)
+    with sessions() as session:
+        assert_no_drift(session)
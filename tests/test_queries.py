@@ -0,0 +1,41 @@
+"""
+The list builders issue a fixed number of statements however many orders
+and lines there are (no N+1 lazy loads).
+"""
+from datetime import date, timedelta
+import pytest
+from checkout import checkout
+from database import Item
+from queries import count_statements, active_orders, all_orders, MAX_LIST_STATEMENTS, PAGE_SIZE
+
+pytest.importorskip("tkinter")
+import rental_manager_improved as app
+
+BUILDERS = {
+    "active rentals tree": lambda db: [app.order_row(order) for order in active_orders(db)],
+    "history page": lambda db: app.fetch_history_page(db, None, PAGE_SIZE, False),
+    "history export": lambda db: [app.history_row(order) for order in all_orders(db)],
+    "active rentals feed": app.build_active_rentals_payload,
+    "history feed": app.build_history_payload,
+}
+
+ORDERS = 3
+LINES_PER_ORDER = 3
+
+
+@pytest.fixture
+def orders(db):
+    """A few orders with several lines each, on the test connection"""
+    items = [Item(name=f"Statement check item {n}", description="statement check", total_quantity=ORDERS,
+                  available_quantity=ORDERS, daily_rate=1.0) for n in range(LINES_PER_ORDER)]
+    db.add_all(items)
+    db.commit()
+    customer = {'name': "Statement check customer", 'phone': '', 'address': '', 'customer_type': 'Regular',
+                'discount_percentage': 0.0}
+    for _ in range(ORDERS):
+        checkout(db, customer, {item.id: 1 for item in items}, date.today() + timedelta(days=1), 1)
+
+
+@pytest.mark.parametrize("name", BUILDERS)
+def test_list_builder_statement_count(connection, orders, name):
+    assert count_statements(BUILDERS[name], connection) <= MAX_LIST_STATEMENTS
@@ -0,0 +1,52 @@
+"""
+ReceiptGenerator builds complete PDFs in both layouts, spills long orders
+onto more pages, and renders from several threads sharing one generator.
+"""
+import re
+import threading
+import pytest
+
+pytest.importorskip("reportlab")
+from receipt_generator import ReceiptGenerator
+from benchmarks import sample_rental_data
+
+
+def pages(pdf):
+    assert pdf.startswith(b"%PDF-") and pdf.rstrip().endswith(b"%%EOF")
+    return len(re.findall(rb"/Type /Page\b", pdf))
+
+
+@pytest.mark.parametrize("template", [True, False])
+def test_render_receipt(template):
+    generator = ReceiptGenerator(template=template)
+    short = pages(generator.render_receipt(sample_rental_data(1, 5)))
+    long = pages(generator.render_receipt(sample_rental_data(2, 60)))
+    assert 1 <= short < long
+
+
+def test_generate_receipt_writes_file(tmp_path):
+    generator = ReceiptGenerator()
+    path = generator.generate_receipt(sample_rental_data(), str(tmp_path / "receipt.pdf"))
+    assert path == str(tmp_path / "receipt.pdf")
+    assert pages(open(path, "rb").read()) == pages(generator.render_receipt(sample_rental_data()))
+
+
+def test_threads_share_one_generator():
+    generator = ReceiptGenerator()
+    expected = pages(generator.render_receipt(sample_rental_data(1, 60)))
+    results, errors = [], []
+
+    def render():
+        for n in range(5):
+            try:
+                results.append(pages(generator.render_receipt(sample_rental_data(n, 60))))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=render) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert results == [expected] * 20
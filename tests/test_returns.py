@@ -0,0 +1,107 @@
+"""
+return_lines() puts back exactly the units returned (and only for rentals
+that had started), closes an order once every unit is back, keeps the
+dashboard counters in step, and leaves the tables as the old ORM loop
+did in a fixed number of statements.
+"""
+from datetime import date, timedelta
+import pytest
+from checkout import checkout
+from database import Item, Rental, RentalOrder
+from queries import count_statements
+from returns import return_lines, return_orders, outstanding_lines
+import stats
+from benchmarks import customer_fields, return_order_one_by_one
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def items(db):
+    items = [Item(name=f"Return test item {n}", description="return test", total_quantity=10,
+                  available_quantity=10, daily_rate=1.0) for n in range(3)]
+    db.add_all(items)
+    db.flush()
+    stats.record_items(db, len(items), 30)
+    db.commit()
+    return items
+
+
+def book(db, items, units=2, start_date=TODAY):
+    order, _ = checkout(db, customer_fields("Return test"), {item.id: units for item in items}, start_date, 3)
+    return order.id
+
+
+def stock(db, items):
+    db.expire_all()
+    return [db.get(Item, item.id).available_quantity for item in items]
+
+
+def assert_no_drift(db):
+    assert stats.drift(stats.compute(db), stats.stored(db)) == []
+
+
+def test_partial_then_full_return(db, items):
+    order_id = book(db, items, units=3)
+    first, second, third = [line_id for line_id, *_ in outstanding_lines(db, order_id)]
+
+    returned, closed = return_lines(db, {first: 1, second: 5})
+    assert [(line.id, line.units, line.is_returned) for line in returned] == [(first, 1, False), (second, 3, True)]
+    assert closed == []
+    assert stock(db, items) == [8, 10, 7]
+    assert [(line_id, out) for line_id, _, _, out in outstanding_lines(db, order_id)] == [(first, 2), (third, 3)]
+    assert_no_drift(db)
+
+    returned, closed = return_orders(db, [order_id])
+    assert [(line.id, line.units) for line in returned] == [(first, 2), (third, 3)]
+    assert closed == [order_id]
+    assert stock(db, items) == [10, 10, 10]
+    assert db.get(RentalOrder, order_id).status == "Returned"
+    # Returning again changes nothing
+    assert return_orders(db, [order_id]) == ([], [])
+    assert stock(db, items) == [10, 10, 10]
+    assert_no_drift(db)
+
+
+def test_return_before_start_leaves_stock(db, items):
+    order_id = book(db, items, start_date=TODAY + timedelta(days=5))
+    assert stock(db, items) == [10, 10, 10]
+    returned, closed = return_orders(db, [order_id])
+    assert len(returned) == 3 and closed == [order_id]
+    assert stock(db, items) == [10, 10, 10]
+    assert_no_drift(db)
+
+
+def test_units_must_be_positive(db, items):
+    line_id = outstanding_lines(db, book(db, items))[0][0]
+    with pytest.raises(ValueError):
+        return_lines(db, {line_id: 0})
+
+
+def test_matches_orm_loop(db, items):
+    """Both ways of returning leave the lines, orders, stock and counters the same"""
+    def state(order_id):
+        db.expire_all()
+        lines = db.query(Rental).filter(Rental.order_id == order_id).order_by(Rental.id)
+        return ([(line.item_id, line.returned_quantity, line.is_returned) for line in lines],
+                db.get(RentalOrder, order_id).status)
+
+    orders = [book(db, items), book(db, items)]
+    for order_id in orders:
+        return_lines(db, {outstanding_lines(db, order_id)[0][0]: 1})
+    before = stock(db, items)
+
+    return_orders(db, [orders[0]])
+    after_set_based = stock(db, items)
+    return_order_one_by_one(db, orders[1])
+    assert state(orders[0]) == state(orders[1])
+    assert [now - then for now, then in zip(stock(db, items), after_set_based)] == \
+        [then - was for then, was in zip(after_set_based, before)]
+    assert_no_drift(db)
+
+
+def test_statement_count_does_not_grow_with_lines(connection, db, items):
+    small, large = book(db, items[:1]), book(db, items)
+    counts = [count_statements(lambda session: return_orders(session, [order_id]), connection)
+              for order_id in (small, large)]
+    assert counts[0] == counts[1]
@@ -0,0 +1,69 @@
+"""
+SearchIndex finds exactly the records a linear scan does, ranked by the
+scan's score, and stays right as records are added, edited and removed.
+"""
+import random
+import pytest
+from search_index import SearchIndex, tokenize, EXACT, PREFIX, SUBSTRING
+
+FIELDS = ("name", "description")
+WEIGHTS = (2, 1)
+WORDS = ["chair", "chairs", "armchair", "table", "tablecloth", "round", "tent", "plastic", "sound", "sku", "12", "123"]
+QUERIES = ["chair", "ch", "air", "table", "tab", "round table", "cloth", "sku 12", "12", "tent chair", "xyz", "a"]
+
+
+def match(word, token):
+    """How a query word matches one token: the scan the index replaces"""
+    if token == word:
+        return EXACT
+    if token.startswith(word):
+        return PREFIX
+    if len(word) >= 3 and word in token:
+        return SUBSTRING
+    return 0
+
+
+def scan_score(record, query):
+    """Total score of a record for query, or 0 unless every word matches"""
+    total = 0
+    for word in dict.fromkeys(tokenize(query)):
+        best = max((match(word, token) * weight for field, weight in zip(FIELDS, WEIGHTS)
+                    for token in tokenize(record[field])), default=0)
+        if not best:
+            return 0
+        total += best
+    return total
+
+
+def random_record(rng):
+    return {field: " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) for field in FIELDS}
+
+
+def check(index, records):
+    for query in QUERIES:
+        results = index.search(query)
+        scores = {doc_id: scan_score(record, query) for doc_id, record in records.items()}
+        assert set(results) == {doc_id for doc_id, score in scores.items() if score}, query
+        ranked = [scores[doc_id] for doc_id in results]
+        assert ranked == sorted(ranked, reverse=True), query
+        assert index.search(query, limit=5) == results[:5], query
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_search_matches_scan(seed):
+    rng = random.Random(seed)
+    records = {doc_id: random_record(rng) for doc_id in range(200)}
+    index = SearchIndex(FIELDS, WEIGHTS)
+    index.rebuild(records.items())
+    check(index, records)
+
+    for _ in range(50):
+        doc_id = rng.randrange(250)
+        if doc_id in records and rng.random() < 0.5:
+            del records[doc_id]
+            index.remove(doc_id)
+        else:
+            records[doc_id] = random_record(rng)
+            index.upsert(doc_id, records[doc_id])
+    assert len(index) == len(records)
+    check(index, records)
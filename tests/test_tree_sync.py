@@ -0,0 +1,92 @@
+"""
+TreeSync.apply() and patch() leave the tree exactly as rebuilding it from
+scratch would.
+"""
+import random
+import pytest
+from tree_sync import TreeSync
+
+
+class FakeTree:
+    """The part of ttk.Treeview TreeSync uses, keeping rows in a list"""
+    def __init__(self):
+        self.children = []
+        self.values = {}
+
+    def insert(self, parent, index, iid, values):
+        assert iid not in self.values
+        self.children.insert(len(self.children) if index == 'end' else index, iid)
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.children.remove(iid)
+            del self.values[iid]
+
+    def item(self, iid, values):
+        self.values[iid] = values
+
+    def move(self, iid, parent, index):
+        self.children.remove(iid)
+        self.children.insert(index, iid)
+
+    def get_children(self):
+        return tuple(self.children)
+
+    def yview(self):
+        return 0.0, 1.0
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+def shown(tree):
+    return [(iid, tree.values[iid]) for iid in tree.children]
+
+
+def rebuilt(rows):
+    return [(str(iid), tuple(values)) for iid, values in rows]
+
+
+def random_rows(rng, count):
+    return [(iid, (f"Item {iid}", rng.randrange(5))) for iid in rng.sample(range(count * 2), count)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_apply_matches_rebuild(seed):
+    rng = random.Random(seed)
+    tree = FakeTree()
+    sync = TreeSync(tree)
+    for _ in range(10):
+        rows = random_rows(rng, rng.randrange(30))
+        sync.apply(rows)
+        assert shown(tree) == rebuilt(rows)
+        assert sync.order == list(tree.children)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_patch_matches_rebuild(seed):
+    """Rows kept sorted by (quantity, id) while random rows change, appear and go"""
+    rng = random.Random(seed)
+    key = lambda iid, values: (values[1], int(iid))
+    tree = FakeTree()
+    sync = TreeSync(tree)
+    rows = dict(random_rows(rng, 30))
+    sync.apply(sorted(rows.items(), key=lambda row: key(*row)))
+    for _ in range(20):
+        changed = {iid: (f"Item {iid}", rng.randrange(5)) for iid in rng.sample(range(60), rng.randrange(6))}
+        deleted = [iid for iid in rng.sample(sorted(rows), min(len(rows), rng.randrange(3))) if iid not in changed]
+        rows.update(changed)
+        for iid in deleted:
+            del rows[iid]
+        sync.patch(changed.items(), deleted, key=key)
+        assert shown(tree) == rebuilt(sorted(rows.items(), key=lambda row: key(*row)))
+        assert sync.order == list(tree.children)
+
+
+def test_patch_without_key_appends_new_rows():
+    tree = FakeTree()
+    sync = TreeSync(tree)
+    sync.apply([(1, ("a",)), (2, ("b",))])
+    assert sync.patch([(3, ("c",)), (1, ("A",))], deleted=[2]) == (1, 1, 1)
+    assert shown(tree) == [("1", ("A",)), ("3", ("c",))]
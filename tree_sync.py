@@ -0,0 +1,148 @@
+"""
+Diff-based updates for ttk.Treeview lists.
+
+Instead of deleting every row and inserting them all again, TreeSync keeps
+the values it last wrote for each row id and applies only the inserts,
+updates, deletes and moves needed to reach the new rows. Row ids stay stable,
+so the user's selection survives a refresh, and the scroll position is put
+back afterwards.
+
+apply() takes the full list and compares it with every row shown; patch()
+takes only the rows that changed (the ids a ChangeBus event carries), so its
+cost follows the size of the change rather than of the list.
+
+Benchmark: python benchmarks.py tree_sync [--rows N]
+"""
+
+
+class TreeSync:
+    """Keeps a ttk.Treeview in step with a list of (iid, values) rows"""
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = {}   # iid -> values last written to the tree
+        self.order = []  # iids in display order, so refreshes never read rows back from Tk
+
+    def apply(self, rows):
+        """
+        Update the tree to show rows, an ordered iterable of (iid, values).
+
+        Returns a (inserted, updated, deleted) tuple of counts.
+        """
+        rows = [(str(iid), tuple(values)) for iid, values in rows]
+        wanted = dict(rows)
+        first_visible = self.tree.yview()[0]
+
+        deleted = [iid for iid in self.rows if iid not in wanted]
+        if deleted:
+            self.delete(*deleted)
+
+        # Rows that stay must already be in the right relative order for
+        # positional inserts to land correctly; otherwise move them into place
+        kept = [iid for iid, _ in rows if iid in self.rows]
+        reorder = kept != [iid for iid in self.order if iid in wanted]
+
+        inserted = updated = 0
+        for index, (iid, values) in enumerate(rows):
+            old = self.rows.get(iid)
+            if old is None:
+                self.insert(index, iid, values)
+                inserted += 1
+                continue
+            if old != values:
+                self.tree.item(iid, values=values)
+                self.rows[iid] = values
+                updated += 1
+            if reorder:
+                self.tree.move(iid, '', index)
+        if reorder:
+            self.order = [iid for iid, _ in rows]
+
+        if inserted or deleted or reorder:
+            self.tree.yview_moveto(first_visible)
+        return inserted, updated, len(deleted)
+
+    def patch(self, rows, deleted=(), key=None):
+        """
+        Update only the rows given: (iid, values) pairs that are new or may
+        have changed, and the iids in deleted. Rows not mentioned are not
+        looked at.
+
+        With key(iid, values) - the order the rows are shown in - new rows
+        and rows whose key changed are put in place by binary search;
+        without it new rows go at the end. Returns a (inserted, updated,
+        deleted) tuple of counts.
+        """
+        first_visible = self.tree.yview()[0]
+        gone = [iid for iid in map(str, deleted) if iid in self.rows]
+        if gone:
+            self.tree.delete(*gone)
+            for iid in gone:
+                del self.rows[iid]
+                self.order.remove(iid)
+
+        inserted = updated = 0
+        moved = False
+        for iid, values in rows:
+            iid, values = str(iid), tuple(values)
+            old = self.rows.get(iid)
+            if old is None:
+                self.insert(self._position(iid, values, key), iid, values)
+                inserted += 1
+                continue
+            if old == values:
+                continue
+            self.tree.item(iid, values=values)
+            self.rows[iid] = values
+            updated += 1
+            if key is not None and key(iid, old) != key(iid, values):
+                self.order.remove(iid)
+                index = self._position(iid, values, key)
+                self.order.insert(index, iid)
+                self.tree.move(iid, '', index)
+                moved = True
+
+        if inserted or gone or moved:
+            self.tree.yview_moveto(first_visible)
+        return inserted, updated, len(gone)
+
+    def _position(self, iid, values, key):
+        """Index a row belongs at in key order ('end' without a key)"""
+        if key is None:
+            return 'end'
+        # bisect_right by hand: its key= argument needs Python 3.10
+        target = key(iid, values)
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            other = self.order[middle]
+            if target < key(other, self.rows[other]):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def insert(self, index, iid, values):
+        """Insert a single row and remember its values"""
+        iid = str(iid)
+        values = tuple(values)
+        self.tree.insert('', index, iid=iid, values=values)
+        self.rows[iid] = values
+        if index == 'end':
+            self.order.append(iid)
+        else:
+            self.order.insert(index, iid)
+
+    def delete(self, *iids):
+        """Delete rows and forget their values"""
+        iids = [str(iid) for iid in iids]
+        self.tree.delete(*iids)
+        for iid in iids:
+            del self.rows[iid]
+        gone = set(iids)
+        self.order = [iid for iid in self.order if iid not in gone]
+
+    def clear(self):
+        """Remove every row"""
+        self.tree.delete(*self.tree.get_children())
+        self.rows = {}
+        self.order = []